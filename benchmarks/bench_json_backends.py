@@ -0,0 +1,44 @@
+"""
+Compare the JSON backends (see `vntree.jsonbackends`) on a large synthetic tree.
+
+Example (1M nodes, nested payloads):
+    python benchmarks/bench_json_backends.py --nodes 1000000 --payload nested
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from vntree import Node, generators, jsonbackends
+
+
+def timed(func):
+    t0 = time.perf_counter()
+    result = func()
+    return time.perf_counter() - t0, result
+
+
+if __name__ == "__main__":
+    aparser = argparse.ArgumentParser(description="Compare vntree JSON backends.")
+    aparser.add_argument("--nodes", type=int, default=200000, help="number of nodes in the tree")
+    aparser.add_argument("--payload", default="flat", choices=["flat", "nested"], help="node payload shape")
+    aparser.add_argument("--compare-nodes", type=int, default=2000, help="number of nodes for tree_compare")
+    aparser.add_argument("--backends", nargs="+", default=jsonbackends.available_backends())
+    args = aparser.parse_args()
+
+    rootnode = generators.make_tree(args.nodes, payload=args.payload)
+    small = generators.make_tree(args.compare_nodes, payload=args.payload)
+    small2 = small.clone()
+    print("{} nodes, backends available: {}, default: {}".format(
+        args.nodes, jsonbackends.available_backends(), jsonbackends.get_backend().name))
+    print("{:8s} {:>10s} {:>10s} {:>10s} {:>12s} {:>10s}".format(
+        "backend", "to_JSON", "to file", "from_JSON", "tree_compare", "MB"))
+    with tempfile.TemporaryDirectory() as tmpdir:
+        fpath = os.path.join(tmpdir, "tree.json")
+        for backend in args.backends:
+            t_str, _json = timed(lambda: rootnode.to_JSON(backend=backend))
+            t_file, _ = timed(lambda: rootnode.to_JSON(fpath, backend=backend))
+            t_load, _ = timed(lambda: Node.from_JSON(fpath))
+            t_cmp, _ = timed(lambda: small.tree_compare(small2, backend=backend))
+            print("{:8s} {:10.3f} {:10.3f} {:10.3f} {:12.3f} {:10.1f}".format(
+                backend, t_str, t_file, t_load, t_cmp, len(_json) / 1e6))
@@ -0,0 +1,58 @@
+"""
+Benchmark `Node.parallel_fold` on a large synthetic tree.
+
+Example (5M nodes, a size rollup with 1, 8 and 32 workers):
+    python benchmarks/bench_parallel_fold.py --nodes 5000000 --workers 1 8 32
+"""
+import argparse
+import random
+import time
+
+from vntree import Node
+
+
+def synthetic_tree(nnodes, fanout=8, seed=0):
+    """Build a balanced tree of `nnodes` nodes, level by level."""
+    rng = random.Random(seed)
+    rootnode = Node("root", data={"size": rng.randint(0, 1000)})
+    level = [rootnode]
+    count = 1
+    while count < nnodes:
+        nextlevel = []
+        for parent in level:
+            for ii in range(fanout):
+                if count >= nnodes:
+                    break
+                nextlevel.append(Node("n{}".format(count), parent, data={"size": rng.randint(0, 1000)}))
+                count += 1
+        level = nextlevel
+    return rootnode
+
+
+def node_size(data):
+    return data.get("size", 0)
+
+
+def rollup(value, childvalues):
+    return value + sum(childvalues)
+
+
+if __name__ == "__main__":
+    aparser = argparse.ArgumentParser(description="Benchmark Node.parallel_fold.")
+    aparser.add_argument("--nodes", type=int, default=5000000, help="number of nodes in the tree")
+    aparser.add_argument("--fanout", type=int, default=8, help="number of children per node")
+    aparser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="numbers of workers")
+    args = aparser.parse_args()
+
+    t0 = time.perf_counter()
+    rootnode = synthetic_tree(args.nodes, args.fanout)
+    print("built {} nodes in {:.2f}s".format(args.nodes, time.perf_counter() - t0))
+    expected = None
+    for workers in args.workers:
+        t0 = time.perf_counter()
+        total = rootnode.parallel_fold(node_size, rollup, workers=workers)
+        elapsed = time.perf_counter() - t0
+        if expected is None:
+            expected = total
+        assert total == expected, "parallel_fold result not deterministic"
+        print("workers={:3d}  total={}  time={:.3f}s".format(workers, total, elapsed))
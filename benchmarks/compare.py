@@ -0,0 +1,58 @@
+"""
+Compare two result files from `benchmarks/run.py`.
+
+The ratio is the time in the new results divided by the time in the
+baseline (both the minimum of the repetitions). The script exits with
+status 1 if any ratio exceeds the threshold.
+
+Example:
+    python benchmarks/compare.py bench-master.json bench-HEAD.json --threshold 1.2
+"""
+import argparse
+import json
+import sys
+
+
+def load_results(fpath):
+    with open(fpath) as fh:
+        report = json.load(fh)
+    return report.get("meta", {}), {(_r["op"], _r["shape"], _r["size"]): _r
+                                    for _r in report["results"]}
+
+
+def compare(baseline, new, threshold=1.2):
+    """Compare two dicts of results, returning a list of
+    `(op, shape, size, base time, new time, ratio, regression)`."""
+    rows = []
+    for _key in sorted(set(baseline) & set(new)):
+        _base, _new = baseline[_key], new[_key]
+        if "min" not in _base or "min" not in _new:
+            rows.append(_key + (_base.get("min"), _new.get("min"), None, "min" in _base))
+            continue
+        _ratio = _new["min"] / _base["min"] if _base["min"] else float("inf")
+        rows.append(_key + (_base["min"], _new["min"], _ratio, _ratio > threshold))
+    return rows
+
+
+if __name__ == "__main__":
+    aparser = argparse.ArgumentParser(description="Compare two vntree benchmark result files.")
+    aparser.add_argument("baseline", help="JSON results of the baseline")
+    aparser.add_argument("new", help="JSON results to compare with the baseline")
+    aparser.add_argument("--threshold", type=float, default=1.2,
+                         help="flag a regression if new/baseline exceeds this ratio")
+    args = aparser.parse_args()
+
+    _basemeta, baseline = load_results(args.baseline)
+    _newmeta, new = load_results(args.new)
+    print("baseline: {}  new: {}".format(_basemeta.get("commit"), _newmeta.get("commit")))
+    _fmt = "{:18s} {:9s} {:>9}  {:>11}  {:>11}  {:>7}  {}"
+    print(_fmt.format("op", "shape", "size", "baseline", "new", "ratio", ""))
+    _regressions = 0
+    for op, shape, size, _tbase, _tnew, _ratio, _flag in compare(baseline, new, args.threshold):
+        _tb = "{:.6f}".format(_tbase) if _tbase is not None else "error"
+        _tn = "{:.6f}".format(_tnew) if _tnew is not None else "error"
+        _r = "{:.2f}".format(_ratio) if _ratio is not None else "-"
+        _regressions += bool(_flag)
+        print(_fmt.format(op, shape, size, _tb, _tn, _r, "REGRESSION" if _flag else ""))
+    print("{} regression(s), threshold {}".format(_regressions, args.threshold))
+    sys.exit(1 if _regressions else 0)
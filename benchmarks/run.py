@@ -0,0 +1,209 @@
+"""
+Benchmark suite for the core «vntree» tree operations.
+
+Each operation is timed on synthetic trees of several shapes and sizes,
+and the results are saved as JSON, so that they can be compared between
+commits with `benchmarks/compare.py`.
+
+Example:
+    python benchmarks/run.py --sizes 1000 10000 --output bench-HEAD.json
+    python benchmarks/run.py --ops iterate len clone --shapes balanced
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import vntree
+from vntree import Node
+
+from trees import SHAPES, make_tree
+
+
+# Largest tree size for operations that scale badly (e.g. tree_compare
+# uses difflib.SequenceMatcher on the JSON of both trees).
+MAX_SIZE = {
+    "tree_compare": 10000,
+    "get_node_by_id": 100000,
+    "find_one_node": 100000,
+}
+
+
+def bench_construct(shape, nnodes):
+    return lambda _: make_tree(shape, nnodes)
+
+
+def sample_nodes(rootnode, nsample=100, seed=0):
+    nodes = list(rootnode)
+    rng = random.Random(seed)
+    return [rng.choice(nodes) for ii in range(nsample)]
+
+
+def setup_ops(rootnode, tmpdir):
+    """Return a dict of operation name to (setup, timed function) for a tree."""
+    def _ids():
+        return [_n._id for _n in sample_nodes(rootnode, 10)]
+    def _paths():
+        return [_n._path for _n in sample_nodes(rootnode, 100)]
+    def _coords():
+        return [_n._coord for _n in sample_nodes(rootnode, 100)]
+    def _treedict():
+        return rootnode.to_treedict()
+    def _json():
+        return rootnode.to_JSON()
+    def _jsonfile():
+        return rootnode.to_JSON(os.path.join(tmpdir, "tree.json"))
+    def _vn3file():
+        _fpath = os.path.join(tmpdir, "tree.vn3")
+        rootnode.savefile(_fpath)
+        return _fpath
+    def _vnbfile():
+        _fpath = os.path.join(tmpdir, "tree.vnb")
+        rootnode.savefile(_fpath, format="vnb")
+        return _fpath
+    def _vn3cfile():
+        _fpath = os.path.join(tmpdir, "tree.vn3c")
+        rootnode.savefile(_fpath, format="vn3c")
+        return _fpath, _paths()[:10]
+    def _vn3c_lookup(args):
+        _root = Node.openfile(args[0], lazy=True)
+        return [_root.get_node_by_path(_p) for _p in args[1]]
+    def _vnmfile():
+        _fpath = os.path.join(tmpdir, "tree.vnm")
+        rootnode.savefile(_fpath, format="vnm")
+        return _fpath, _ids()
+    def _vnm_lookup(args):
+        _root = Node.openfile(args[0], mmap=True)
+        return [_root.get_node_by_id(_id) for _id in args[1]]
+    def _yamlfile():
+        return rootnode.tree2yaml(os.path.join(tmpdir, "tree.yaml"))
+    def _yamlfile_nested():
+        return rootnode.tree2yaml(os.path.join(tmpdir, "tree-nested.yaml"), layout="nested")
+    def _clone():
+        return rootnode.clone()
+    _last = list(rootnode)[-1] if rootnode is not None else None
+    ops = {
+        "iterate": (None, lambda _: list(rootnode)),
+        "len": (None, lambda _: len(rootnode)),
+        "get_node_by_id": (_ids, lambda ids: [rootnode.get_node_by_id(_id) for _id in ids]),
+        "get_node_by_path": (_paths, lambda paths: [rootnode.get_node_by_path(_p) for _p in paths]),
+        "get_node_by_coord": (_coords, lambda coords: [rootnode.get_node_by_coord(_c) for _c in coords]),
+        "find_one_node": (None, lambda _: rootnode.find_one_node("value", value=_last.get_data("value"))),
+        "clone": (None, lambda _: rootnode.clone()),
+        "to_treedict": (None, lambda _: rootnode.to_treedict()),
+        "from_treedict": (_treedict, lambda tdict: Node(treedict=tdict)),
+        "to_JSON": (None, lambda _: rootnode.to_JSON()),
+        "from_JSON": (_json, lambda js: Node.from_JSON(js)),
+        "to_JSON_file": (None, lambda _: rootnode.to_JSON(os.path.join(tmpdir, "tree.json"))),
+        "from_JSON_file": (_jsonfile, lambda fpath: Node.from_JSON(fpath)),
+        "savefile": (None, lambda _: rootnode.savefile(os.path.join(tmpdir, "tree.vn3"))),
+        "openfile": (_vn3file, lambda fpath: Node.openfile(fpath)),
+        "savefile_vn3c": (None, lambda _: rootnode.savefile(os.path.join(tmpdir, "tree.vn3c"), format="vn3c")),
+        "openfile_vn3c": (_vn3cfile, lambda args: Node.openfile(args[0])),
+        "lazy_vn3c_get_node_by_path": (_vn3cfile, _vn3c_lookup),
+        "savefile_vnb": (None, lambda _: rootnode.savefile(os.path.join(tmpdir, "tree.vnb"), format="vnb")),
+        "openfile_vnb": (_vnbfile, lambda fpath: Node.openfile(fpath)),
+        "openfile_vnb_gcpause": (_vnbfile, lambda fpath: Node.openfile(fpath, gcpause=True)),
+        "savefile_vnm": (None, lambda _: rootnode.savefile(os.path.join(tmpdir, "tree.vnm"), format="vnm")),
+        "mmap_vnm_get_node_by_id": (_vnmfile, _vnm_lookup),
+        "tree2yaml": (None, lambda _: rootnode.tree2yaml()),
+        "tree2yaml_file": (None, lambda _: rootnode.tree2yaml(os.path.join(tmpdir, "tree.yaml"))),
+        "tree2yaml_nested": (None, lambda _: rootnode.tree2yaml(layout="nested")),
+        "yaml2tree": (_yamlfile, lambda fpath: Node.yaml2tree(fpath)),
+        "yaml2tree_nested": (_yamlfile_nested, lambda fpath: Node.yaml2tree(fpath)),
+        "to_texttree": (None, lambda _: rootnode.to_texttree()),
+        "tree_compare": (_clone, lambda other: rootnode.tree_compare(other)),
+    }
+    return ops
+
+
+OPS = ["construct"] + list(setup_ops(None, None).keys())
+
+
+def timeit(func, arg=None, repeat=3):
+    """Time `func(arg)`, returning the list of elapsed times in seconds."""
+    times = []
+    for ii in range(repeat):
+        t0 = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                    stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def run(shapes, sizes, ops, repeat=3, verbose=True):
+    results = []
+    def _record(op, shape, nnodes, times=None, error=None):
+        res = {"op": op, "shape": shape, "size": nnodes}
+        if error is None:
+            res.update({"min": min(times), "mean": sum(times) / len(times), "repeat": len(times)})
+        else:
+            res["error"] = error
+        results.append(res)
+        if verbose:
+            _t = "error: " + error if error else "{:.6f}s".format(res["min"])
+            print("{:18s} {:9s} {:>9d}  {}".format(op, shape, nnodes, _t), flush=True)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for shape in shapes:
+            for nnodes in sizes:
+                try:
+                    t0 = time.perf_counter()
+                    rootnode = make_tree(shape, nnodes)
+                    _build = time.perf_counter() - t0
+                except Exception as err:
+                    _record("construct", shape, nnodes, error=repr(err))
+                    continue
+                if "construct" in ops:
+                    _times = [_build] + timeit(bench_construct(shape, nnodes), repeat=repeat-1)
+                    _record("construct", shape, nnodes, _times)
+                for op, (setup, func) in setup_ops(rootnode, tmpdir).items():
+                    if op not in ops or nnodes > MAX_SIZE.get(op, nnodes):
+                        continue
+                    try:
+                        arg = setup() if setup else None
+                        _record(op, shape, nnodes, timeit(func, arg, repeat))
+                    except Exception as err:
+                        _record(op, shape, nnodes, error=repr(err))
+                del rootnode
+    return results
+
+
+if __name__ == "__main__":
+    aparser = argparse.ArgumentParser(description="Benchmark core vntree tree operations.")
+    aparser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=SHAPES)
+    aparser.add_argument("--sizes", nargs="+", type=int, default=[1000, 10000, 100000, 1000000])
+    aparser.add_argument("--ops", nargs="+", default=OPS, choices=OPS)
+    aparser.add_argument("--repeat", type=int, default=3, help="number of timed repetitions")
+    aparser.add_argument("--output", default=None, help="JSON file for the results")
+    args = aparser.parse_args()
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+
+    results = run(args.shapes, args.sizes, args.ops, repeat=args.repeat)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "vntree": vntree.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "date": datetime.datetime.now().isoformat(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(report, fh, indent=1)
+        print("results saved in «{}»".format(os.path.abspath(args.output)))
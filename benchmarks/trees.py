@@ -0,0 +1,45 @@
+"""
+Synthetic trees of different shapes for the «vntree» benchmarks.
+"""
+from vntree import Node, generators
+
+
+# Iteration and to_treedict are recursive, so "deep" trees are built
+# as chains of at most DEEP_MAX nodes.
+DEEP_MAX = 400
+
+SHAPES = ("deep", "wide", "balanced", "random")
+
+
+def shape_spec(shape, nnodes):
+    """Return the `vntree.generators` tree specification for a shape."""
+    if shape == "deep":
+        _nchains = max(-(-(nnodes - 1) // DEEP_MAX), 1)
+        return {"fanout": lambda rng, depth: _nchains if depth == 0 else 1, "max_depth": DEEP_MAX}
+    elif shape == "wide":
+        return {"fanout": nnodes}
+    elif shape == "balanced":
+        return {"fanout": 8}
+    elif shape == "random":
+        return {"fanout": (0, 4)}
+    raise ValueError("make_tree: shape «{}» not valid, must be one of {}.".format(shape, SHAPES))
+
+
+def node_payload(rng, idx, depth):
+    return {"value": idx, "label": "node {}".format(idx)}
+
+
+def make_tree(shape, nnodes, seed=0, cls=Node):
+    """Build a tree of `nnodes` nodes with the specified shape.
+
+    :param shape: "deep" (chains of DEEP_MAX nodes), "wide" (all nodes
+        are children of root), "balanced" (8 children per node), or
+        "random" (0 to 4 children per node).
+    :type shape: str
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :returns: the root node.
+    :rtype: Node
+    """
+    return generators.make_tree(nnodes, cls=cls, seed=seed, payload=node_payload,
+                                **shape_spec(shape, nnodes))
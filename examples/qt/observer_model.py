@@ -0,0 +1,128 @@
+"""
+Copyright © 2020 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+A QAbstractItemModel for a «vntree» tree that follows changes in the tree
+using the Node.add_observer API, instead of resetting the whole view.
+"""
+import logging
+logger = logging.getLogger(__name__)
+from PyQt5.QtCore import QAbstractItemModel, QModelIndex, Qt
+
+from vntree import Node
+
+
+class ObservedTreeModel(QAbstractItemModel):
+
+    def __init__(self, rootNode, parent=None, headers=("name",)):
+        super().__init__(parent)
+        self.rootItem = rootNode
+        self.headers = headers
+        self._rows = {}
+        self._persistent = []
+        self.rootItem.add_observer(self.tree_event, before=self.tree_event_before)
+
+    def tree_event_before(self, event):
+        # called before the tree changes, the view is told what is coming
+        parentIndex = self.nodeIndex(event.parent)
+        if event.kind == "inserted":
+            self.beginInsertRows(parentIndex, event.first, event.last)
+        elif event.kind == "removed":
+            self.beginRemoveRows(parentIndex, event.first, event.last)
+        elif event.kind == "layout_changed":
+            # a batch of changes: the rows are re-mapped when it exits
+            self.layoutAboutToBeChanged.emit()
+            self._persistent = self.persistentIndexList()
+
+    def tree_event(self, event):
+        if event.kind in ("inserted", "removed", "layout_changed"):
+            self._rows.clear()
+        if event.kind == "inserted":
+            self.endInsertRows()
+        elif event.kind == "removed":
+            self.endRemoveRows()
+        elif event.kind == "layout_changed":
+            _new = []
+            for _index in self._persistent:
+                _node = _index.internalPointer()
+                if _node is not None and _node._root is self.rootItem:
+                    _new.append(self.nodeIndex(_node, _index.column()))
+                else:
+                    _new.append(QModelIndex())
+            self.changePersistentIndexList(self._persistent, _new)
+            self._persistent = []
+            self.layoutChanged.emit()
+        elif event.kind == "data_changed" and event.parent is not None:
+            parentIndex = self.nodeIndex(event.parent)
+            self.dataChanged.emit(self.index(event.first, 0, parentIndex),
+                    self.index(event.last, self.columnCount() - 1, parentIndex))
+
+    def nodeIndex(self, node, column=0):
+        if node is self.rootItem or node.parent is None:
+            return QModelIndex()
+        # row numbers per parent, cached until the next structural change
+        _parent = node.parent
+        _rows = self._rows.get(id(_parent))
+        if _rows is None:
+            _rows = self._rows[id(_parent)] = {id(_c): ii for ii, _c in enumerate(_parent.childs)}
+        return self.createIndex(_rows[id(node)], column, node)
+
+    def getItem(self, index):
+        if index.isValid():
+            item = index.internalPointer()
+            if item:
+                return item
+        return self.rootItem
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.headers)
+
+    def data(self, index, role):
+        if not index.isValid():
+            return None
+        item = self.getItem(index)
+        if role == Qt.DisplayRole:
+            return item.name
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return self.headers[section]
+
+    def index(self, row, column, parent=QModelIndex()):
+        parentItem = self.getItem(parent)
+        if 0 <= row < len(parentItem.childs):
+            return self.createIndex(row, column, parentItem.childs[row])
+        return QModelIndex()
+
+    def parent(self, index):
+        node = self.getItem(index)
+        return self.nodeIndex(node.parent) if node.parent else QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return len(self.getItem(parent).childs)
+
+
+if __name__ == "__main__":
+    import sys
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication, QTreeView
+
+    rootnode = Node("invisibleRoot")
+    streamroot = Node("streamed nodes", rootnode)
+    model = ObservedTreeModel(rootnode)
+    app = QApplication(sys.argv)
+    treeView = QTreeView()
+    treeView.setModel(model)
+    treeView.show()
+
+    def stream_nodes():
+        # 1000 insertions reach the view as a single layout change
+        with rootnode.batch():
+            for ii in range(1000):
+                Node("node {}".format(len(streamroot.childs)), streamroot)
+        if len(streamroot.childs) < 100000:
+            QTimer.singleShot(10, stream_nodes)
+
+    QTimer.singleShot(10, stream_nodes)
+    sys.exit(app.exec_())
@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+from vntree import Node
+
+
+class SlowNode(Node):
+    """Node class simulating a backend with a slow `aload`."""
+    loading = 0
+    maxloading = 0
+
+    async def aload(self):
+        SlowNode.loading += 1
+        SlowNode.maxloading = max(SlowNode.maxloading, SlowNode.loading)
+        await asyncio.sleep(0.01)
+        self.set_data("loaded", value=True)
+        SlowNode.loading -= 1
+        return self
+
+
+def make_tree(cls):
+    rootnode = cls("ROOT")
+    for ii in range(4):
+        _child = cls("child {}".format(ii), rootnode)
+        for jj in range(5):
+            cls("gchild {}".format(jj), _child)
+    return rootnode
+
+
+async def walk(rootnode, **kwargs):
+    return [_n async for _n in rootnode.awalk(**kwargs)]
+
+
+class AsyncTests(unittest.TestCase):
+
+    def test_awalk_in_memory(self):
+        rootnode = make_tree(Node)
+        nodes = asyncio.run(walk(rootnode))
+        self.assertEqual(nodes, list(rootnode))
+        self.assertIs(asyncio.run(rootnode.aload()), rootnode)
+
+    def test_awalk_loads_concurrently(self):
+        rootnode = make_tree(SlowNode)
+        SlowNode.maxloading = 0
+        nodes = asyncio.run(walk(rootnode, concurrency=3))
+        self.assertEqual(nodes, list(rootnode))
+        self.assertTrue(all(_n.get_data("loaded") for _n in nodes))
+        self.assertEqual(SlowNode.maxloading, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+
+from vntree import Node, TreeEvent
+
+
+def make_tree():
+    rootnode = Node('ROOT')
+    Node("1st child", parent=rootnode, data={"para1": "TEST parameter"})
+    child2 = Node("2nd child", rootnode)
+    Node("grand-child1", child2, {"testvar": 1234})
+    return rootnode
+
+
+class BatchTests(unittest.TestCase):
+
+    def test_maintainer_called_per_change(self):
+        rootnode = make_tree()
+        calls = []
+        rootnode.add_maintainer(lambda root, changes: calls.append(changes))
+        rootnode.childs[0].set_data("para1", value="changed")
+        Node("3rd child", rootnode)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0][0].kind, "data")
+        self.assertEqual(calls[1][0].kind, "insert")
+        self.assertEqual(calls[1][0].idx, 2)
+
+    def test_batch_defers_maintenance(self):
+        rootnode = make_tree()
+        calls = []
+        rootnode.add_maintainer(lambda root, changes: calls.append(changes))
+        with rootnode.batch():
+            for ii in range(100):
+                rootnode.set_data("counter", value=ii)
+            with rootnode.batch():
+                Node("new child", rootnode.childs[1])
+            self.assertEqual(calls, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(calls[0]), 101)
+        self.assertEqual(rootnode.get_data("counter"), 99)
+
+    def test_batch_rollback(self):
+        rootnode = make_tree()
+        with self.assertRaises(RuntimeError):
+            with rootnode.batch(rollback=True):
+                rootnode.childs[0].set_data("para1", value="changed")
+                rootnode.childs[0].set_data("new", "nested", value=1)
+                rootnode.name = "RENAMED"
+                Node("new child", rootnode.childs[1])
+                rootnode.remove_child(node=rootnode.childs[0])
+                raise RuntimeError("abort")
+        self.assertEqual(rootnode.name, "ROOT")
+        self.assertEqual(len(rootnode), 4)
+        self.assertEqual(rootnode.childs[0].get_data("para1"), "TEST parameter")
+        self.assertIsNone(rootnode.childs[0].get_data("new"))
+
+    def test_rollback_attributes(self):
+        rootnode = make_tree()
+        _node = rootnode.childs[1]
+        _node.data.pop("_vntree")
+        with self.assertRaises(RuntimeError):
+            with rootnode.batch(rollback=True):
+                _node.name = "named"
+                del rootnode.name
+                raise RuntimeError("abort")
+        self.assertNotIn("_vntree", _node.data)
+        self.assertEqual(rootnode.name, "ROOT")
+
+    def test_remove_maintainer(self):
+        rootnode = make_tree()
+        calls = []
+        _maintainer = rootnode.add_maintainer(lambda root, changes: calls.append(changes))
+        self.assertTrue(rootnode.remove_maintainer(_maintainer))
+        rootnode.set_data("x", value=1)
+        self.assertEqual(calls, [])
+        self.assertFalse(rootnode.remove_maintainer(_maintainer))
+
+    def test_attached_subtree(self):
+        rootnode, other = make_tree(), make_tree()
+        calls = []
+        rootnode.add_maintainer(lambda root, changes: calls.append(changes))
+        _gchild = other.childs[1].childs[0]
+        other.set_data("x", value=1)
+        self.assertEqual(calls, [])
+        rootnode.add_child(other.childs[1])
+        _gchild.set_data("testvar", value=1)
+        self.assertEqual([_c[0].kind for _c in calls], ["insert", "data"])
+        self.assertIs(calls[1][0].node, _gchild)
+
+
+class ObserverTests(unittest.TestCase):
+
+    def test_inserts_coalesced_in_batch(self):
+        rootnode = make_tree()
+        events = []
+        rootnode.add_observer(events.append)
+        with rootnode.batch():
+            for ii in range(100):
+                Node("streamed {}".format(ii), rootnode)
+        self.assertEqual(events, [TreeEvent("inserted", rootnode, 2, 101, None, None)])
+
+    def test_events_outside_batch(self):
+        rootnode = make_tree()
+        events = []
+        rootnode.add_observer(events.append)
+        Node("new", rootnode)
+        rootnode.remove_child(node=rootnode.childs[0])
+        rootnode.childs[0].set_data("x", value=1)
+        self.assertEqual([_e.kind for _e in events], ["inserted", "removed", "data_changed"])
+        self.assertEqual((events[1].first, events[1].last), (0, 0))
+        self.assertEqual((events[2].parent, events[2].first), (rootnode, 0))
+
+    def test_move_and_data_coalesced(self):
+        rootnode = make_tree()
+        child1, child2 = rootnode.childs
+        events = []
+        rootnode.add_observer(events.append)
+        with rootnode.batch():
+            child1.set_data("x", value=1)
+            child2.set_data("x", value=1)
+            child1.set_data("y", value=2)
+            _n = rootnode.remove_child(node=child1)
+            child2.add_child(_n)
+        self.assertEqual(events, [
+            TreeEvent("moved", rootnode, 0, 0, child2, 1),
+            TreeEvent("data_changed", child2, 1, 1, None, None),
+            TreeEvent("data_changed", rootnode, 0, 0, None, None),
+        ])
+        self.assertTrue(rootnode.remove_observer(events.append))
+
+    def test_before_notifications(self):
+        rootnode = make_tree()
+        calls = []
+        def before(event):
+            calls.append(("before", event, len(rootnode.childs)))
+        def after(event):
+            calls.append(("after", event, len(rootnode.childs)))
+        rootnode.add_observer(after, before=before)
+        Node("new", rootnode)
+        _inserted = TreeEvent("inserted", rootnode, 2, 2, None, None)
+        self.assertEqual(calls, [("before", _inserted, 2), ("after", _inserted, 3)])
+        del calls[:]
+        with rootnode.batch():
+            rootnode.remove_child(node=rootnode.childs[0])
+            rootnode.childs[0].set_data("x", value=1)
+        _layout = TreeEvent("layout_changed", rootnode, None, None, None, None)
+        self.assertEqual(calls, [
+            ("before", _layout, 3),
+            ("after", _layout, 2),
+            ("after", TreeEvent("data_changed", rootnode, 0, 0, None, None), 2),
+        ])
+        del calls[:]
+        with rootnode.batch():
+            pass
+        self.assertEqual([_c[0] for _c in calls], ["before", "after"])
+
+
+if __name__ == '__main__':
+    unittest.main()
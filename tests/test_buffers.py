@@ -0,0 +1,91 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from vntree import Node, buffers
+
+
+class BuffersTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fpath = os.path.join(self.tmpdir.name, "tree.vn3")
+        self.blob = bytes(range(256)) * 512
+        self.rootnode = Node("root", data={"blob": self.blob, "small": b"abc"})
+        Node("child", self.rootnode, data={"array": bytearray(b"x" * buffers.BUFFER_MIN),
+                                           "buffer": pickle.PickleBuffer(bytearray(b"y" * buffers.BUFFER_MIN))})
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_roundtrip(self):
+        self.assertTrue(self.rootnode.savefile(self.fpath, protocol=5))
+        with open(self.fpath, "rb") as fh:
+            self.assertEqual(fh.read(4), buffers.MAGIC)
+        rootnode = Node.openfile(self.fpath)
+        self.assertEqual(rootnode.data["blob"], self.blob)
+        self.assertEqual(rootnode.data["small"], b"abc")
+        _data = rootnode.childs[0].data
+        self.assertIsInstance(_data["array"], bytearray)
+        self.assertEqual(_data["array"], self.rootnode.childs[0].data["array"])
+        # the out-of-band buffer is mapped copy-on-write
+        self.assertIsInstance(_data["buffer"], memoryview)
+        self.assertFalse(_data["buffer"].readonly)
+        self.assertEqual(bytes(_data["buffer"]), b"y" * buffers.BUFFER_MIN)
+
+    def test_zerocopy(self):
+        self.assertTrue(self.rootnode.savefile(self.fpath, protocol=5))
+        rootnode = Node.openfile(self.fpath, zerocopy=True)
+        self.assertIsInstance(rootnode.data["blob"], memoryview)
+        self.assertTrue(rootnode.data["blob"].readonly)
+        self.assertEqual(rootnode.data["small"], b"abc")
+        # the tree can be saved to the mapped file
+        rootnode.set_data("extra", value=1)
+        self.assertTrue(rootnode.savefile(protocol=5))
+        rootnode = Node.openfile(self.fpath)
+        self.assertEqual(rootnode.data["blob"], self.blob)
+        self.assertEqual(rootnode.data["extra"], 1)
+        self.assertEqual(os.listdir(self.tmpdir.name), ["tree.vn3"])
+
+    def test_compressed(self):
+        _fpath = self.fpath + ".gz"
+        self.assertTrue(self.rootnode.savefile(_fpath, protocol=5))
+        rootnode = Node.openfile(_fpath)
+        self.assertEqual(rootnode.data["blob"], self.blob)
+        self.assertEqual(bytes(rootnode.childs[0].data["buffer"]), b"y" * buffers.BUFFER_MIN)
+
+    def test_shared(self):
+        _array = self.rootnode.childs[0].data["array"]
+        _clone = self.rootnode.clone()
+        self.assertIs(_clone.childs[0].data["array"], _array)
+        self.assertIs(_clone.childs[0].data["buffer"], self.rootnode.childs[0].data["buffer"])
+        _treedict = self.rootnode.to_treedict()
+        self.assertIs(_treedict["childs"][0]["data"]["array"], _array)
+        _node = Node(treedict=_treedict)
+        self.assertIs(_node.childs[0].data["array"], _array)
+        # the small values are copied
+        self.rootnode.data["list"] = [bytearray(b"z")]
+        self.assertIsNot(self.rootnode.clone().data["list"][0], self.rootnode.data["list"][0])
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_numpy(self):
+        _array = numpy.arange(100000, dtype="float64")
+        self.rootnode.childs[0].data["array"] = _array
+        self.assertIs(self.rootnode.clone().childs[0].data["array"], _array)
+        self.assertTrue(self.rootnode.savefile(self.fpath, protocol=5))
+        rootnode = Node.openfile(self.fpath)
+        _loaded = rootnode.childs[0].data["array"]
+        self.assertTrue(numpy.array_equal(_loaded, _array))
+        self.assertFalse(_loaded.flags.owndata)
+        _loaded[0] = -1.0  # copy-on-write
+        self.assertEqual(Node.openfile(self.fpath).childs[0].data["array"][0], 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import pickle
+import unittest
+
+from vntree import Node, tree_cached
+
+
+class CountingNode(Node):
+    calls = 0
+
+    @tree_cached
+    def double(self):
+        CountingNode.calls += 1
+        return self.get_data("value") * 2
+
+    @tree_cached(depends="descendants")
+    def total(self):
+        CountingNode.calls += 1
+        return self.get_data("value") + sum(_c.total for _c in self.childs)
+
+    @tree_cached(depends="ancestors")
+    def inherited(self):
+        CountingNode.calls += 1
+        return [_n.get_data("value") for _n in reversed(self._ancestors)] + [self.get_data("value")]
+
+
+def make_tree():
+    rootnode = CountingNode("ROOT", data={"value": 1})
+    child = CountingNode("child", rootnode, data={"value": 2})
+    CountingNode("gchild", child, data={"value": 3})
+    CountingNode("child2", rootnode, data={"value": 4})
+    return rootnode
+
+
+class TreeCachedTests(unittest.TestCase):
+
+    def test_path_invalidated_by_rename_and_move(self):
+        rootnode = make_tree()
+        gchild = rootnode.childs[0].childs[0]
+        self.assertEqual(gchild._path, "/ROOT/child/gchild")
+        rootnode.childs[0].name = "renamed"
+        self.assertEqual(gchild._path, "/ROOT/renamed/gchild")
+        rootnode.childs[1].add_child(rootnode.childs[0].remove_child(node=gchild))
+        self.assertEqual(gchild._path, "/ROOT/child2/gchild")
+        self.assertEqual(gchild._coord, (1, 0))
+        self.assertEqual(gchild._level, 3)
+        self.assertIs(gchild._root, rootnode)
+
+    def test_direct_linking_and_name_write(self):
+        rootnode = make_tree()
+        newnode = Node("new")
+        self.assertEqual(newnode._path, "/new")
+        rootnode.childs.append(newnode)
+        newnode.parent = rootnode
+        self.assertEqual(newnode._path, "/ROOT/new")
+        self.assertIs(newnode._root, rootnode)
+        rootnode.data["_vntree"]["name"] = "TOP"
+        self.assertEqual(newnode._path, "/TOP/new")
+        self.assertEqual(newnode._ancestors, [rootnode])
+
+    def test_versions_per_tree(self):
+        rootnode = make_tree()
+        other = make_tree()
+        self.assertEqual(rootnode.total, 10)
+        CountingNode.calls = 0
+        CountingNode("extra", other, data={"value": 5})
+        other.childs[0].name = "renamed"
+        self.assertEqual(rootnode.total, 10)
+        self.assertEqual(CountingNode.calls, 0)
+        self.assertEqual(other.total, 15)
+
+    def test_descendants_structure(self):
+        rootnode = make_tree()
+        self.assertEqual(rootnode.total, 10)
+        CountingNode("extra", rootnode.childs[0].childs[0], data={"value": 5})
+        self.assertEqual(rootnode.total, 15)
+        rootnode.childs[0].remove_child(node=rootnode.childs[0].childs[0])
+        self.assertEqual(rootnode.total, 7)
+
+    def test_invalidate(self):
+        rootnode = make_tree()
+        self.assertEqual(rootnode.total, 10)
+        rootnode.childs[1].data["value"] = 40
+        tree_cached.invalidate(rootnode)
+        self.assertEqual(rootnode.total, 46)
+
+    def test_data_dependent(self):
+        rootnode = make_tree()
+        CountingNode.calls = 0
+        self.assertEqual(rootnode.double, 2)
+        self.assertEqual(rootnode.double, 2)
+        self.assertEqual(CountingNode.calls, 1)
+        rootnode.set_data("value", value=10)
+        self.assertEqual(rootnode.double, 20)
+        self.assertEqual(CountingNode.calls, 2)
+
+    def test_descendants_and_ancestors(self):
+        rootnode = make_tree()
+        gchild = rootnode.childs[0].childs[0]
+        self.assertEqual(rootnode.total, 10)
+        self.assertEqual(gchild.inherited, [1, 2, 3])
+        CountingNode.calls = 0
+        self.assertEqual(rootnode.total, 10)
+        self.assertEqual(gchild.inherited, [1, 2, 3])
+        self.assertEqual(CountingNode.calls, 0)
+        gchild.set_data("value", value=30)
+        self.assertEqual(rootnode.total, 37)
+        self.assertEqual(rootnode.childs[1].total, 4)
+        rootnode.set_data("value", value=100)
+        self.assertEqual(gchild.inherited, [100, 2, 30])
+
+    def test_batch_and_pickle(self):
+        rootnode = make_tree()
+        self.assertEqual(rootnode.total, 10)
+        with rootnode.batch():
+            rootnode.childs[1].set_data("value", value=40)
+            self.assertEqual(rootnode.total, 46)
+        self.assertEqual(rootnode.total, 46)
+        self.assertNotIn("_vn_cache", rootnode.to_treedict())
+        newtree = pickle.loads(pickle.dumps(rootnode))
+        self.assertNotIn("_vn_cache", vars(newtree))
+        self.assertEqual(newtree.total, 46)
+
+    def test_batch_of_other_tree(self):
+        rootnode, other = make_tree(), make_tree()
+        self.assertEqual(rootnode.double, 2)
+        _calls = CountingNode.calls
+        with other.batch():
+            self.assertEqual(rootnode.double, 2)
+            self.assertEqual(CountingNode.calls, _calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import gzip
+import json
+import os
+import tempfile
+import unittest
+
+from vntree import Node, compressed, generators
+
+
+class CompressedTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.rootnode = generators.make_tree(200, seed=7, fanout=(0, 4), payload="nested")
+        self.treedict = json.loads(self.rootnode.to_JSON(backend="json"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _path(self, fname):
+        return os.path.join(self.tmpdir.name, fname)
+
+    def test_json(self):
+        for ext in (".gz", ".bz2", ".xz"):
+            fpath = self.rootnode.to_JSON(self._path("tree.json" + ext), level=1)
+            self.assertEqual(compressed.detect(fpath), compressed.detect(fpath, "w"))
+            rootnode = Node.from_JSON(fpath)
+            self.assertEqual(json.loads(rootnode.to_JSON(backend="json")), self.treedict)
+        # the compression is detected from the magic bytes
+        fpath = self.rootnode.to_JSON(self._path("tree.json"), compression="gzip")
+        with gzip.open(fpath, "rt") as fh:
+            self.assertEqual(json.loads(fh.read()), json.loads(self.rootnode.to_JSON()))
+        self.assertTrue(Node.from_JSON(fpath))
+        self.assertIsNone(compressed.detect(self.rootnode.to_JSON(self._path("plain.json"))))
+
+    def test_savefile(self):
+        for fmt in ("vn3", "vnb"):
+            for compression in ("gzip", "bz2", "lzma"):
+                fpath = self._path("tree." + fmt)
+                self.assertTrue(self.rootnode.savefile(fpath, format=fmt, compression=compression))
+                self.assertEqual(compressed.detect(fpath), compression)
+                rootnode = Node.openfile(fpath)
+                self.assertEqual(rootnode.to_treedict(), self.rootnode.to_treedict())
+        with self.assertRaises(ValueError):
+            self.rootnode.savefile(self._path("tree.vnm.gz"), format="vnm")
+        fpath = self._path("tree.vnm")
+        self.assertTrue(self.rootnode.savefile(fpath, format="vnm"))
+        with open(fpath, "rb") as fh, gzip.open(fpath + ".gz", "wb") as gz:
+            gz.write(fh.read())
+        self.assertFalse(Node.openfile(fpath + ".gz"))
+
+    def test_yaml(self):
+        fpath = self._path("tree.yaml.bz2")
+        with compressed.open_file(fpath, "w") as fh:
+            fh.write("- !Node &root\n  name: root\n  data: {x: 1}\n- !Node &child\n  name: child\n  parent: *root\n")
+        self.assertEqual(compressed.detect(fpath), "bz2")
+        rootnode = Node.yaml2tree(fpath)
+        self.assertEqual([_n.name for _n in rootnode], ["root", "child"])
+
+    def test_writer(self):
+        fpath = self._path("data.gz")
+        with open(fpath, "wb") as fh:
+            with compressed.CompressedWriter(fh, "gzip", closefd=False, blocksize=10) as writer:
+                for ii in range(100):
+                    writer.write(b"line %d\n" % ii)
+            self.assertFalse(fh.closed)
+        with gzip.open(fpath) as fh:
+            self.assertEqual(fh.read(), b"".join(b"line %d\n" % ii for ii in range(100)))
+        with self.assertRaises(ValueError):
+            self.rootnode.to_JSON(self._path("tree.json"), compression="zip")
+
+
+if __name__ == '__main__':
+    unittest.main()
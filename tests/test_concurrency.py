@@ -0,0 +1,117 @@
+import threading
+import unittest
+
+from vntree import Node, EmbedNode
+
+
+NTHREADS = 8
+NOPS = 300
+
+
+def check_tree(testcase, rootnode):
+    for _n in rootnode:
+        for _c in _n.childs:
+            testcase.assertIs(_c.parent, _n)
+
+
+def run_threads(funcs):
+    errors = []
+    def _run(func):
+        try:
+            func()
+        except Exception as err:
+            errors.append(err)
+    threads = [threading.Thread(target=_run, args=(_f,)) for _f in funcs]
+    for _t in threads:
+        _t.start()
+    for _t in threads:
+        _t.join()
+    return errors
+
+
+class ConcurrencyStressTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rootnode = Node("ROOT")
+        for ii in range(NTHREADS):
+            Node("branch {}".format(ii), self.rootnode)
+        self.rootnode.enable_concurrency()
+
+    def tearDown(self):
+        self.rootnode.disable_concurrency()
+
+    def test_add_remove_iterate(self):
+        rootnode = self.rootnode
+        def writer(branch):
+            def _write():
+                for ii in range(NOPS):
+                    _n = Node("n{}".format(ii), branch, data={"ii": ii})
+                    _n.set_data("nested", "value", value=ii)
+                    if ii % 3 == 0:
+                        branch.remove_child(node=_n)
+            return _write
+        def reader():
+            for ii in range(NOPS // 10):
+                _names = [_n.name for _n in rootnode]
+                assert _names[0] == "ROOT"
+                _dct = rootnode.to_treedict()
+                assert len(_dct["childs"]) == NTHREADS
+        funcs = [writer(_b) for _b in rootnode.childs] + [reader] * NTHREADS
+        errors = run_threads(funcs)
+        self.assertEqual(errors, [])
+        check_tree(self, rootnode)
+        self.assertEqual(len(rootnode), 1 + NTHREADS + NTHREADS * (NOPS - NOPS // 3))
+
+    def test_iteration_is_snapshot(self):
+        rootnode = self.rootnode
+        _count = 0
+        for _n in rootnode:
+            Node("added during iteration", rootnode)
+            _count += 1
+        self.assertEqual(_count, 1 + NTHREADS)
+
+    def test_batch_is_atomic(self):
+        rootnode = self.rootnode
+        def writer():
+            for ii in range(NOPS // 10):
+                with rootnode.batch():
+                    for _b in rootnode.childs:
+                        _b.set_data("version", value=ii)
+        def reader():
+            for ii in range(NOPS // 10):
+                with rootnode.read_locked():
+                    _versions = {_b.get_data("version") for _b in rootnode.childs}
+                assert len(_versions) == 1, _versions
+        errors = run_threads([writer, writer] + [reader] * NTHREADS)
+        self.assertEqual(errors, [])
+
+    def test_lock_scoped_to_tree(self):
+        other = Node("OTHER")
+        Node("child", other)
+        self.assertIsNone(other.childs[0]._tree_lock())
+        self.assertIsNone(other._vn_tstate)
+        _branch = other.childs[0]
+        self.rootnode.add_child(_branch)
+        self.assertIs(_branch._tree_lock(), self.rootnode._tree_lock())
+
+    def test_embednode_lookup_reentrant(self):
+        rootnode = EmbedNode("EMBED ROOT")
+        Node("normal child", rootnode)
+        embedded = Node("embedded tree")
+        Node("embedded child", embedded)
+        rootnode.embed_tree(embedded)
+        rootnode.enable_concurrency()
+        _ids = [_n._id for _n in rootnode.childs[0]]
+        def lookup():
+            for ii in range(NOPS):
+                for _id in _ids:
+                    assert rootnode.get_node_by_id(_id) is not None
+                assert rootnode._active is False
+                assert len(list(rootnode)) == 2
+        errors = run_threads([lookup] * NTHREADS)
+        self.assertEqual(errors, [])
+        rootnode.disable_concurrency()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from vntree import Node, generators
+
+
+class GeneratorTests(unittest.TestCase):
+
+    def test_seeded(self):
+        records = list(generators.iter_records(300, seed=7, fanout=(0, 4)))
+        self.assertEqual(records, list(generators.iter_records(300, seed=7, fanout=(0, 4))))
+        self.assertNotEqual(records, list(generators.iter_records(300, seed=8, fanout=(0, 4))))
+        self.assertEqual([_r[0] for _r in records], list(range(300)))
+
+    def test_shape(self):
+        rootnode = generators.make_tree(500, fanout=(5, 12), max_depth=3, names="sibling")
+        self.assertEqual(len(rootnode), 500)
+        self.assertLessEqual(max(len(_n._coord) for _n in rootnode), 3)
+        for _n in rootnode:
+            self.assertEqual([_c.name for _c in _n.childs], ["c{}".format(ii) for ii in range(len(_n.childs))])
+        with self.assertRaises(ValueError):
+            generators.make_tree(1000, fanout=2, max_depth=3)
+
+    def test_deep_chain(self):
+        records = list(generators.iter_records(70000, fanout=1))
+        self.assertEqual(records[-1][:4], (69999, 69998, 0, 69999))
+
+    def test_duplicates(self):
+        records = list(generators.iter_records(1000, duplicate_ids=0.2, names="duplicate"))
+        self.assertLess(len({_r[5] for _r in records}), 1000)
+        self.assertLessEqual(len({_r[4] for _r in records}), generators.NAME_POOL)
+
+    def test_forms(self):
+        spec = {"seed": 3, "fanout": (0, 4), "payload": "nested"}
+        rootnode = generators.make_tree(200, **spec)
+        treedict = generators.make_treedict(200, **spec)
+        self.assertEqual(rootnode.to_treedict(), treedict)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fpath = generators.write_json(os.path.join(tmpdir, "tree.json"), 200, **spec)
+            self.assertEqual(Node.from_JSON(fpath).to_treedict(), treedict)
+            fpath = generators.write_vn3(os.path.join(tmpdir, "tree.vn3"), 200, **spec)
+            self.assertEqual(len(Node.openfile(fpath)), 200)
+            fpath = generators.write_sqlite(os.path.join(tmpdir, "tree.db"), 200, chunksize=64, **spec)
+            conn = sqlite3.connect(fpath)
+            rows = conn.execute("SELECT idx, parent, position, name, _id, data FROM nodes ORDER BY idx").fetchall()
+            conn.close()
+        self.assertEqual([_r[4] for _r in rows], [_n._id for _n in rootnode])
+        childdata = {k: v for k, v in rootnode.childs[0].data.items() if k != "_vntree"}
+        self.assertEqual(json.loads(rows[1][5]), childdata)
+
+
+if __name__ == '__main__':
+    unittest.main()
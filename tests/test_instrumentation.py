@@ -0,0 +1,81 @@
+import threading
+import unittest
+
+import vntree
+from vntree import Node, instrumentation
+
+
+class InstrumentationTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rootnode = Node("ROOT", data={"value": {"nested": 1}})
+        for ii in range(5):
+            _child = Node("child {}".format(ii), self.rootnode)
+            Node("gchild", _child)
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+
+    def test_disabled_by_default(self):
+        original = Node.__dict__["get_node_by_id"]
+        with instrumentation.measure():
+            self.assertIsNot(Node.__dict__["get_node_by_id"], original)
+        self.assertIs(Node.__dict__["get_node_by_id"], original)
+        self.assertFalse(instrumentation.is_enabled())
+
+    def test_measure(self):
+        _id = self.rootnode.childs[-1].childs[0]._id
+        with instrumentation.measure() as m:
+            self.assertIsNotNone(self.rootnode.get_node_by_id(_id))
+            self.rootnode.get_data("value")
+            self.rootnode.to_JSON()
+            self.rootnode.to_treedict()
+            self.assertEqual(len(self.rootnode), 11)
+        stats = m.stats()
+        self.assertEqual(stats["Node.get_node_by_id"]["calls"], 1)
+        self.assertEqual(stats["Node.get_node_by_id"]["category"], "lookup")
+        self.assertEqual(stats["Node.get_data"]["calls"], 1)
+        # recursive calls are counted once
+        self.assertEqual(stats["Node.to_treedict"]["calls"], 1)
+        self.assertEqual(sum(stats["Node.__len__"]["buckets"]), 1)
+        self.assertEqual(set(m.stats(by="category")), {"lookup", "copy", "serialize", "traversal"})
+        self.assertEqual(vntree.stats()["Node.to_JSON"]["calls"], 1)
+        self.rootnode.to_JSON()
+        self.assertEqual(vntree.stats()["Node.to_JSON"]["calls"], 1)
+
+    def test_overlapping_measures(self):
+        entered, exited = threading.Event(), threading.Event()
+        results = {}
+        def worker():
+            with instrumentation.measure() as m:
+                entered.set()
+                exited.wait(10)
+                self.rootnode.get_data("value")
+            results["stats"] = m.stats()
+        _thread = threading.Thread(target=worker)
+        _thread.start()
+        entered.wait(10)
+        with instrumentation.measure():
+            pass
+        self.assertTrue(instrumentation.is_enabled())
+        exited.set()
+        _thread.join(10)
+        self.assertEqual(results["stats"]["Node.get_data"]["calls"], 1)
+        self.assertFalse(instrumentation.is_enabled())
+
+    def test_export(self):
+        exported = []
+        instrumentation.add_exporter(exported.append)
+        instrumentation.enable()
+        self.rootnode.clone()
+        instrumentation.export()
+        instrumentation.remove_exporter(exported.append)
+        self.assertEqual(exported[0]["Node.clone"]["calls"], 1)
+        text = instrumentation.prometheus_text()
+        self.assertIn('vntree_operation_seconds_count{op="Node.clone",category="copy"} 1', text)
+        self.assertIn('le="+Inf"', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import tempfile
+import unittest
+
+from vntree import Node, generators, journal
+
+
+class JournalTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fpath = os.path.join(self.tmpdir.name, "tree.vn3")
+        self.rootnode = generators.make_tree(300, seed=8, fanout=(4, 6), payload="nested")
+        self.assertTrue(self.rootnode.savefile(self.fpath))
+        self.assertTrue(self.rootnode.enable_journal())
+
+    def tearDown(self):
+        self.rootnode.disable_journal()
+        self.tmpdir.cleanup()
+
+    def _change(self, rootnode):
+        rootnode.childs[0].set_data("status", value="done")
+        rootnode.childs[1].name = "renamed"
+        _new = Node("new", rootnode.childs[2], data={"values": [1, 2]})
+        Node("grand-child", _new)
+        with rootnode.batch():
+            _moved = rootnode.childs[3].childs[0]
+            rootnode.childs[3].remove_child(node=_moved)
+            rootnode.childs[1].add_child(_moved, idx=0)
+            Node("in batch", _new).set_data("x", value=1)
+            _new.set_data("values", value=[3])
+        rootnode.childs[0]._id = "changed _id"
+        rootnode.childs[0].set_data("status", value="changed")
+        rootnode.childs[2].remove_child(node=rootnode.childs[2].childs[0])
+        rootnode.childs[1].set_data("nested", "new", value=1)
+        del rootnode.childs[1].name
+
+    def test_replay(self):
+        _size = os.path.getsize(self.fpath)
+        self._change(self.rootnode)
+        self.assertEqual(os.path.getsize(self.fpath), _size)
+        self.assertLess(os.path.getsize(self.fpath + ".journal"), _size / 10)
+        newtree = Node.openfile(self.fpath)
+        self.assertEqual(newtree.to_treedict(), self.rootnode.to_treedict())
+        self.assertEqual(newtree.childs[1].childs[0].name, self.rootnode.childs[1].childs[0].name)
+        oldtree = Node.openfile(self.fpath, replay=False)
+        self.assertNotEqual(oldtree.childs[1].name, "renamed")
+
+    def test_compact(self):
+        self._change(self.rootnode)
+        self.assertTrue(self.rootnode.compact())
+        self.assertLess(os.path.getsize(self.fpath + ".journal"), 100)
+        self.assertEqual(Node.openfile(self.fpath).to_treedict(), self.rootnode.to_treedict())
+        self.rootnode.childs[0].set_data("after", value=1)
+        self.assertTrue(self.rootnode.compact(background=True))
+        self.rootnode.childs[0].set_data("during", value=2)
+        self.rootnode.get_journal().wait()
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ["tree.vn3", "tree.vn3.journal"])
+        self.assertEqual(Node.openfile(self.fpath).to_treedict(), self.rootnode.to_treedict())
+
+    def test_snapshot_id_not_serialized(self):
+        tree = generators.make_tree(20, seed=3)
+        fpath = os.path.join(self.tmpdir.name, "other.vnb")
+        self.assertTrue(tree.savefile(fpath, format="vnb"))
+        _json = tree.to_JSON()
+        self.assertTrue(tree.enable_journal())
+        self.assertTrue(tree.savefile())
+        self.assertIsNotNone(journal.snapshot_id(tree))
+        self.assertEqual(tree.to_JSON(), _json)
+        self.assertNotIn("_vntree_snapshot", tree.to_treedict())
+        self.assertNotIn("_vntree_snapshot", tree.to_ndjson())
+        self.assertIsNone(journal.snapshot_id(tree.clone()))
+        self.assertEqual(tree.tree_compare(tree.clone()), 1.0)
+        newtree = Node.openfile(fpath)
+        self.assertEqual(journal.snapshot_id(newtree), journal.snapshot_id(tree))
+        self.assertEqual(newtree.to_JSON(), _json)
+        tree.disable_journal()
+
+    def test_readd_after_compact(self):
+        _node = self.rootnode.childs[0]
+        self.rootnode.remove_child(node=_node)
+        self.assertTrue(self.rootnode.compact())
+        self.rootnode.add_child(_node)
+        newtree = Node.openfile(self.fpath)
+        self.assertEqual([_c.name for _c in newtree.childs], [_c.name for _c in self.rootnode.childs])
+        self.assertEqual(newtree.to_treedict(), self.rootnode.to_treedict())
+        self.rootnode.remove_child(node=_node)
+        self.assertTrue(self.rootnode.savefile(self.fpath))
+        self.rootnode.add_child(_node)
+        self.assertEqual(Node.openfile(self.fpath).to_treedict(), self.rootnode.to_treedict())
+
+    def test_threshold(self):
+        self.rootnode.disable_journal()
+        self.rootnode.enable_journal(threshold=2000)
+        for ii in range(50):
+            self.rootnode.childs[0].set_data("counter", value=ii)
+            self.assertLess(os.path.getsize(self.fpath + ".journal"), 2100)
+        self.assertIn("counter", Node.openfile(self.fpath, replay=False).childs[0].data)
+        self.assertEqual(Node.openfile(self.fpath).to_treedict(), self.rootnode.to_treedict())
+
+    def test_recovery(self):
+        self._change(self.rootnode)
+        _jpath = self.fpath + ".journal"
+        with open(_jpath, "ab") as fh:
+            fh.write(b"\x80\x04incomplete")
+        self.assertEqual(Node.openfile(self.fpath).to_treedict(), self.rootnode.to_treedict())
+        # a compaction interrupted after the snapshot was replaced
+        self.rootnode.disable_journal()
+        os.replace(_jpath, _jpath + ".old")
+        self.assertTrue(self.rootnode.savefile(self.fpath))
+        os.replace(_jpath + ".old", _jpath)
+        _snapshot = journal.snapshot_id(Node.openfile(self.fpath, replay=False))
+        journal.Journal._write_journal(_jpath + ".next", _snapshot, [])
+        self.assertEqual(Node.openfile(self.fpath).to_treedict(), self.rootnode.to_treedict())
+        self.assertFalse(os.path.exists(_jpath + ".next"))
+        # a journal of another snapshot is ignored
+        self.assertIsNotNone(journal.find_journal(self.fpath, _snapshot))
+        self.assertTrue(Node("other tree").savefile(self.fpath))
+        self.assertIsNone(journal.find_journal(self.fpath, None))
+        self.assertEqual(Node.openfile(self.fpath).name, "other tree")
+        # the snapshot is rewritten with the same size and modification time
+        self.rootnode.enable_journal()
+        self.rootnode.childs[0].set_data("status", value="journaled")
+        _stat = os.stat(self.fpath)
+        _snapshot = journal.snapshot_id(self.rootnode)
+        self.rootnode.disable_journal()
+        self.assertTrue(self.rootnode.savefile(self.fpath))
+        os.utime(self.fpath, ns=(_stat.st_atime_ns, _stat.st_mtime_ns))
+        self.assertNotEqual(journal.snapshot_id(self.rootnode), _snapshot)
+        self.assertIsNone(journal.find_journal(self.fpath, journal.snapshot_id(self.rootnode)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import sys
+import unittest
+
+from vntree import Node
+
+
+class MemoryReportTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rootnode = Node("ROOT", data={"payload": "x" * 1000})
+        for ii in range(3):
+            _child = Node("child {}".format(ii), self.rootnode, data={"value": ii})
+            Node("gchild", _child, data={"value": ii})
+
+    def test_by_class_and_level(self):
+        report = self.rootnode.memory_report()
+        self.assertEqual(list(report), ["Node"])
+        row = report["Node"]
+        self.assertEqual(row["nodes"], 7)
+        self.assertEqual(row["total"], sum(row[_k] for _k in ("node", "childs", "data", "_vntree", "payload")))
+        self.assertGreater(row["payload"], 1000)
+        levels = self.rootnode.memory_report(by="level")
+        self.assertEqual({_l: _r["nodes"] for _l, _r in levels.items()}, {0: 1, 1: 3, 2: 3})
+        self.assertEqual(sum(_r["total"] for _r in levels.values()), row["total"])
+        shallow = self.rootnode.memory_report(by="level", depth=1)
+        self.assertEqual(set(shallow), {0, 1})
+
+    def test_shared_objects_counted_once(self):
+        shared = "y" * 10000
+        for _n in self.rootnode:
+            _n.data["shared"] = shared
+        report = self.rootnode.memory_report(by="data_key")
+        self.assertLess(report["shared"]["bytes"], 2 * sys.getsizeof(shared))
+        self.assertEqual(report["shared"]["count"], 7)
+        self.assertEqual(report["(node)"]["count"], 7)
+
+    def test_table(self):
+        table = self.rootnode.memory_report(by="data_key", output="table")
+        self.assertTrue(table.startswith("data_key"))
+        self.assertIn("TOTAL", table)
+        with self.assertRaises(ValueError):
+            self.rootnode.memory_report(by="size")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from vntree import Node, generators, ndjson
+
+
+def _tree_json(rootnode):
+    return json.loads(rootnode.to_JSON(backend="json"))
+
+
+class NDJSONTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rootnode = generators.make_tree(300, seed=5, fanout=(0, 4), payload="nested")
+        self.rootnode.data["_vntree"]["version"] = 2
+        self.rootnode.childs[0].note = "attribute"
+
+    def test_roundtrip(self):
+        _ndjson = self.rootnode.to_ndjson()
+        _lines = _ndjson.splitlines()
+        self.assertEqual(len(_lines), 300)
+        _rec = json.loads(_lines[1])
+        self.assertEqual(set(_rec), {"_id", "parent_id", "position", "name", "data", "attrs"})
+        self.assertEqual(_rec["parent_id"], self.rootnode._id)
+        self.assertNotIn("name", _rec["data"].get("_vntree", {}))
+        rootnode = Node.from_ndjson(_ndjson)
+        self.assertEqual(_tree_json(rootnode), _tree_json(self.rootnode))
+        self.assertEqual(rootnode.childs[0].note, "attribute")
+        self.assertEqual(rootnode.data["_vntree"]["version"], 2)
+        rootnode = Node.from_ndjson(io.StringIO(_ndjson))
+        self.assertEqual(_tree_json(rootnode), _tree_json(self.rootnode))
+
+    def test_key_order(self):
+        _node = self.rootnode.childs[1]
+        _node.data = {"first": 1, "_vntree": {"_id": _node._id, "name": _node.name}}
+        rootnode = Node.from_ndjson(self.rootnode.to_ndjson())
+        self.assertEqual(rootnode.to_JSON(backend="json"), self.rootnode.to_JSON(backend="json"))
+
+    def test_out_of_order(self):
+        _lines = self.rootnode.to_ndjson().splitlines(True)
+        random.Random(1).shuffle(_lines)
+        rootnode = Node.from_ndjson("".join(_lines))
+        self.assertEqual(_tree_json(rootnode), _tree_json(self.rootnode))
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fpath = self.rootnode.to_ndjson(os.path.join(tmpdir, "tree.ndjson"))
+            _node = self.rootnode.childs[0]
+            Node("new", _node, data={"x": 1}).to_ndjson(fpath, append=True)
+            _node.data["y"] = 2
+            _node.to_ndjson(fpath, append=True)
+            rootnode = Node.from_ndjson(fpath)
+            self.assertEqual(_tree_json(rootnode), _tree_json(self.rootnode))
+            self.assertEqual(rootnode.childs[0].childs[-1].name, "new")
+
+    def test_parallel(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fpath = self.rootnode.to_ndjson(os.path.join(tmpdir, "tree.ndjson"))
+            _chunks = ndjson._split_chunks(fpath, 7)
+            self.assertEqual(_chunks[0][0], 0)
+            self.assertEqual(_chunks[-1][1], os.path.getsize(fpath))
+            _records = list(ndjson.iter_records(fpath, workers=2, chunksize=4096))
+            self.assertEqual(_records, list(ndjson.iter_records(fpath)))
+            rootnode = Node.from_ndjson(fpath, workers=2, chunksize=4096)
+            self.assertEqual(_tree_json(rootnode), _tree_json(self.rootnode))
+
+    def test_invalid(self):
+        self.assertFalse(Node.from_ndjson(""))
+        self.assertFalse(Node.from_ndjson("not json\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
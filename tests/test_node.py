@@ -1,9 +1,13 @@
 from datetime import datetime
+import gc
+import io
+import json
 import os
+import sys
 import tempfile
 import unittest
 
-from vntree import Node
+from vntree import Node, generators, jsonbackends, vnbfile
 
 
 rootnode   = Node('ROOT')
@@ -50,6 +54,98 @@ class DumpLoad(unittest.TestCase):
         self.assertFalse(newtree is rootnode)
         self.assertEqual(rootnode.tree_compare(newtree), 1.0)
 
+    def test_vnb_roundtrip(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fpath = os.path.join(tmpdir, "tree.vnb")
+            for compress in (False, True, 9):
+                self.assertTrue(rootnode.savefile(fpath, format="vnb", compress=compress))
+                newtree = Node.openfile(fpath)
+                self.assertFalse(newtree is rootnode)
+                self.assertEqual(newtree.to_treedict(), rootnode.to_treedict())
+            # several blocks, other _id and value types, node attributes
+            tree = generators.make_tree(50, seed=2, fanout=(0, 3), names="duplicate")
+            tree.childs[0]._id = 12345
+            tree.childs[0].childs[0].extra = {"tuple": (1, 2.5), "bytes": b"\x00\xff", "big": 2**70}
+            tree.data["values"] = [None, True, False, -1, {1: "one"}, {"set"}]
+            tree._vntree_fpath = os.path.abspath(fpath)
+            with open(fpath, "wb") as fh:
+                vnbfile.dump(tree, fh, ("parent", "childs"), compress=True, blocksize=7)
+            newtree = Node.openfile(fpath)
+            self.assertEqual(newtree.to_treedict(), tree.to_treedict())
+            self.assertEqual(newtree.childs[0].childs[0].extra["tuple"], (1, 2.5))
+            # the order of the `_vntree` keys is preserved
+            Node("v1", tree).set_data("_vntree", "version", value=2)
+            Node("v2", tree).data["_vntree"] = {"version": 2, "name": "v2", "_id": "id2"}
+            with open(fpath, "wb") as fh:
+                vnbfile.dump(tree, fh, ("parent", "childs"))
+            self.assertEqual(Node.openfile(fpath).to_JSON(default=str), tree.to_JSON(default=str))
+            _json = Node.openfile(fpath, gcpause=True).to_JSON(default=str)
+            self.assertEqual(_json, tree.to_JSON(default=str))
+            self.assertTrue(gc.isenabled())
+            self.assertTrue(rootnode.savefile(fpath[:-4] + ".dat", enforceext=True, format="vnb"))
+            self.assertTrue(os.path.isfile(fpath))
+            with self.assertRaises(ValueError):
+                rootnode.savefile(fpath, format="xml")
+
+    def test_json_streaming(self):
+        _default = jsonbackends.native_default(str)
+        for treemeta in (True, False):
+            for dataonly in (True, False):
+                _json = json.dumps(rootnode.to_treedict(treemeta=treemeta, dataonly=dataonly), default=_default)
+                self.assertEqual(rootnode.to_JSON(treemeta=treemeta, dataonly=dataonly, backend="json"), _json)
+        _fh = io.StringIO()
+        rootnode.to_JSON(_fh, bufsize=10, backend="json")
+        self.assertEqual(_fh.getvalue(), json.dumps(rootnode.to_treedict(), default=_default))
+        newtree = Node.from_JSON(_fh.getvalue())
+        self.assertEqual(rootnode.tree_compare(newtree), 1.0)
+
+    def test_json_backends(self):
+        _treedict = json.loads(rootnode.to_JSON(backend="json"))
+        for backend in jsonbackends.available_backends():
+            _json = rootnode.to_JSON(backend=backend)
+            self.assertEqual(json.loads(_json), _treedict)
+            self.assertEqual(Node.from_JSON(_json).to_treedict(), _treedict)
+        _big = Node("big integer", data={"value": 2**70, "when": datetime(2020, 1, 2, 3, 4, 5)})
+        self.assertEqual(json.loads(_big.to_JSON())["data"]["value"], 2**70)
+        self.assertEqual(json.loads(_big.to_JSON())["data"]["when"], "2020-01-02T03:04:05")
+        with self.assertRaises(ValueError):
+            jsonbackends.get_backend("no such backend")
+        self.assertEqual(jsonbackends.get_backend().name, "json")
+        _nonfinite = Node("non-finite", data={"values": [float("inf"), None], "nan": float("nan")})
+        for backend in jsonbackends.available_backends():
+            _json = _nonfinite.to_JSON(backend=backend)
+            self.assertIn("Infinity", _json)
+            self.assertIn("NaN", _json)
+            _data = jsonbackends.get_backend(backend).loads(_json)["data"]
+            self.assertEqual(_data["values"], [float("inf"), None])
+
+    def test_json_incremental_load(self):
+        _json = rootnode.to_JSON(default=str)
+        _indented = json.dumps(json.loads(_json), indent=2, sort_keys=True)
+        self.assertEqual(Node.from_JSON(_indented).to_treedict(), json.loads(_json))
+        subtree = Node.from_JSON(_json, coord=grandchild3._coord)
+        self.assertEqual(subtree.to_JSON(), grandchild3.to_JSON())
+        subtree = Node.from_JSON(io.StringIO(_json), path=grandchild3._path)
+        self.assertEqual(subtree.to_JSON(), grandchild3.to_JSON())
+        self.assertFalse(Node.from_JSON(_json, path="/ROOT/no such child"))
+        # "childs" before "data"
+        subtree = Node.from_JSON(_indented, path=grandchild3._path)
+        self.assertEqual(json.loads(subtree.to_JSON()), json.loads(grandchild3.to_JSON()))
+        self.assertFalse(Node.from_JSON(_indented, path="/ROOT/no such child"))
+        self.assertEqual(len(Node.from_JSON(_json, max_nodes=4)), 4)
+        # "childs" before "data" without an _id
+        newtree = Node.from_JSON('{"childs": [{"data": {"x": 1}, "childs": []}], "data": {"_vntree": {"name": "top"}}}')
+        self.assertEqual(newtree.name, "top")
+        self.assertTrue(newtree._id)
+        self.assertEqual(newtree.get_node_by_id(newtree._id), newtree)
+        deeptree = Node("deep")
+        _node = deeptree
+        _depth = 3 * sys.getrecursionlimit()
+        for ii in range(_depth):
+            _node = Node("level {}".format(ii), _node)
+        newtree = Node.from_JSON(deeptree.to_JSON())
+        self.assertEqual(newtree.get_node_by_coord((0,) * _depth).name, _node.name)
+
 
 
 if __name__ == '__main__':
@@ -0,0 +1,74 @@
+import unittest
+
+from vntree import Node
+from vntree.parallel import partition_subtrees, subtree_sizes
+
+
+def make_tree(nchilds=5, ngchilds=20):
+    rootnode = Node("ROOT", data={"value": 0})
+    for ii in range(nchilds):
+        _child = Node("child {}".format(ii), rootnode, data={"value": ii})
+        for jj in range(ngchilds):
+            Node("gchild {}".format(jj), _child, data={"value": jj})
+    return rootnode
+
+
+def double_value(data):
+    return data.get("value", 0) * 2
+
+
+class ParallelMapTests(unittest.TestCase):
+
+    def test_partition(self):
+        rootnode = make_tree()
+        sizes = subtree_sizes(rootnode)
+        self.assertEqual(sizes[id(rootnode)], len(rootnode))
+        top, bins = partition_subtrees(rootnode, 4, sizes)
+        covered = top + [_n for _bin in bins for _sub in _bin for _n in _sub]
+        self.assertEqual(sorted(map(id, covered)), sorted(map(id, rootnode)))
+        self.assertEqual(partition_subtrees(rootnode, 4), (top, bins))
+
+    def test_parallel_map(self):
+        rootnode = make_tree()
+        expected = [_n.get_data("value") * 2 for _n in rootnode]
+        for chunk in ("subtree", "nodes"):
+            results = rootnode.parallel_map(double_value, processes=2, chunk=chunk)
+            self.assertEqual(results, expected)
+
+    def test_parallel_map_writeback(self):
+        rootnode = make_tree()
+        rootnode.parallel_map(double_value, processes=1, key=("calc", "double"))
+        for _n in rootnode:
+            self.assertEqual(_n.get_data("calc", "double"), _n.get_data("value") * 2)
+
+
+def node_value(data):
+    return data.get("value", 0)
+
+
+def sum_values(value, childvalues):
+    return value + sum(childvalues)
+
+
+def nested_values(value, childvalues):
+    return [value, childvalues]
+
+
+class ParallelFoldTests(unittest.TestCase):
+
+    def test_parallel_fold(self):
+        rootnode = make_tree()
+        total = sum(_n.get_data("value") for _n in rootnode)
+        self.assertEqual(rootnode.parallel_fold(node_value, sum_values, workers=2), total)
+        self.assertEqual(rootnode.childs[1].parallel_fold(node_value, sum_values, workers=1),
+                         sum(_n.get_data("value") for _n in rootnode.childs[1]))
+
+    def test_parallel_fold_deterministic(self):
+        rootnode = make_tree()
+        serial = rootnode.parallel_fold(node_value, nested_values, workers=1)
+        for workers in (2, 3, 7):
+            self.assertEqual(rootnode.parallel_fold(node_value, nested_values, workers=workers), serial)
+
+
+if __name__ == '__main__':
+    unittest.main()
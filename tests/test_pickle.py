@@ -0,0 +1,97 @@
+import copy
+import pickle
+import unittest
+
+from vntree import Node, generators
+
+
+def make_chain(depth):
+    rootnode = Node("root")
+    _node = rootnode
+    for ii in range(depth):
+        _node = Node("n{}".format(ii), _node, data={"depth": ii + 1})
+    return rootnode, _node
+
+
+class PickleTests(unittest.TestCase):
+
+    def setUp(self):
+        self.rootnode = generators.make_tree(200, seed=7, fanout=(0, 4), payload="nested")
+        self.rootnode.childs[0].note = "attribute"
+
+    def check_links(self, rootnode):
+        self.assertIsNone(rootnode.parent)
+        for _node in rootnode:
+            for _child in _node.childs:
+                self.assertIs(_child.parent, _node)
+
+    def test_roundtrip(self):
+        for protocol in (2, 4, pickle.HIGHEST_PROTOCOL):
+            newtree = pickle.loads(pickle.dumps(self.rootnode, protocol=protocol))
+            self.assertEqual(newtree.to_treedict(), self.rootnode.to_treedict())
+            self.assertEqual(newtree.childs[0].note, "attribute")
+            self.check_links(newtree)
+
+    def test_node(self):
+        # a node is pickled and copied with its tree
+        _node = self.rootnode.childs[1].childs[0]
+        for newnode in (pickle.loads(pickle.dumps(_node)), copy.deepcopy(_node)):
+            self.assertEqual(newnode._path, _node._path)
+            self.assertEqual(newnode._root.to_treedict(), self.rootnode.to_treedict())
+            self.check_links(newnode._root)
+        _nodes = pickle.loads(pickle.dumps([_node, self.rootnode]))
+        self.assertIs(_nodes[0]._root, _nodes[1])
+
+    def test_deep(self):
+        rootnode, leaf = make_chain(20000)
+        for newtree in (pickle.loads(pickle.dumps(rootnode)), copy.deepcopy(rootnode), rootnode.clone()):
+            _node = newtree
+            while _node.childs:
+                self.assertIs(_node.childs[0].parent, _node)
+                _node = _node.childs[0]
+            self.assertEqual(_node._id, leaf._id)
+            self.assertEqual(_node.get_data("depth"), 20000)
+        newleaf = copy.deepcopy(leaf)
+        self.assertEqual(newleaf._level, 20001)
+        newleaf = pickle.loads(pickle.dumps(leaf))
+        self.assertEqual(newleaf._level, 20001)
+        self.assertEqual(newleaf._id, leaf._id)
+
+    def test_clone(self):
+        _node = self.rootnode.childs[1]
+        _clone = _node.clone()
+        self.assertIsNone(_clone.parent)
+        self.assertEqual(_clone.to_treedict(), _node.to_treedict())
+        self.check_links(_clone)
+        _clone.childs[0].set_data("new", value=1)
+        self.assertIsNone(_node.childs[0].get_data("new"))
+        _clone = _node.clone(change_id=True)
+        self.assertNotEqual(_clone._id, _node._id)
+
+    def test_buffers(self):
+        # only clone shares the large buffers
+        _node = self.rootnode.childs[0]
+        _node.data["blob"] = bytearray(1 << 20)
+        self.assertIsNot(copy.deepcopy(self.rootnode).childs[0].data["blob"], _node.data["blob"])
+        self.assertIsNot(copy.deepcopy(_node).data["blob"], _node.data["blob"])
+        self.assertIs(_node.clone().data["blob"], _node.data["blob"])
+
+    def test_shared_references(self):
+        # references between nodes are mapped to the copies
+        _node = self.rootnode.childs[0]
+        _node.other = self.rootnode.childs[1]
+        for newtree in (copy.deepcopy(self.rootnode), pickle.loads(pickle.dumps(self.rootnode))):
+            self.assertIs(newtree.childs[0].other, newtree.childs[1])
+
+    def test_previous_state(self):
+        # the state of the nodes pickled by earlier versions
+        rootnode = Node.__new__(Node)
+        child = Node.__new__(Node)
+        rootnode.__setstate__({"data": {"_vntree": {"name": "root"}}, "parent": None, "childs": [child]})
+        child.__setstate__({"data": {"_vntree": {"name": "child"}}, "parent": rootnode, "childs": []})
+        self.assertEqual(rootnode.childs[0].name, "child")
+        self.assertIs(child.parent, rootnode)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+
+from vntree import Node, generators, lazy, vn3cfile
+
+
+class VN3CTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fpath = os.path.join(self.tmpdir.name, "tree.vn3c")
+        self.rootnode = generators.make_tree(2000, seed=6, fanout=(0, 10), payload="nested")
+        self.rootnode.childs[0].note = "attribute"
+        self.rootnode._vntree_fpath = os.path.abspath(self.fpath)
+        self.assertTrue(self.rootnode.savefile(self.fpath, format="vn3c", chunksize=100))
+        self.loaded = []
+        _chunk = vn3cfile.ChunkedTree.chunk
+        def chunk(source, key):
+            self.loaded.append(key)
+            return _chunk(source, key)
+        self._chunk = _chunk
+        vn3cfile.ChunkedTree.chunk = chunk
+
+    def tearDown(self):
+        vn3cfile.ChunkedTree.chunk = self._chunk
+        self.tmpdir.cleanup()
+
+    def test_chunks(self):
+        source = vn3cfile.ChunkedTree(self.fpath)
+        self.assertGreater(len(source.directory), 20)
+        _sizes = []
+        for key in range(len(source.directory)):
+            _treedict = source.chunk(key)
+            _stack, _size = [_treedict], 0
+            while _stack:
+                _dct = _stack.pop()
+                _size += 1
+                _stack.extend(_c for _c in _dct["childs"] if "_vn3c" not in _c)
+            _sizes.append(_size)
+        self.assertLessEqual(max(_sizes), 100)
+        self.assertEqual(sum(_sizes), 2000)
+
+    def test_full_load(self):
+        rootnode = Node.openfile(self.fpath)
+        self.assertNotIsInstance(rootnode, lazy.LazyNodeMixin)
+        self.assertEqual(rootnode.to_treedict(), self.rootnode.to_treedict())
+        self.assertEqual(rootnode.childs[0].note, "attribute")
+
+    def test_lazy(self):
+        rootnode = Node.openfile(self.fpath, lazy=True)
+        self.assertIsInstance(rootnode, lazy.LazyNodeMixin)
+        self.assertEqual(self.loaded, [0])
+        _target = list(self.rootnode)[-1]
+        _node = rootnode.get_node_by_path(_target._path)
+        self.assertEqual(_node.data, _target.data)
+        self.assertLess(len(self.loaded), 6)
+        self.assertEqual(rootnode.to_treedict(), self.rootnode.to_treedict())
+        self.assertEqual(len(self.loaded), len(vn3cfile.ChunkedTree(self.fpath).directory))
+
+    def test_lazy_maintainer(self):
+        rootnode = Node.openfile(self.fpath, lazy=True)
+        calls = []
+        rootnode.add_maintainer(lambda root, changes: calls.append(changes))
+        _target = list(self.rootnode)[-1]
+        _node = rootnode.get_node_by_path(_target._path)
+        _node.set_data("value", value="changed")
+        self.assertEqual(len(calls), 1)
+        self.assertIs(calls[0][0].node, _node)
+
+    def test_rewrite_chunk(self):
+        rootnode = Node.openfile(self.fpath, lazy=True)
+        _target = list(self.rootnode)[-1]
+        _node = rootnode.get_node_by_path(_target._path)
+        _node.data["value"] = "changed"
+        Node("new", _node)
+        _size = os.path.getsize(self.fpath)
+        self.assertTrue(_node.rewrite_chunk())
+        self.assertLess(os.path.getsize(self.fpath) - _size, _size / 4)
+        self.assertTrue(rootnode.rewrite_chunk())
+        newtree = Node.openfile(self.fpath)
+        self.assertEqual(newtree.to_treedict(), rootnode.to_treedict())
+        self.assertEqual(newtree.get_node_by_path(_target._path).data["value"], "changed")
+        self.assertFalse(self.rootnode.rewrite_chunk())
+        # saving a lazy tree to its own file
+        rootnode = Node.openfile(self.fpath, lazy=True)
+        self.assertTrue(rootnode.savefile(format="vn3c"))
+        self.assertEqual(Node.openfile(self.fpath).to_treedict(), newtree.to_treedict())
+
+    def test_invalid(self):
+        fpath = os.path.join(self.tmpdir.name, "tree.vn3")
+        self.assertTrue(self.rootnode.savefile(fpath))
+        self.assertFalse(Node.openfile(fpath, lazy=True))
+        self.assertFalse(self.rootnode.savefile(fpath, format="vn3c", chunksize=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
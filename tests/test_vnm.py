@@ -0,0 +1,86 @@
+import copy
+import os
+import pickle
+import tempfile
+import unittest
+
+from vntree import Node, generators, lazy, vnmfile
+
+
+class VNMTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.fpath = os.path.join(self.tmpdir.name, "tree.vnm")
+        self.rootnode = generators.make_tree(500, seed=4, fanout=(6, 8), payload="nested")
+        self.rootnode.childs[0].data["blob"] = bytes(range(256)) * 8
+        self.rootnode.childs[1].note = "attribute"
+        self.rootnode.childs[2].data["_vntree"] = {"version": 2}  # no name
+        self.rootnode.childs[3].set_data("_vntree", "version", value=2)
+        self.rootnode.childs[4].data["_vntree"] = {"version": 2, "_id": "id4", "name": "v2"}
+        self.rootnode._vntree_fpath = os.path.abspath(self.fpath)
+        self.assertTrue(self.rootnode.savefile(self.fpath, format="vnm"))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_full_load(self):
+        rootnode = Node.openfile(self.fpath)
+        self.assertNotIsInstance(rootnode, lazy.LazyNodeMixin)
+        self.assertEqual(rootnode.to_treedict(), self.rootnode.to_treedict())
+        self.assertEqual(rootnode.childs[1].note, "attribute")
+        self.assertEqual(rootnode.to_JSON(default=str), self.rootnode.to_JSON(default=str))
+
+    def test_mmap(self):
+        rootnode = Node.openfile(self.fpath, mmap=True)
+        self.assertIsInstance(rootnode, lazy.LazyNodeMixin)
+        self.assertEqual(rootnode.to_treedict(), self.rootnode.to_treedict())
+        self.assertEqual(rootnode.childs[1].note, "attribute")
+        self.assertEqual(rootnode.to_JSON(default=str), self.rootnode.to_JSON(default=str))
+        self.assertIsInstance(rootnode.childs[0].data["blob"], bytes)
+        rootnode = Node.openfile(self.fpath, mmap=True, zerocopy=True)
+        _blob = rootnode.childs[0].data["blob"]
+        self.assertIsInstance(_blob, memoryview)
+        self.assertEqual(bytes(_blob), self.rootnode.childs[0].data["blob"])
+
+    def test_lookups_touch_few_nodes(self):
+        _target = list(self.rootnode)[-1]
+        _loaded = []
+        _node_values = vnmfile.MappedTree.node_values
+        def node_values(source, idx):
+            _loaded.append(idx)
+            return _node_values(source, idx)
+        rootnode = Node.openfile(self.fpath, mmap=True)
+        source = rootnode._vn_src[0]
+        source.node_values = node_values.__get__(source)
+        _node = rootnode.get_node_by_id(_target._id)
+        self.assertEqual(_node._path, _target._path)
+        self.assertLess(len(_loaded), 20)
+        _node = rootnode.get_node_by_path(_target._path)
+        self.assertEqual(_node.data, _target.data)
+        self.assertLess(len(_loaded), 20)
+        self.assertIsNone(rootnode.get_node_by_id("no such _id"))
+
+    def test_modify_copy_pickle(self):
+        rootnode = Node.openfile(self.fpath, mmap=True)
+        _new = Node("new", rootnode.childs[3])
+        self.assertIs(rootnode.get_node_by_id(_new._id), _new)
+        _removed = rootnode.childs[4]
+        rootnode.remove_child(node=_removed)
+        self.assertIsNone(rootnode.get_node_by_id(_removed._id))
+        _clone = rootnode.clone()
+        self.assertIs(type(_clone), Node)
+        self.assertEqual(_clone.to_treedict(), rootnode.to_treedict())
+        _child = pickle.loads(pickle.dumps(rootnode.childs[1]))
+        self.assertIs(type(_child), Node)
+        self.assertEqual(_child.note, "attribute")
+        self.assertEqual(copy.deepcopy(rootnode.childs[2]).data, self.rootnode.childs[2].data)
+
+    def test_invalid(self):
+        fpath = os.path.join(self.tmpdir.name, "tree.vn3")
+        self.assertTrue(self.rootnode.savefile(fpath))
+        self.assertFalse(Node.openfile(fpath, mmap=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
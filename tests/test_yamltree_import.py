@@ -1,8 +1,11 @@
+import os
+import tempfile
+import textwrap
 import unittest
 
 import yaml
 
-from vntree import Node
+from vntree import Node, generators
 
 Node.setup_yaml()
 
@@ -47,6 +50,64 @@ class BasicTests(unittest.TestCase):
         self.assertFalse(ytreeroot is rootnode)
         self.assertEqual(rootnode.tree_compare(ytreeroot), 1.0)
 
+    def test_tree2yaml(self):
+        ytree = rootnode.tree2yaml()
+        self.assertTrue(ytree.startswith("# «vntree» YAML format"))
+        ytreeroot = Node.yaml2tree(ytree)
+        self.assertEqual([_n.name for _n in ytreeroot], [_n.name for _n in rootnode])
+        self.assertEqual([_n.get_data("test") for _n in ytreeroot], [_n.get_data("test") for _n in rootnode])
+        self.assertNotIn("_vntree", yaml.safe_load(ytree.replace("!Node", ""))[0]["data"])
+
+    def test_tree2yaml_treemeta(self):
+        tree = generators.make_tree(500, seed=3, fanout=(0, 5), payload="nested")
+        shared = [1, 2.5, "null"]
+        tree.childs[0].data.update({"a": shared, "b": shared, "name": "«ü»", "none": None})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fpath = tree.tree2yaml(os.path.join(tmpdir, "tree.yaml"), treemeta=True)
+            ytreeroot = Node.yaml2tree(fpath)
+        self.assertEqual(ytreeroot.to_treedict(), tree.to_treedict())
+        self.assertIs(ytreeroot.childs[0].data["a"], ytreeroot.childs[0].data["b"])
+        # a sub-tree is written without its parent
+        ytreeroot = Node.yaml2tree(tree.childs[0].tree2yaml(treemeta=True))
+        self.assertEqual(ytreeroot.to_treedict(), tree.childs[0].to_treedict())
+
+    def test_nested_layout(self):
+        tree = generators.make_tree(500, seed=3, fanout=(0, 5), payload="nested")
+        tree.childs[0].note = "attribute"
+        ytree = tree.tree2yaml(treemeta=True, layout="nested")
+        self.assertEqual(yaml.safe_load(ytree), tree.to_treedict())
+        ytreeroot = Node.yaml2tree(ytree)
+        self.assertEqual(ytreeroot.to_treedict(), tree.to_treedict())
+        self.assertEqual(ytreeroot.childs[0].note, "attribute")
+        ytreeroot = Node.yaml2tree(tree.tree2yaml(layout="nested"))
+        self.assertEqual([_n.name for _n in ytreeroot], [_n.name for _n in tree])
+        with self.assertRaises(ValueError):
+            tree.tree2yaml(layout="flat")
+
+    def test_yaml_values(self):
+        # the values are loaded as with yaml.safe_load
+        ytree = """
+        name: root
+        data:
+          base: &b {p: 1, q: 2}
+          merged: {<<: *b, q: 3}
+          omap: !!omap [a: 1, b: &z [012, 0x1f, "7", *b]]
+          alias: *z
+          date: 2020-01-02
+        childs:
+        - {name: child, data: {none: ~, flag: yes}}
+        """
+        ytreeroot = Node.yaml2tree(textwrap.dedent(ytree))
+        _data = ytreeroot.data
+        del _data["_vntree"]
+        self.assertEqual(_data, yaml.safe_load(textwrap.dedent(ytree))["data"])
+        self.assertIs(_data["alias"], _data["omap"][1][1])
+        self.assertIs(_data["alias"][3], _data["base"])
+        self.assertEqual(ytreeroot.childs[0].data["flag"], True)
+        self.assertEqual(ytreeroot.childs[0].name, "child")
+        with self.assertRaises(yaml.YAMLError):
+            Node.yaml2tree("- !Node &a\n  name: a\n- !Node\n  parent: *b\n")
+
 
 if __name__ == '__main__':
     unittest.main()
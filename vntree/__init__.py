@@ -12,9 +12,11 @@ __email__ = "stephenmce@gmail.com"
 __description__ = """«vntree» is a simple tree data structure in Python."""
 __url__ = "https://github.com/qwilka/vntree"
 
-from .node import Node, NodeAttr, TreeAttr  # , _empty
+from .node import Node, NodeAttr, TreeAttr, TreeChange, TreeEvent, tree_events, tree_cached  # , _empty
 from .embed import EmbedNode
 from . import utilities
+from . import instrumentation
+from .instrumentation import stats
 
 
 try:
@@ -0,0 +1,205 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Out-of-band buffers for large binary values in the node data (NumPy
+arrays, `bytes`, `bytearray`...), see `Node.savefile(..., protocol=5)`,
+`Node.openfile`, `Node.to_treedict` and `Node.clone`.
+
+A «vn3» file saved with pickle protocol 5 or higher has the layout:
+    header: b"VN3B" | pickle size | number of buffers (2 x uint64)
+    buffer table: offset, size and kind of each buffer (3 x uint64)
+    pickle: the `treedict` of the tree (see `Node.to_treedict`)
+    buffers: each aligned to `ALIGN` bytes
+
+The buffers are the values of at least `BUFFER_MIN` bytes that pickle
+protocol 5 serializes out-of-band (`pickle.PickleBuffer`, and the NumPy
+arrays), and the `bytes` and `bytearray` values of at least `BUFFER_MIN`
+bytes (referenced by their number with a pickle persistent ID).
+`memoryview` values, which cannot be pickled, are saved as `bytes`.
+
+When the file is opened, it is memory-mapped copy-on-write, so that the
+NumPy arrays (and with `zerocopy=True` the `bytes` values, as read-only
+memoryviews) use the pages of the file instead of a copy in memory; the
+other `bytes` and the `bytearray` values are read from the file.
+
+`to_treedict`, `from_treedict` and `clone` copy the node data with a
+`copy.deepcopy` memo holding the large buffers (see `share_memo`), so the
+copies refer to the same buffers.
+
+References
+https://peps.python.org/pep-0574/
+https://docs.python.org/3/library/pickle.html#out-of-band-buffers
+"""
+from array import array
+import io
+import logging
+import mmap
+import pickle
+import struct
+import sys
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VN3B"
+ALIGN = 64  # alignment of the buffers in the file
+BUFFER_MIN = 1 << 16  # minimum size in bytes of an out-of-band buffer
+
+_HEADER = struct.Struct("<4s4xQQ")
+_PICKLEBUFFER, _BYTES, _BYTEARRAY = 0, 1, 2
+_ATOMIC = frozenset((str, int, float, bool, type(None), bytes))
+_VIEWS = (memoryview, pickle.PickleBuffer)
+_SWAP = sys.byteorder != "little"  # the buffer table is little-endian
+
+
+def _nbytes(obj):
+    """The size in bytes of a large buffer value, or 0 for other values."""
+    _type = type(obj)
+    if _type is bytearray:
+        return len(obj)
+    if _type in _VIEWS or hasattr(_type, "__array_interface__"):
+        return getattr(obj, "nbytes", 0) or memoryview(obj).nbytes
+    return 0
+
+
+def share_memo(objs, memo=None):
+    """Return a `copy.deepcopy` memo in which the large buffers contained in
+    the dicts, lists and tuples of `objs` are mapped to themselves, so that
+    they are shared by the copies rather than copied.
+
+    The memoryviews (which cannot be copied) are shared whatever their
+    size, the other buffers if they have at least `BUFFER_MIN` bytes.
+
+    :param objs: iterable of the values to be copied.
+    :param memo: the memo dict to update, or `None` for a new memo.
+    :type memo: dict or None
+    :returns: the memo.
+    :rtype: dict
+    """
+    memo = {} if memo is None else memo
+    _stack = list(objs)
+    while _stack:
+        _obj = _stack.pop()
+        _type = type(_obj)
+        if _type in _ATOMIC:
+            continue
+        if _type is dict:
+            _stack.extend(_obj.values())
+        elif _type is list or _type is tuple:
+            _stack.extend(_obj)
+        elif _type is memoryview or _nbytes(_obj) >= BUFFER_MIN:
+            memo[id(_obj)] = _obj
+    return memo
+
+
+class _Pickler(pickle.Pickler):
+    """Pickler collecting the out-of-band buffers as `(kind, buffer)` in `buffers`."""
+    def __init__(self, fh, protocol, buffers):
+        super().__init__(fh, protocol=protocol, buffer_callback=self._buffer)
+        self.buffers = buffers
+
+    def _buffer(self, picklebuffer):
+        _raw = picklebuffer.raw()
+        if _raw.nbytes < BUFFER_MIN:
+            return True  # pickled in-band
+        self.buffers.append((_PICKLEBUFFER, _raw))
+        return False
+
+    def persistent_id(self, obj):
+        _type = type(obj)
+        if _type is memoryview or ((_type is bytes or _type is bytearray) and len(obj) >= BUFFER_MIN):
+            self.buffers.append((_BYTEARRAY if _type is bytearray else _BYTES, obj))
+            return len(self.buffers) - 1
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, fh, table, views):
+        super().__init__(fh, buffers=[_v for _v, _t in zip(views, table[2::3]) if _t == _PICKLEBUFFER])
+        self.views = views
+
+    def persistent_load(self, pid):
+        _view = self.views[pid]
+        # a `bytes` value of the mapped file (`zerocopy=True`) is read-only
+        return _view.toreadonly() if type(_view) is memoryview else _view
+
+
+def dump(obj, fh, protocol=5):
+    """Pickle `obj` to a binary file object, with the large buffers out-of-band.
+
+    :param protocol: pickle protocol, at least 5.
+    :type protocol: int
+    """
+    if protocol < 5:
+        raise ValueError("buffers: pickle protocol={} not valid, must be at least 5.".format(protocol))
+    _buffers = []
+    _stream = io.BytesIO()
+    _Pickler(_stream, protocol, _buffers).dump(obj)
+    _pickled = _stream.getbuffer()
+    _table = array("Q", [0]) * (3 * len(_buffers))
+    _pos = _HEADER.size + _table.itemsize * len(_table) + len(_pickled)
+    for ii, (_kind, _buf) in enumerate(_buffers):
+        _pos += -_pos % ALIGN
+        _size = _buf.nbytes if isinstance(_buf, memoryview) else len(_buf)
+        _table[3 * ii:3 * ii + 3] = array("Q", (_pos, _size, _kind))
+        _pos += _size
+    if _SWAP:
+        _table.byteswap()
+    fh.write(_HEADER.pack(MAGIC, len(_pickled), len(_buffers)))
+    fh.write(_table.tobytes())
+    fh.write(_pickled)
+    _pos = _HEADER.size + _table.itemsize * len(_table) + len(_pickled)
+    for _kind, _buf in _buffers:
+        _pad = -_pos % ALIGN
+        fh.write(b"\x00" * _pad)
+        fh.write(_buf)
+        _pos += _pad + (_buf.nbytes if isinstance(_buf, memoryview) else len(_buf))
+
+
+def load(fh, filepath=None, zerocopy=False):
+    """Unpickle a file written by `dump`.
+
+    :param fh: binary file object, at the start of the file.
+    :param filepath: the file path, to memory-map the file (copy-on-write),
+        or `None` to read the buffers into memory (for example from a
+        compressed file).
+    :type filepath: str or None
+    :param zerocopy: if True (with `filepath`), the `bytes` values are
+        returned as read-only memoryviews of the mapped file.
+    :type zerocopy: bool
+    :returns: the unpickled object.
+    """
+    _magic, _psize, _nbuffers = _HEADER.unpack(fh.read(_HEADER.size))
+    if _magic != MAGIC:
+        raise ValueError("buffers: not a vn3 file with out-of-band buffers, magic number {!r}.".format(_magic))
+    _table = array("Q")
+    _table.frombytes(fh.read(_table.itemsize * 3 * _nbuffers))
+    if _SWAP:
+        _table.byteswap()
+    _pickled = fh.read(_psize)
+    _views = []
+    _mapped = None
+    _pos = _HEADER.size + _table.itemsize * len(_table) + _psize
+    for ii in range(_nbuffers):
+        _offset, _size, _kind = _table[3 * ii:3 * ii + 3]
+        if filepath is not None and (_kind == _PICKLEBUFFER or zerocopy and _kind == _BYTES):
+            if _mapped is None:
+                with open(filepath, "rb") as _fh:
+                    _mapped = memoryview(mmap.mmap(_fh.fileno(), 0, access=mmap.ACCESS_COPY))
+            _views.append(_mapped[_offset:_offset + _size])
+            continue
+        # the `bytes` and `bytearray` values are copies, they are read from the file
+        if _offset != _pos:
+            fh.seek(_offset)
+        if _kind == _BYTES:
+            _view = fh.read(_size)
+            _nread = len(_view)
+        else:
+            _view = bytearray(_size)
+            _nread = fh.readinto(_view)
+        if _nread != _size:
+            raise ValueError("buffers: file truncated in buffer {}.".format(ii))
+        _views.append(memoryview(_view) if _kind == _PICKLEBUFFER else _view)
+        _pos = _offset + _size
+    return _Unpickler(io.BytesIO(_pickled), _table, _views).load()
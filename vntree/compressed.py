@@ -0,0 +1,142 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Streaming compression of the «vntree» files, see the `compression`
+argument of `Node.savefile`, `Node.openfile`, `Node.to_JSON`,
+`Node.from_JSON` and `Node.tree2yaml`.
+
+The compression is "gzip", "bz2" or "lzma" (the .xz format), `None` for
+no compression, or "auto" to detect it from the magic bytes at the start
+of a file that is read, or from the extension of a file that is written
+(`.gz`, `.bz2`, `.xz` or `.lzma`).
+
+The data is compressed as it is written, in blocks of `BLOCKSIZE` bytes.
+
+References
+https://docs.python.org/3/library/archiving.html
+"""
+import bz2
+import gzip
+import io
+import logging
+import lzma
+import os
+import zlib
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIONS = ("gzip", "bz2", "lzma")
+BLOCKSIZE = 1 << 20  # bytes compressed at once
+
+_EXTENSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "lzma", ".lzma": "lzma"}
+_MAGICS = ((b"\x1f\x8b", "gzip"), (b"BZh", "bz2"), (b"\xfd7zXZ\x00", "lzma"))
+_DEFAULT_LEVELS = {"gzip": 6, "bz2": 9, "lzma": 6}
+
+
+def detect(filepath, mode="r"):
+    """Return the compression of a file from its magic bytes (`mode="r"`)
+    or from its extension (`mode="w"`), or `None`."""
+    if "r" in mode:
+        with open(filepath, "rb") as fh:
+            _head = fh.read(6)
+        for _magic, _compression in _MAGICS:
+            if _head.startswith(_magic):
+                return _compression
+        return None
+    return _EXTENSIONS.get(os.path.splitext(filepath)[1].lower())
+
+
+def resolve(compression, filepath, mode="r"):
+    """Return the compression of `filepath` for the `compression` argument."""
+    if compression is None or compression is False:
+        return None
+    if compression == "auto":
+        return detect(filepath, mode)
+    if compression not in COMPRESSIONS:
+        raise ValueError("compression: «compression»=«{}» not valid, must be one of {}, 'auto' or None.".format(compression, COMPRESSIONS))
+    return compression
+
+
+def compressor(compression, level=None):
+    """Return a new compressor object, with `compress` and `flush` methods."""
+    if level is None:
+        level = _DEFAULT_LEVELS[compression]
+    if compression == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif compression == "bz2":
+        return bz2.BZ2Compressor(level)
+    return lzma.LZMACompressor(preset=level)
+
+
+class CompressedWriter(io.BufferedIOBase):
+    """Binary file object that compresses the data written to `fh`.
+
+    :param fh: binary file object for the compressed data.
+    :param compression: "gzip", "bz2" or "lzma".
+    :type compression: str
+    :param level: compression level, `None` for the default level.
+    :type level: int or None
+    :param closefd: if True, close `fh` when the writer is closed.
+    :type closefd: bool
+    """
+    def __init__(self, fh, compression, level=None, closefd=True, blocksize=BLOCKSIZE):
+        self.fh = fh
+        self.closefd = closefd
+        self.blocksize = blocksize
+        self._compressor = compressor(compression, level)
+        self._buf = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed file.")
+        self._buf += data
+        if len(self._buf) >= self.blocksize:
+            self.fh.write(self._compressor.compress(self._buf))
+            self._buf.clear()
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._buf:
+                self.fh.write(self._compressor.compress(self._buf))
+                self._buf.clear()
+            self.fh.write(self._compressor.flush())
+        finally:
+            super().close()
+            if self.closefd:
+                self.fh.close()
+
+
+def open_file(filepath, mode="r", compression="auto", level=None):
+    """Open a file for reading or writing, with streaming compression.
+
+    :param filepath: the file path.
+    :type filepath: str
+    :param mode: "r", "w" or "a" for text, "rb", "wb" or "ab" for binary.
+    :type mode: str
+    :param compression: "gzip", "bz2", "lzma", "auto" or `None`.
+    :type compression: str or None
+    :param level: compression level, `None` for the default level.
+    :type level: int or None
+    :returns: file object.
+    """
+    _compression = resolve(compression, filepath, mode)
+    if _compression is None:
+        return open(filepath, mode)
+    if "r" in mode:
+        _opener = {"gzip": gzip.open, "bz2": bz2.open, "lzma": lzma.open}[_compression]
+        _fh = _opener(filepath, "rb")
+    else:
+        # an appended file has several compressed streams, which are read back as one
+        _fh = CompressedWriter(open(filepath, "ab" if "a" in mode else "wb"), _compression,
+                               level)
+    if "b" in mode:
+        return _fh
+    return io.TextIOWrapper(_fh, encoding="utf-8")
@@ -2,6 +2,7 @@ import itertools
 import logging
 
 
+from . import node as _vnnode
 from .node import Node, NodeAttr, TreeAttr
 
 logger = logging.getLogger(__name__)
@@ -23,6 +24,10 @@ class EmbedNode(Node):
 
 
     def __iter__(self): 
+        _lock = self._vn_tstate is not None and _vnnode._snapshot_lock(self)
+        if _lock:
+            yield from _vnnode._snapshot(self, _lock)
+            return
         yield self  
         if self._active and self.childs[0] is not None:
             _i = 0
@@ -74,13 +79,34 @@ class EmbedNode(Node):
 
 
     def get_node_by_id(self, _id):
-        _tmp = self._active
-        self._active = True
-        for _n in self:
+        """Get a node by `_id`, including the embedded tree of this 
+        node instance even if it is not active. 
+
+        This does not toggle `_active`, so it is re-entrant and safe to 
+        use from several threads.
+        """
+        _lock = self._tree_lock()
+        if _lock is not None:
+            with _lock.read_locked():
+                _nodes = list(self._iter_embedded())
+        else:
+            _nodes = self._iter_embedded()
+        for _n in _nodes:
             if _n._id == _id:
-                self._active = _tmp
                 return _n
-        self._active = _tmp
+
+
+    def _iter_embedded(self):
+        """Iterate as `__iter__` would with this node instance activated."""
+        _stack = [self]
+        while _stack:
+            _n = _stack.pop()
+            yield _n
+            if isinstance(_n, EmbedNode) and _n is not self and not _n._active:
+                _childs = _n.childs[1:]
+            else:
+                _childs = _n.childs
+            _stack.extend(reversed([_c for _c in _childs if _c is not None]))
 
 
 # if __name__ == "__main__":
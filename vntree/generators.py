@@ -0,0 +1,306 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Seeded synthetic trees for load testing and benchmarks.
+
+The shape of the tree (the number of children of each node) is generated
+first, breadth-first, into compact integer arrays. The nodes are then
+streamed in pre-order as flat records, which can be built into `Node`
+instances or a treedict, or written to a file, without building the
+whole tree in memory (except the vn3 pickle format, see `write_vn3`).
+
+A flat record is a tuple `(idx, parent, position, depth, name, _id, data)`,
+where `idx` is the pre-order index of the node, `parent` is the pre-order
+index of the parent node (-1 for the root node), `position` is the index
+of the node in its parent's `childs`, `depth` is the length of the node
+`_coord` (0 for the root node), and `data` is the node payload.
+
+References
+https://en.wikipedia.org/wiki/Tree_traversal#Pre-order,_NLR
+"""
+from array import array
+import collections
+import itertools
+import json
+import logging
+import os
+import pickle
+import random
+import sqlite3
+import string
+
+from .node import Node
+
+logger = logging.getLogger(__name__)
+
+NAME_POOL = 16
+
+
+def _fanout_func(fanout):
+    """Return a function `(rng, depth) -> number of children`."""
+    if callable(fanout):
+        return fanout
+    elif isinstance(fanout, int):
+        return lambda rng, depth: fanout
+    elif isinstance(fanout, (tuple, list)) and len(fanout) == 2:
+        _lo, _hi = fanout
+        return lambda rng, depth: rng.randint(_lo, _hi)
+    raise ValueError("generators: argument «fanout»=«{}» not valid, must be int, (min, max) or callable.".format(fanout))
+
+
+def tree_shape(nnodes, rng, fanout=8, max_depth=None):
+    """Generate the shape of a tree breadth-first.
+
+    A node that is the last in the breadth-first queue always gets at
+    least one child (unless it is at `max_depth`), so that the tree
+    reaches `nnodes` nodes.
+
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :param rng: random number generator.
+    :type rng: random.Random
+    :param fanout: number of children of each node, an int, a `(min, max)`
+        tuple for a uniform distribution, or a function `(rng, depth) -> int`.
+    :param max_depth: maximum depth of the tree, or `None`.
+    :type max_depth: int or None
+    :returns: `(offsets, depths)` arrays in breadth-first order, the
+        children of node `i` are nodes `offsets[i]` to `offsets[i+1]-1`.
+    :rtype: tuple
+    """
+    _draw = _fanout_func(fanout)
+    _offsets = array("I", [nnodes]) * (nnodes + 1)
+    _depths = array("I", [0])
+    _count = 1
+    for ii in range(nnodes):
+        if _count >= nnodes:
+            break
+        _depth = _depths[ii]
+        if max_depth is not None and _depth >= max_depth:
+            _k = 0
+        else:
+            _k = _draw(rng, _depth)
+        if _k < 1 and ii == _count - 1:
+            if max_depth is not None and _depth >= max_depth:
+                raise ValueError("generators: cannot generate {} nodes with max_depth={}, only {} nodes generated.".format(nnodes, max_depth, _count))
+            _k = 1
+        _k = min(_k, nnodes - _count)
+        _offsets[ii] = _count
+        _depths.extend(array("I", [_depth + 1]) * _k)
+        _count += _k
+    return _offsets, _depths
+
+
+def _payload_func(payload, payload_keys, payload_size, rng):
+    """Return a function `(rng, idx, depth) -> dict` for the node payloads."""
+    if callable(payload):
+        return payload
+    if payload is None:
+        return lambda rng, idx, depth: {}
+    # random.random is much faster than random.randrange for bulk values
+    _random = rng.random
+    _text = "".join(rng.choice(string.ascii_letters) for ii in range(max(payload_size, 1) * 256))
+    _span = len(_text) - payload_size + 1
+    _keys = ["key{}".format(jj) for jj in range(payload_keys)]
+    def _string():
+        _off = int(_random() * _span)
+        return _text[_off:_off+payload_size]
+    if payload == "flat":
+        _skeys, _ikeys = _keys[0::2], _keys[1::2]
+        def _flat(rng, idx, depth):
+            _data = {_k: _string() for _k in _skeys}
+            for _k in _ikeys:
+                _data[_k] = int(_random() * 1000000)
+            return _data
+        return _flat
+    elif payload == "nested":
+        return lambda rng, idx, depth: {_k: {"text": _string(), "number": int(_random() * 1000000)} for _k in _keys}
+    raise ValueError("generators: argument «payload»=«{}» not valid, must be 'flat', 'nested', None or callable.".format(payload))
+
+
+def iter_records(nnodes, *, seed=0, fanout=8, max_depth=None, names="unique",
+                duplicate_ids=0.0, payload="flat", payload_keys=2, payload_size=16):
+    """Generate the nodes of a seeded synthetic tree as flat records in pre-order.
+
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :param seed: seed for the random number generator; the same arguments
+        always generate the same tree.
+    :param fanout: number of children of each node, an int, a `(min, max)`
+        tuple for a uniform distribution, or a function `(rng, depth) -> int`.
+    :param max_depth: maximum depth of the tree, or `None`.
+    :type max_depth: int or None
+    :param names: "unique" for names that are unique in the tree, "sibling"
+        for names that are only unique among siblings, or "duplicate" for
+        names chosen at random from a small pool.
+    :type names: str
+    :param duplicate_ids: fraction of nodes that re-use the `_id` of a
+        recently generated node.
+    :type duplicate_ids: float
+    :param payload: "flat", "nested", `None` for no payload, or a
+        function `(rng, idx, depth) -> dict`.
+    :param payload_keys: number of keys in the "flat" or "nested" payload.
+    :type payload_keys: int
+    :param payload_size: length of the strings in the "flat" or "nested" payload.
+    :type payload_size: int
+    :returns: generator of records `(idx, parent, position, depth, name, _id, data)`.
+    """
+    if names not in ("unique", "sibling", "duplicate"):
+        raise ValueError("generators: argument «names»=«{}» not valid, must be 'unique', 'sibling' or 'duplicate'.".format(names))
+    rng = random.Random(seed)
+    _offsets, _depths = tree_shape(nnodes, rng, fanout, max_depth)
+    _payload = _payload_func(payload, payload_keys, payload_size, rng)
+    _getrandbits = rng.getrandbits
+    _random = rng.random
+    _recent = collections.deque(maxlen=1024)
+    # stack of (breadth-first idx, parent pre-order idx, position)
+    _stack = [(0, -1, 0)] if nnodes > 0 else []
+    _idx = 0
+    while _stack:
+        _bfs, _parent, _position = _stack.pop()
+        _depth = _depths[_bfs]
+        if names == "unique":
+            _name = f"n{_idx}"
+        elif names == "sibling":
+            _name = f"c{_position}"
+        else:
+            _name = f"n{int(_random() * NAME_POOL)}"
+        if duplicate_ids and _recent and _random() < duplicate_ids:
+            _id = _recent[int(_random() * len(_recent))]
+        else:
+            _h = "%032x" % _getrandbits(128)
+            _id = f"{_h[:8]}-{_h[8:12]}-4{_h[13:16]}-{_h[16:20]}-{_h[20:]}"
+            _recent.append(_id)
+        yield (_idx, _parent, _position, _depth, _name, _id, _payload(rng, _idx, _depth))
+        _lo, _hi = _offsets[_bfs], _offsets[_bfs+1]
+        if _hi > _lo:
+            _stack.extend(zip(range(_hi - 1, _lo - 1, -1), itertools.repeat(_idx), range(_hi - _lo - 1, -1, -1)))
+        _idx += 1
+
+
+def make_tree(nnodes, cls=Node, **kwargs):
+    """Generate a synthetic tree of `Node` instances.
+
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :param cls: the node class.
+    :param kwargs: tree specification, see `iter_records`.
+    :returns: the root node.
+    :rtype: Node
+    """
+    _path = []
+    rootnode = None
+    for _idx, _parent, _pos, _depth, _name, _id, _data in iter_records(nnodes, **kwargs):
+        del _path[_depth:]
+        _node = cls(_name, _path[-1] if _path else None, data=_data, _id=_id)
+        _path.append(_node)
+        if rootnode is None:
+            rootnode = _node
+    return rootnode
+
+
+def make_treedict(nnodes, **kwargs):
+    """Generate a synthetic tree as a treedict (see `Node.to_treedict`).
+
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :param kwargs: tree specification, see `iter_records`.
+    :returns: the treedict of the root node.
+    :rtype: dict
+    """
+    _path = []
+    _treedict = None
+    for _idx, _parent, _pos, _depth, _name, _id, _data in iter_records(nnodes, **kwargs):
+        del _path[_depth:]
+        _data["_vntree"] = {"name": _name, "_id": _id}
+        _dct = {"data": _data, "childs": []}
+        if _path:
+            _path[-1]["childs"].append(_dct)
+        else:
+            _treedict = _dct
+        _path.append(_dct)
+    return _treedict
+
+
+def write_vn3(filepath, nnodes, protocol=4, **kwargs):
+    """Generate a synthetic tree and save it as a vntree pickle file
+    (see `Node.savefile`).
+
+    Note: the vn3 format is a pickle of the complete treedict, so the
+    treedict (but not the `Node` instances) is built in memory.
+
+    :param filepath: the file path.
+    :type filepath: str
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :param kwargs: tree specification, see `iter_records`.
+    :returns: the absolute file path.
+    :rtype: str
+    """
+    _treedict = make_treedict(nnodes, **kwargs)
+    with open(filepath, "wb") as _fh:
+        pickle.dump(_treedict, _fh, protocol=protocol)
+    return os.path.abspath(filepath)
+
+
+def write_json(filepath, nnodes, **kwargs):
+    """Generate a synthetic tree and stream it to a JSON file
+    (see `Node.to_JSON`).
+
+    :param filepath: the file path.
+    :type filepath: str
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :param kwargs: tree specification, see `iter_records`.
+    :returns: the absolute file path.
+    :rtype: str
+    """
+    _dumps = json.dumps
+    _prevdepth = -1
+    with open(filepath, "w", buffering=1<<20) as _fh:
+        _write = _fh.write
+        for _idx, _parent, _pos, _depth, _name, _id, _data in iter_records(nnodes, **kwargs):
+            _data["_vntree"] = {"name": _name, "_id": _id}
+            if _depth <= _prevdepth:
+                _write("]}" * (_prevdepth - _depth + 1) + ", ")
+            _write('{"data": ' + _dumps(_data) + ', "childs": [')
+            _prevdepth = _depth
+        _write("]}" * (_prevdepth + 1))
+    return os.path.abspath(filepath)
+
+
+def write_sqlite(filepath, nnodes, table="nodes", chunksize=10000, **kwargs):
+    """Generate a synthetic tree and stream it to an SQLite table with
+    columns `idx, parent, position, name, _id, data`, where `data` is JSON.
+
+    :param filepath: the file path.
+    :type filepath: str
+    :param nnodes: the number of nodes.
+    :type nnodes: int
+    :param table: the table name.
+    :type table: str
+    :param chunksize: the number of rows inserted per `executemany`.
+    :type chunksize: int
+    :param kwargs: tree specification, see `iter_records`.
+    :returns: the absolute file path.
+    :rtype: str
+    """
+    _dumps = json.dumps
+    _conn = sqlite3.connect(filepath)
+    try:
+        _conn.execute("DROP TABLE IF EXISTS {}".format(table))
+        _conn.execute("CREATE TABLE {} (idx INTEGER PRIMARY KEY, parent INTEGER, position INTEGER, name TEXT, _id TEXT, data TEXT)".format(table))
+        _sql = "INSERT INTO {} VALUES (?, ?, ?, ?, ?, ?)".format(table)
+        _rows = []
+        for _idx, _parent, _pos, _depth, _name, _id, _data in iter_records(nnodes, **kwargs):
+            _rows.append((_idx, _parent, _pos, _name, _id, _dumps(_data)))
+            if len(_rows) >= chunksize:
+                _conn.executemany(_sql, _rows)
+                _rows = []
+        if _rows:
+            _conn.executemany(_sql, _rows)
+        _conn.commit()
+    finally:
+        _conn.close()
+    return os.path.abspath(filepath)
@@ -0,0 +1,357 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Opt-in instrumentation of «vntree» operations.
+
+`enable()` wraps the instrumented methods (listed in `OPERATIONS`) to
+count calls and accumulate wall time in a histogram per operation;
+`disable()` restores the original methods, so there is no overhead when
+instrumentation is disabled. Nested calls of the same operation (e.g.
+the recursive calls of `to_treedict`) are counted once, and the times
+of different operations are inclusive (e.g. `savefile` includes
+`to_treedict`).
+
+Example:
+    with vntree.instrumentation.measure() as m:
+        rootnode.get_node_by_id(_id)
+    print(m.stats())
+"""
+import contextlib
+import functools
+import importlib
+import inspect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# category: [(module, object path), ...]
+OPERATIONS = {
+    "traversal": [
+        ("vntree.node", "Node.__iter__"),
+        ("vntree.node", "Node.__reversed__"),
+        ("vntree.node", "Node.__len__"),
+        ("vntree.embed", "EmbedNode.__iter__"),
+        ("vntree.embed", "EmbedNode.__reversed__"),
+    ],
+    "lookup": [
+        ("vntree.node", "Node.get_child_by_name"),
+        ("vntree.node", "Node.get_node_by_id"),
+        ("vntree.node", "Node.get_node_by_path"),
+        ("vntree.node", "Node.get_node_by_coord"),
+        ("vntree.node", "Node.find_one_node"),
+        ("vntree.node", "Node.find_one_node_by_name"),
+        ("vntree.embed", "EmbedNode.get_node_by_id"),
+    ],
+    "copy": [
+        ("vntree.node", "Node.get_data"),
+        ("vntree.node", "Node.clone"),
+    ],
+    "serialize": [
+        ("vntree.node", "Node.to_treedict"),
+        ("vntree.node", "Node.from_treedict"),
+        ("vntree.node", "Node.to_JSON"),
+        ("vntree.node", "Node.iter_JSON"),
+        ("vntree.node", "Node.from_JSON"),
+        ("vntree.node", "Node.to_ndjson"),
+        ("vntree.node", "Node.from_ndjson"),
+        ("vntree.node", "Node.savefile"),
+        ("vntree.node", "Node.openfile"),
+        ("vntree.node", "Node.to_texttree"),
+        ("vntree.node", "Node.yaml2tree"),
+        ("vntree.node", "Node.tree2yaml"),
+    ],
+    "db": [
+        ("vntree.sqlite", "SqliteNode.get_data"),
+        ("vntree.sqlite", "SqliteNode.insert_data"),
+        ("vntree.sqlite", "SqliteNode.load_data"),
+        ("vntree.sqlite", "SqliteNode.savefile"),
+        ("vntree.sqlite", "SqliteNode.openfile"),
+        ("vntree.mongo", "MongoNode.db_insert"),
+        ("vntree.mongo", "MongoNode.db_delete"),
+        ("vntree.mongo", "MongoNode.db_update"),
+        ("vntree.mongo", "MongoNode.db_load"),
+        ("vntree.mongo", "db_operation"),
+        ("vntree.mongo", "find_by_id"),
+    ],
+}
+
+# upper bounds (seconds) of the histogram buckets, the last bucket is +Inf
+BUCKETS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0)
+
+_patched = []  # (owner, attribute name, original raw attribute)
+_lock = threading.Lock()
+_local = threading.local()
+_patch_lock = threading.RLock()  # held while the methods are patched or restored
+_measures = 0  # number of `measure()` scopes in progress
+_measure_enabled = False  # True if instrumentation was enabled by `measure()`
+_exporters = []
+
+
+class Stats:
+    """Call counts and wall time histograms per operation."""
+    def __init__(self):
+        self._ops = {}
+
+    def record(self, op, category, elapsed):
+        _st = self._ops.get(op)
+        if _st is None:
+            _st = self._ops[op] = {"category": category, "calls": 0, "time": 0.0,
+                                   "min": elapsed, "max": elapsed,
+                                   "buckets": [0] * (len(BUCKETS) + 1)}
+        _st["calls"] += 1
+        _st["time"] += elapsed
+        _st["min"] = min(_st["min"], elapsed)
+        _st["max"] = max(_st["max"], elapsed)
+        for ii, _bound in enumerate(BUCKETS):
+            if elapsed <= _bound:
+                break
+        else:
+            ii = len(BUCKETS)
+        _st["buckets"][ii] += 1
+
+    def stats(self, by="operation"):
+        """Return the statistics as a dict keyed by operation (or category
+        if `by="category"`)."""
+        with _lock:
+            _ops = {op: dict(_st, buckets=list(_st["buckets"])) for op, _st in self._ops.items()}
+        if by == "operation":
+            return _ops
+        elif by == "category":
+            _cats = {}
+            for _st in _ops.values():
+                _cat = _cats.setdefault(_st["category"], {"calls": 0, "time": 0.0})
+                _cat["calls"] += _st["calls"]
+                _cat["time"] += _st["time"]
+            return _cats
+        raise ValueError("Stats.stats: argument «by»=«{}» not valid, must be 'operation' or 'category'.".format(by))
+
+    def reset(self):
+        with _lock:
+            self._ops.clear()
+
+
+_stats = Stats()
+
+
+def _record(op, category, elapsed):
+    with _lock:
+        _stats.record(op, category, elapsed)
+        for _scoped in getattr(_local, "scopes", ()):
+            _scoped.record(op, category, elapsed)
+
+
+def _active_ops():
+    _ops = getattr(_local, "active", None)
+    if _ops is None:
+        _ops = _local.active = set()
+    return _ops
+
+
+def _wrap_function(op, category, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _active = _active_ops()
+        if op in _active:
+            return func(*args, **kwargs)
+        _active.add(op)
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record(op, category, time.perf_counter() - t0)
+            _active.discard(op)
+    return wrapper
+
+
+def _wrap_generator(op, category, func):
+    """Wrap a generator function, timing the time spent in the generator."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        _active = _active_ops()
+        if op in _active:
+            yield from func(*args, **kwargs)
+            return
+        _gen = func(*args, **kwargs)
+        _elapsed = 0.0
+        try:
+            while True:
+                _active.add(op)
+                t0 = time.perf_counter()
+                try:
+                    _item = next(_gen)
+                except StopIteration:
+                    break
+                finally:
+                    _elapsed += time.perf_counter() - t0
+                    _active.discard(op)
+                yield _item
+        finally:
+            _gen.close()
+            _record(op, category, _elapsed)
+    return wrapper
+
+
+def _resolve(modname, path):
+    """Return `(owner, attribute name)` for an object path, or `None`
+    if the module cannot be imported (e.g. optional dependency missing)."""
+    try:
+        _owner = importlib.import_module(modname)
+    except ImportError:
+        return None
+    *_parents, _name = path.split(".")
+    for _parent in _parents:
+        _owner = getattr(_owner, _parent)
+    return _owner, _name
+
+
+def enable():
+    """Enable the instrumentation of the operations in `OPERATIONS`."""
+    with _patch_lock:
+        _enable()
+
+
+def _enable():
+    if _patched:
+        return
+    for category, _targets in OPERATIONS.items():
+        for modname, path in _targets:
+            _resolved = _resolve(modname, path)
+            if _resolved is None:
+                continue
+            _owner, _name = _resolved
+            if _name not in vars(_owner):
+                continue  # inherited, the base class method is instrumented
+            _raw = vars(_owner)[_name]
+            if isinstance(_raw, (classmethod, staticmethod)):
+                _func = _raw.__func__
+            else:
+                _func = _raw
+            _wrap = _wrap_generator if inspect.isgeneratorfunction(_func) else _wrap_function
+            _wrapped = _wrap(path, category, _func)
+            if isinstance(_raw, (classmethod, staticmethod)):
+                _wrapped = type(_raw)(_wrapped)
+            setattr(_owner, _name, _wrapped)
+            _patched.append((_owner, _name, _raw))
+
+
+def disable():
+    """Disable the instrumentation, restoring the original methods."""
+    with _patch_lock:
+        _disable()
+
+
+def _disable():
+    while _patched:
+        _owner, _name, _raw = _patched.pop()
+        setattr(_owner, _name, _raw)
+
+
+def is_enabled():
+    return bool(_patched)
+
+
+def stats(by="operation", reset=False):
+    """Return the instrumentation statistics.
+
+    :param by: "operation" for statistics per operation, "category" for
+        totals per category ("traversal", "lookup", "copy", "serialize", "db").
+    :type by: str
+    :param reset: if True, reset the statistics.
+    :type reset: bool
+    :returns: for each operation, a dict with the `category`, the number
+        of `calls`, the total, `min` and `max` wall `time` in seconds, and
+        the call counts in the histogram `buckets` (upper bounds `BUCKETS`).
+    :rtype: dict
+    """
+    _result = _stats.stats(by)
+    if reset:
+        _stats.reset()
+    return _result
+
+
+def reset():
+    _stats.reset()
+
+
+@contextlib.contextmanager
+def measure():
+    """Context manager measuring the operations called in the current
+    thread in its scope. 
+
+    The instrumentation itself is process-wide: if it is not already 
+    enabled, it is enabled when the first `measure()` scope (in any 
+    thread) starts, and disabled when the last one exits. Operations
+    called in other threads meanwhile are then counted in the global
+    statistics, but not in this scope.
+
+    :returns: a `Stats` instance with the scoped statistics.
+    """
+    global _measures, _measure_enabled
+    _scoped = Stats()
+    with _patch_lock:
+        if not _measures:
+            _measure_enabled = not is_enabled()
+            if _measure_enabled:
+                _enable()
+        _measures += 1
+    if not hasattr(_local, "scopes"):
+        _local.scopes = []
+    _local.scopes.append(_scoped)
+    try:
+        yield _scoped
+    finally:
+        _local.scopes.remove(_scoped)
+        with _patch_lock:
+            _measures -= 1
+            if not _measures and _measure_enabled:
+                _measure_enabled = False
+                _disable()
+
+
+def add_exporter(exporter):
+    """Add an export hook, `exporter(stats)` is called by `export()`
+    with the statistics from `stats()`."""
+    if exporter not in _exporters:
+        _exporters.append(exporter)
+
+
+def remove_exporter(exporter):
+    if exporter in _exporters:
+        _exporters.remove(exporter)
+
+
+def export():
+    """Call the export hooks with the current statistics."""
+    _result = stats()
+    for _exporter in list(_exporters):
+        try:
+            _exporter(_result)
+        except Exception as err:
+            logger.error("instrumentation.export: exporter «%s» error: %s" % (_exporter, err))
+    return _result
+
+
+def prometheus_text(prefix="vntree"):
+    """Return the statistics in the Prometheus text exposition format,
+    e.g. for an HTTP endpoint scraped by a metrics system.
+
+    :param prefix: prefix of the metric names.
+    :type prefix: str
+    :rtype: str
+    """
+    _name = "{}_operation_seconds".format(prefix)
+    _lines = ["# HELP {} Wall time of vntree operations.".format(_name),
+              "# TYPE {} histogram".format(_name)]
+    for op, _st in sorted(stats().items()):
+        _labels = 'op="{}",category="{}"'.format(op, _st["category"])
+        _cumulative = 0
+        for _bound, _count in zip(BUCKETS + ("+Inf",), _st["buckets"]):
+            _cumulative += _count
+            _lines.append('{}_bucket{{{},le="{}"}} {}'.format(_name, _labels, _bound, _cumulative))
+        _lines.append("{}_sum{{{}}} {}".format(_name, _labels, _st["time"]))
+        _lines.append("{}_count{{{}}} {}".format(_name, _labels, _st["calls"]))
+    return "\n".join(_lines) + "\n"
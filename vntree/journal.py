@@ -0,0 +1,399 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Append-only journal persistence, see `Node.enable_journal`.
+
+The changes of a tree (recorded as `TreeChange`s, see `Node.add_maintainer`)
+are appended to a journal file next to the snapshot file written by
+`Node.savefile`, so that the time to save a change depends on the size of
+the change, not on the size of the tree. `Node.openfile` loads the
+snapshot and replays the journal, and `Journal.compact` folds the journal
+into a new snapshot.
+
+Journal file (`<snapshot file>.journal`), a sequence of pickles:
+    header: `("vntree-journal", version, snapshot id)`
+    records: a list of change records for each maintainer call (a single
+        change, or all the changes of a `batch()`)
+
+The nodes are referenced by `_id`. The change records are:
+    ("data", _id, keys, value): `set_data(*keys, value=value)`, including
+        renames and other `NodeAttr` attributes.
+    ("del", _id, keys): a value removed from the node `data` (for example
+        with `del node.attr` of a `NodeAttr`).
+    ("id", old _id, new _id): a change of the node `_id`.
+    ("insert", parent _id, index, _id, treedict): a node added to a parent;
+        `treedict` is the sub-tree of a new node, or `None` for a node that
+        was removed before in the same journal (a move).
+    ("remove", parent _id, index, _id): a node removed from a parent.
+
+The snapshot id, a random string written in the snapshot file (as the
+`_vntree_snapshot` attribute of the root node, which is not part of the
+tree's treedict, JSON or copies) and in the journal header, identifies the snapshot that the journal applies to, so that a
+journal that belongs to another snapshot is ignored. A compaction writes the new
+snapshot to a temporary file, writes the new journal (holding the changes
+made during the compaction) as `<journal>.next`, and then replaces the
+snapshot and the journal with `os.replace`; if the process stops between
+the two replacements, `<journal>.next` is used when the tree is opened.
+
+With `background=True` the new snapshot is written by a forked process
+(on platforms with `os.fork`), which has a copy-on-write image of the
+tree at the time of the fork, while the tree is changed and journaled as
+usual.
+
+References
+https://redis.io/docs/management/persistence/ (append-only file rewrite)
+"""
+import logging
+import os
+import pickle
+import threading
+import uuid
+import weakref
+
+from . import vn3cfile
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_EXT = ".journal"
+_TAG = "vntree-journal"
+_VERSION = 1
+
+
+def journal_path(filepath):
+    """Return the journal file path of a snapshot file."""
+    return os.path.abspath(filepath) + JOURNAL_EXT
+
+
+def new_snapshot_id():
+    """Return a new random snapshot id."""
+    return uuid.uuid4().hex
+
+
+def snapshot_id(rootnode):
+    """Return the snapshot id of a tree loaded from (or saved to) a 
+    snapshot file, or `None`."""
+    return getattr(rootnode, "_vntree_snapshot", None)
+
+
+def _read_header(fh):
+    _header = pickle.load(fh)
+    if not (isinstance(_header, tuple) and len(_header) == 3 and _header[0] == _TAG):
+        raise ValueError("journal: not a vntree journal file.")
+    if _header[1] != _VERSION:
+        raise ValueError("journal: version {} not supported.".format(_header[1]))
+    return _header[2]
+
+
+def _valid_journal(path, snapshot):
+    """Return True if the journal file `path` applies to the snapshot id `snapshot`."""
+    try:
+        with open(path, "rb") as fh:
+            return _read_header(fh) == snapshot
+    except Exception:
+        return False
+
+
+def find_journal(filepath, snapshot):
+    """Return the path of the journal of the snapshot `filepath`, or `None`.
+
+    A journal left by an interrupted compaction is moved into place.
+
+    :param filepath: the snapshot file path.
+    :type filepath: str
+    :param snapshot: the snapshot id of the tree loaded from `filepath`
+        (see `snapshot_id`).
+    :type snapshot: str or None
+    """
+    if snapshot is None:
+        return None
+    _path = journal_path(filepath)
+    if os.path.isfile(_path + ".next") and _valid_journal(_path + ".next", snapshot):
+        os.replace(_path + ".next", _path)
+    if not os.path.isfile(_path):
+        return None
+    if not _valid_journal(_path, snapshot):
+        logger.warning("journal: «%s» does not apply to the snapshot «%s», ignored." % (_path, filepath))
+        return None
+    return _path
+
+
+def _iter_batches(path):
+    with open(path, "rb") as fh:
+        _read_header(fh)
+        while True:
+            try:
+                _records = pickle.load(fh)
+            except EOFError:
+                return
+            except Exception as err:
+                # the end of a journal may be incomplete if a write was interrupted
+                logger.warning("journal: «%s» truncated at byte %s: %s" % (path, fh.tell(), err))
+                return
+            yield _records
+
+
+def replay(rootnode, filepath):
+    """Apply the journal of the snapshot `filepath` to the tree loaded
+    from the snapshot.
+
+    :param rootnode: the root node of the snapshot tree.
+    :param filepath: the snapshot file path.
+    :type filepath: str
+    :returns: the number of change records applied.
+    :rtype: int
+    """
+    _path = find_journal(filepath, snapshot_id(rootnode))
+    if _path is None:
+        return 0
+    cls = type(rootnode)
+    _index = {}
+    def _add_index(node):
+        _stack = [node]
+        while _stack:
+            _n = _stack.pop()
+            _index[_n._id] = _n
+            _stack.extend(_c for _c in _n.childs if _c is not None)
+    _add_index(rootnode)
+    _detached = {}
+    _count = 0
+    for _records in _iter_batches(_path):
+        for _rec in _records:
+            _kind = _rec[0]
+            if _kind == "data":
+                _node = _index.get(_rec[1])
+                if _node is not None:
+                    _node.set_data(*_rec[2], value=_rec[3])
+            elif _kind == "del":
+                _node = _index.get(_rec[1])
+                _datadict = _node.data if _node is not None else None
+                for _key in _rec[2][:-1]:
+                    _datadict = _datadict.get(_key) if isinstance(_datadict, dict) else None
+                if isinstance(_datadict, dict):
+                    _datadict.pop(_rec[2][-1], None)
+            elif _kind == "id":
+                _node = _index.pop(_rec[1], None)
+                if _node is not None:
+                    _node._id = _rec[2]
+                    _index[_rec[2]] = _node
+            elif _kind == "insert":
+                _parent = _index.get(_rec[1])
+                if _rec[4] is None:
+                    _node = _detached.pop(_rec[3], None)
+                else:
+                    _node = cls(treedict=_rec[4])
+                    _add_index(_node)
+                if _parent is None or _node is None:
+                    continue
+                _idx = _rec[2] if _rec[2] < len(_parent.childs) else None
+                _parent.add_child(_node, idx=_idx)
+            elif _kind == "remove":
+                _parent, _node = _index.get(_rec[1]), _index.get(_rec[3])
+                if _parent is None or _node is None:
+                    continue
+                if any(_c is _node for _c in _parent.childs):
+                    _parent.remove_child(node=_node)
+                    _detached[_rec[3]] = _node
+            _count += 1
+    return _count
+
+
+class Journal:
+    """Tree maintainer appending the changes of a tree to the journal of a
+    snapshot file (see the module docstring and `Node.enable_journal`).
+
+    :param rootnode: the root node.
+    :param filepath: the snapshot file path.
+    :type filepath: str
+    :param dump: function `dump(fh, forked)` writing the snapshot of the
+        tree to a binary file object.
+    :param transient: names of the node attributes that are not saved.
+    :type transient: tuple
+    :param missing: the `TreeChange.old` marker of a value that did not exist.
+    :param threshold: journal size in bytes that triggers a compaction,
+        `None` for no automatic compaction.
+    :type threshold: int or None
+    :param background: if True, the automatic compactions are run in the
+        background.
+    :type background: bool
+    :param fsync: if True, `os.fsync` the journal after each write.
+    :type fsync: bool
+    """
+    def __init__(self, rootnode, filepath, dump, transient, missing, threshold=None,
+                 background=False, fsync=False):
+        self.rootnode = weakref.proxy(rootnode)
+        self.filepath = os.path.abspath(filepath)
+        self.path = journal_path(filepath)
+        self.dump = dump
+        self.transient = transient
+        self.missing = missing
+        self.threshold = threshold
+        self.background = background
+        self.fsync = fsync
+        self.lock = threading.RLock()
+        self._detached = weakref.WeakValueDictionary()  # _id: removed node
+        self._segment = None  # the records written during a compaction
+        self._thread = None
+        self._fh = None
+        if find_journal(self.filepath, snapshot_id(rootnode)) is None:
+            self._write_journal(self.path, snapshot_id(rootnode), [])
+        self._fh = open(self.path, "ab")
+
+    def __call__(self, rootnode, changes):
+        _records = []
+        _fresh = set()  # nodes whose sub-tree is already recorded
+        for _chg in changes:
+            _node = _chg.node
+            if id(_node) in _fresh:
+                continue
+            if _chg.kind == "data":
+                if _chg.keys == ("_vntree", "_id") and _chg.old is not self.missing:
+                    _records.append(("id", _chg.old, _node._id))
+                    continue
+                try:
+                    _value = _node.data
+                    for _key in _chg.keys:
+                        _value = _value[_key]
+                except (KeyError, TypeError):
+                    # deleted, or replaced by a later change of the batch
+                    _records.append(("del", _node._id, _chg.keys))
+                    continue
+                _records.append(("data", _node._id, _chg.keys, _value))
+            elif id(_chg.parent) in _fresh:
+                continue
+            elif _chg.kind == "insert":
+                if self._detached.get(_node._id) is _node:
+                    del self._detached[_node._id]
+                    _records.append(("insert", _chg.parent._id, _chg.idx, _node._id, None))
+                    continue
+                _records.append(("insert", _chg.parent._id, _chg.idx, _node._id,
+                                 vn3cfile.chunk_treedict(_node, self.transient, lambda _c: None)))
+                _stack = [_node]
+                while _stack:
+                    _n = _stack.pop()
+                    _fresh.add(id(_n))
+                    _stack.extend(_c for _c in _n.childs if _c is not None)
+            elif _chg.kind == "remove":
+                _records.append(("remove", _chg.parent._id, _chg.idx, _node._id))
+                self._detached[_node._id] = _node
+        if _records:
+            self.write(_records)
+
+    def write(self, records):
+        """Append a list of change records to the journal."""
+        _pickled = pickle.dumps(records, protocol=4)
+        with self.lock:
+            self._fh.write(_pickled)
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            if self._segment is not None:
+                self._segment.append(_pickled)
+            _size = self._fh.tell()
+        if self.threshold and _size > self.threshold and self._segment is None:
+            self.compact(background=self.background)
+
+    @staticmethod
+    def _write_journal(path, snapshot, segment):
+        _tmp = path + ".tmp"
+        with open(_tmp, "wb") as fh:
+            pickle.dump((_TAG, _VERSION, snapshot), fh, protocol=4)
+            for _pickled in segment:
+                fh.write(_pickled)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(_tmp, path)
+
+    def _write_snapshot(self, tmp, forked=False):
+        with open(tmp, "wb") as fh:
+            self.dump(fh, forked)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def compact(self, background=False):
+        """Fold the journal into a new snapshot.
+
+        :param background: if True, write the snapshot in a forked process
+            (if `os.fork` is available) and return immediately.
+        :type background: bool
+        :returns: `True` if the compaction was done or started, `False` if a
+            compaction is already running.
+        :rtype: bool
+        """
+        with self.lock:
+            if self._segment is not None:
+                return False
+            self._segment = []
+            # the nodes removed before the new snapshot are not in it
+            self._detached.clear()
+            _tmp = self.filepath + ".compact.tmp"
+            # the new snapshot is written with a new id
+            _ids = (snapshot_id(self.rootnode), new_snapshot_id())
+            self.rootnode._vntree_snapshot = _ids[1]
+            if not (background and hasattr(os, "fork")):
+                try:
+                    self._write_snapshot(_tmp)
+                except BaseException:
+                    self._finish(_tmp, False, _ids)
+                    raise
+                self._finish(_tmp, True, _ids)
+                return True
+            # the tree is not changed by other threads while it is forked
+            with self.rootnode.write_locked():
+                _pid = os.fork()
+                if _pid == 0:
+                    _status = 1
+                    try:
+                        self._write_snapshot(_tmp, forked=True)
+                        _status = 0
+                    except BaseException as err:
+                        logger.error("journal: compaction of «%s» failed: %s" % (self.filepath, err))
+                    finally:
+                        os._exit(_status)
+            self._thread = threading.Thread(target=self._wait, args=(_pid, _tmp, _ids),
+                                            name="vntree-compaction", daemon=True)
+            self._thread.start()
+            return True
+
+    def _wait(self, pid, tmp, ids):
+        _, _status = os.waitpid(pid, 0)
+        self._finish(tmp, _status == 0, ids)
+
+    def _finish(self, tmp, ok, ids):
+        with self.lock:
+            _segment, self._segment = self._segment, None
+            if not ok:
+                logger.error("journal: compaction of «%s» failed, the journal is kept." % (self.filepath,))
+                self.rootnode._vntree_snapshot = ids[0]
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return
+            self._write_journal(self.path + ".next", ids[1], _segment)
+            os.replace(tmp, self.filepath)
+            self._fh.close()
+            os.replace(self.path + ".next", self.path)
+            self._fh = open(self.path, "ab")
+
+    def reset(self):
+        """Start an empty journal, after the snapshot has been saved with
+        `Node.savefile`."""
+        with self.lock:
+            self._detached.clear()
+            self._write_journal(self.path, snapshot_id(self.rootnode), [])
+            self._fh.close()
+            self._fh = open(self.path, "ab")
+
+    def wait(self):
+        """Wait for a background compaction to finish."""
+        _thread = self._thread
+        if _thread is not None:
+            _thread.join()
+
+    def close(self):
+        """Wait for a background compaction, and close the journal file."""
+        self.wait()
+        with self.lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
@@ -0,0 +1,200 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Registry of JSON serialization backends.
+
+The standard library `json` is used by default. The fast backends 
+«orjson» and «ujson» are used if they are installed and selected, with
+the `backend` argument or `set_default_backend`; `fastest_backend()` 
+returns the name of the fastest installed backend. All backends encode 
+`datetime`, `date`, `time` and `UUID` values natively (ISO 8601 and 
+canonical UUID strings, as in `MongoNode` data); other values that 
+cannot be serialized are passed to the `default` function. A value that
+a fast backend cannot encode (e.g. an integer larger than 64 bits, or a
+NaN or infinite float, which «orjson» would write as `null`) is encoded 
+with the standard library `json` instead, and text that a fast backend 
+cannot decode (e.g. `NaN` and `Infinity` written by `json`) is decoded 
+with the standard library `json`. A custom encoder `cls` or decoder 
+`object_hook` always uses the standard library `json`.
+
+Note: the backends differ in the whitespace of the JSON they produce
+(«orjson» and «ujson» output compact JSON), only the default backend
+"json" gives output that is identical to `json.dumps`.
+
+References
+https://github.com/ijl/orjson
+https://github.com/ultrajson/ultrajson
+"""
+import datetime
+import json
+import logging
+import math
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# backends in order of speed, see `fastest_backend`
+PREFERENCE = ("orjson", "ujson", "json")
+
+_backends = {}
+_default = None
+
+
+def native_default(default=None):
+    """Return a `default` function for `json.JSONEncoder` that encodes
+    datetime and UUID values, and passes other values to `default`."""
+    def _default(obj):
+        if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+            return obj.isoformat()
+        if isinstance(obj, uuid.UUID):
+            return str(obj)
+        if default is not None:
+            return default(obj)
+        raise TypeError("Object of type {} is not JSON serializable".format(obj.__class__.__name__))
+    return _default
+
+
+def _has_nonfinite(obj):
+    """Return True if `obj` contains a NaN or infinite float, without recursion."""
+    _stack = [obj]
+    while _stack:
+        _obj = _stack.pop()
+        if isinstance(_obj, float):
+            if not math.isfinite(_obj):
+                return True
+        elif isinstance(_obj, dict):
+            _stack.extend(_obj.values())
+        elif isinstance(_obj, (list, tuple)):
+            _stack.extend(_obj)
+    return False
+
+
+class JSONBackend:
+    """Base class of JSON backends, using the standard library `json`.
+
+    :param name: the backend name.
+    :type name: str
+    :param separators: the item and key separators used in the encoded JSON.
+    :type separators: tuple
+    """
+    def __init__(self, name="json", separators=(", ", ": ")):
+        self.name = name
+        self.separators = separators
+
+    def encoder(self, default=None, cls=None):
+        """Return a function that encodes a value as a JSON string."""
+        if cls is not None:
+            return cls(default=default).encode
+        return json.JSONEncoder(default=native_default(default)).encode
+
+    def loads(self, text, object_hook=None):
+        return json.loads(text, object_hook=object_hook)
+
+    def dumps(self, obj, default=None, cls=None):
+        return self.encoder(default, cls)(obj)
+
+    def __repr__(self):
+        return "{}({!r})".format(self.__class__.__name__, self.name)
+
+
+class OrjsonBackend(JSONBackend):
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+        super().__init__("orjson", separators=(",", ":"))
+
+    def encoder(self, default=None, cls=None):
+        if cls is not None:
+            return super().encoder(default, cls)
+        _dumps = self._orjson.dumps
+        _option = self._orjson.OPT_NON_STR_KEYS
+        _fallback = super().encoder(default)
+        def _encode(obj):
+            try:
+                _text = _dumps(obj, default=default, option=_option).decode()
+            except TypeError:
+                return _fallback(obj)
+            # orjson writes NaN and infinite floats as null
+            if "null" in _text and _has_nonfinite(obj):
+                return _fallback(obj)
+            return _text
+        return _encode
+
+    def loads(self, text, object_hook=None):
+        if object_hook is not None:
+            return super().loads(text, object_hook)
+        try:
+            return self._orjson.loads(text)
+        except self._orjson.JSONDecodeError:
+            return super().loads(text)
+
+
+class UjsonBackend(JSONBackend):
+    def __init__(self):
+        import ujson
+        self._ujson = ujson
+        super().__init__("ujson", separators=(",", ":"))
+
+    def encoder(self, default=None, cls=None):
+        if cls is not None:
+            return super().encoder(default, cls)
+        _dumps = self._ujson.dumps
+        _default = native_default(default)
+        _fallback = super().encoder(default)
+        def _encode(obj):
+            try:
+                return _dumps(obj, default=_default, ensure_ascii=True, escape_forward_slashes=False)
+            except (TypeError, OverflowError):
+                return _fallback(obj)
+        return _encode
+
+    def loads(self, text, object_hook=None):
+        if object_hook is not None:
+            return super().loads(text, object_hook)
+        try:
+            return self._ujson.loads(text)
+        except ValueError:
+            return super().loads(text)
+
+
+def register_backend(backend):
+    """Register a JSON backend, a `JSONBackend` instance."""
+    _backends[backend.name] = backend
+
+
+def get_backend(name=None):
+    """Return the registered JSON backend `name`, or the default backend
+    if `name=None`."""
+    if name is None:
+        return _default
+    if isinstance(name, JSONBackend):
+        return name
+    if name not in _backends:
+        raise ValueError("jsonbackends: backend «{}» not available, available backends: {}.".format(name, list(_backends)))
+    return _backends[name]
+
+
+def set_default_backend(name):
+    """Set the default JSON backend."""
+    global _default
+    _default = get_backend(name)
+
+
+def available_backends():
+    return list(_backends)
+
+
+def fastest_backend():
+    """Return the name of the fastest installed JSON backend."""
+    return next(_name for _name in PREFERENCE if _name in _backends)
+
+
+register_backend(JSONBackend())
+for _cls in (UjsonBackend, OrjsonBackend):
+    try:
+        register_backend(_cls())
+    except ImportError:
+        pass
+set_default_backend("json")
@@ -0,0 +1,352 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Incremental loader for the «vntree» JSON tree format (see `Node.to_JSON`).
+
+The JSON text is read in chunks and scanned token by token. Only the node
+structure (the node objects and their `childs` arrays) is parsed here;
+each `data` value (and any other node attribute) is decoded on its own
+with `json.JSONDecoder.raw_decode`. Nodes are built as they stream by,
+using an explicit stack, so the memory used does not depend on the size
+of the file and deep trees do not hit the recursion limit.
+
+References
+https://www.json.org/json-en.html
+https://docs.python.org/3/library/json.html#json.JSONDecoder.raw_decode
+"""
+import inspect
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+CHUNKSIZE = 1 << 20
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_STRUCTURAL = re.compile(r'["{}\[\]]')
+_KEY = re.compile(r'[ \t\n\r]*"([^"\\]*)"[ \t\n\r]*:[ \t\n\r]*')
+_STRINGBODY = re.compile(r'(?:[^"\\]|\\.)*', re.S)
+
+
+class _Scanner:
+    """Tokenizer over a text stream, keeping only the unconsumed text in memory."""
+    def __init__(self, fh, decoder, chunksize=CHUNKSIZE):
+        self.fh = fh
+        self.decoder = decoder
+        self.chunksize = chunksize
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self, size=None):
+        """Read more text, discarding the consumed text. Returns False at EOF."""
+        if self.eof:
+            return False
+        _chunk = self.fh.read(size or self.chunksize)
+        if not _chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + _chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Return the next non-whitespace character, or "" at EOF."""
+        if self.pos < len(self.buf) and self.buf[self.pos] not in " \t\n\r":
+            return self.buf[self.pos]
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, chars):
+        _c = self.peek()
+        if not _c or _c not in chars:
+            raise ValueError("JSON tree: expected «{}» but found «{}» at «{}».".format(chars, _c, self.buf[self.pos:self.pos+40]))
+        self.pos += 1
+        return _c
+
+    def key(self):
+        """Decode the next object key and the following colon."""
+        _m = _KEY.match(self.buf, self.pos)
+        if _m is not None and _m.end() < len(self.buf):
+            self.pos = _m.end()
+            return _m.group(1)
+        _key = self.value()
+        self.expect(":")
+        return _key
+
+    def value(self):
+        """Decode the next JSON value."""
+        self.peek()
+        _size = self.chunksize
+        while True:
+            try:
+                _value, _end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if not self.fill(_size):
+                    raise
+                _size *= 2
+                continue
+            # a number at the end of the buffer may be truncated
+            if _end < len(self.buf) or not self.fill(_size):
+                self.pos = _end
+                return _value
+
+    def skip_string(self):
+        """Skip a string, `self.pos` is at the opening quote."""
+        while True:
+            _end = _STRINGBODY.match(self.buf, self.pos + 1).end()
+            if _end < len(self.buf) and self.buf[_end] == '"':
+                self.pos = _end + 1
+                return
+            if not self.fill():
+                raise ValueError("JSON tree: unterminated string.")
+
+    def skip(self, depth=0):
+        """Skip the next JSON value (`depth=0`), or the rest of the current
+        object or array (`depth=1`), without decoding it."""
+        if depth == 0 and self.peek() not in '{["':
+            self.value()
+            return
+        while True:
+            _m = _STRUCTURAL.search(self.buf, self.pos)
+            if _m is None:
+                self.pos = len(self.buf)
+                if not self.fill():
+                    raise ValueError("JSON tree: unexpected end of text.")
+                continue
+            _c = _m.group()
+            self.pos = _m.start()
+            if _c == '"':
+                self.skip_string()
+            else:
+                self.pos += 1
+                depth += 1 if _c in "{[" else -1
+            if depth == 0:
+                return
+
+
+class _Frame:
+    """Parsing state of a node object."""
+    __slots__ = ("node", "data", "attrs", "parent", "build", "target", "childidx", "state",
+                 "spec", "decided", "mark", "count")
+    def __init__(self, parent, build, target, mark=0, count=0):
+        self.node = None
+        self.data = None
+        self.attrs = []
+        self.parent = parent      # parent _Frame, or None
+        self.build = build        # build the node, or search for the target sub-tree
+        self.target = target      # coord or path steps to the target sub-tree
+        self.childidx = 0
+        self.state = "keys"       # parsing the object "keys" or the "childs" array
+        self.spec = False         # path search: "childs" reached before the name is known
+        self.decided = False      # path search: a child has matched, the other childs are skipped
+        self.mark = mark          # path search: len(_result) and node count when the frame started
+        self.count = count
+
+
+class _StopLoading(Exception):
+    pass
+
+
+def load_tree(fh, cls, object_hook=None, max_nodes=None, coord=None, path=None,
+              chunksize=CHUNKSIZE):
+    """Load a tree from the «vntree» JSON format incrementally.
+
+    :param fh: text stream with the JSON.
+    :param cls: the node class.
+    :param object_hook: function applied to the decoded dicts of the node
+        `data` and of the other node attribute values (as `json.load` 
+        `object_hook`), but not to the node objects, which are not decoded
+        as dicts.
+    :param max_nodes: the maximum number of nodes to load, `None` for all.
+    :type max_nodes: int or None
+    :param coord: absolute coordinates of the sub-tree to load.
+    :type coord: tuple or None
+    :param path: absolute path of the sub-tree to load (as for `Node.get_node_by_path`,
+        the first child with the name is used at each level).
+    :type path: str or None
+    :returns: the root node of the loaded (sub-)tree, or `None` if the
+        sub-tree is not found or the JSON object is empty.
+    :rtype: Node or None
+    """
+    scanner = _Scanner(fh, json.JSONDecoder(object_hook=object_hook), chunksize)
+    bypath = path is not None and coord is None
+    if bypath:
+        _target = [_s for _s in path.split("/") if _s]
+        _root = _Frame(None, False, _target)
+    else:
+        _target = list(coord) if coord is not None else []
+        _root = _Frame(None, not _target, _target)
+    _result = []
+    _count = 0
+    # passing the _id avoids generating a new one for each node
+    _takes_id = "_id" in inspect.signature(cls).parameters
+
+    def _make_node(frame):
+        nonlocal _count
+        _data = frame.data if frame.data is not None else {}
+        _meta = _data.get("_vntree")
+        _id = _meta.get("_id") if isinstance(_meta, dict) else None
+        _node = cls(_id=_id) if _takes_id and _id else cls()
+        if _id:
+            _node.data = _data
+        else:
+            _id = _node._id
+            _node.data = _data
+            _node._id = _id
+        for key, val in frame.attrs:
+            setattr(_node, key, val)
+        frame.attrs = []
+        frame.node = _node
+        if frame.parent is not None and frame.parent.build:
+            frame.parent.node.add_child(_node)
+        else:
+            _result.append(_node)
+        _count += 1
+
+    def _matches(frame):
+        _meta = (frame.data or {}).get("_vntree")
+        _name = _meta.get("name") if isinstance(_meta, dict) else None
+        return _name == frame.target[0]
+
+    def _found(frame):
+        """Check the name of a path search frame, returns True if it
+        is on the path to the target sub-tree."""
+        if not _matches(frame):
+            return False
+        if len(frame.target) == 1:
+            frame.build = True
+        return True
+
+    def _resolve(frame):
+        """Check the name of a path search frame when its object closes.
+
+        The frame can have been searched (or built) before its name was 
+        known, when "childs" precedes "data" (e.g. JSON with sorted keys).
+        If the name does not match, the nodes built meanwhile are dropped
+        and the search goes on with the next sibling. Otherwise the frame
+        is the first child on the path, and the search is over unless an
+        ancestor is itself not yet resolved.
+        """
+        nonlocal _count
+        if not _matches(frame):
+            del _result[frame.mark:]
+            _count = frame.count
+            if frame.parent is None:
+                raise _StopLoading()
+            return
+        if len(frame.target) == 1 and frame.node is None:
+            frame.build = True
+            _make_node(frame)
+        if any(_f.spec for _f in _stack):
+            frame.parent.decided = True
+        else:
+            raise _StopLoading()
+
+    def _limit():
+        """True if `max_nodes` nodes are loaded."""
+        return max_nodes is not None and _count >= max_nodes
+
+    _stack = [_root]
+    scanner.expect("{")
+    try:
+        while _stack:
+            frame = _stack[-1]
+            _c = scanner.peek()
+            if _c == ",":
+                scanner.pos += 1
+                continue
+            if frame.state == "childs":
+                if _c == "]":
+                    scanner.pos += 1
+                    frame.state = "keys"
+                    continue
+                if frame.decided:
+                    scanner.skip(1)
+                    frame.state = "keys"
+                    continue
+                if frame.build:
+                    if _limit():
+                        # only while a path search is pending, see below
+                        scanner.skip()
+                        continue
+                    _child = _Frame(frame, True, None)
+                elif bypath:
+                    _child = _Frame(frame, False, frame.target[1:], len(_result), _count)
+                elif frame.childidx == frame.target[0]:
+                    _child = _Frame(frame, len(frame.target) == 1, frame.target[1:])
+                else:
+                    _child = None
+                frame.childidx += 1
+                if _child is None:
+                    scanner.skip()
+                    continue
+                scanner.expect("{")
+                _stack.append(_child)
+                continue
+            if _c == "}":
+                scanner.pos += 1
+                _stack.pop()
+                if frame.build:
+                    if frame.node is None:
+                        if frame.parent is None and frame.data is None and not frame.attrs:
+                            return None  # empty JSON object
+                        _make_node(frame)
+                    else:
+                        for key, val in frame.attrs:
+                            setattr(frame.node, key, val)
+                    if frame.parent is None or not frame.parent.build:
+                        if not bypath:
+                            raise _StopLoading()  # the target sub-tree is loaded
+                        _resolve(frame)
+                elif bypath:
+                    _resolve(frame)
+                elif frame.parent is None:
+                    raise _StopLoading()
+                # a sub-tree built during a pending path search must be completed
+                if _limit() and not any(_f.spec for _f in _stack):
+                    raise _StopLoading()
+                continue
+            if _c == "":
+                raise ValueError("JSON tree: unexpected end of text.")
+            _key = scanner.key()
+            if _key == "childs":
+                if not frame.build and bypath:
+                    if frame.data is None:
+                        # the name is not known yet: search the childs (or
+                        # build the node), the name is checked by `_resolve`
+                        frame.spec = True
+                        frame.build = len(frame.target) == 1
+                    elif not _found(frame):
+                        if frame.parent is None:
+                            raise _StopLoading()
+                        scanner.skip()
+                        continue
+                if frame.build and frame.node is None:
+                    _make_node(frame)
+                    if _limit() and not any(_f.spec for _f in _stack):
+                        raise _StopLoading()
+                scanner.expect("[")
+                frame.state = "childs"
+            elif _key == "data" and (frame.build or bypath):
+                frame.data = scanner.value()
+                if frame.node is not None:
+                    # the node was built when its childs were reached
+                    _id = frame.node._id
+                    frame.node.data = frame.data
+                    if frame.node._id is None:
+                        frame.node._id = _id
+            elif frame.build:
+                frame.attrs.append((_key, scanner.value()))
+            else:
+                scanner.skip()
+    except _StopLoading:
+        pass
+    return _result[0] if _result else None
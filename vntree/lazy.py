@@ -0,0 +1,144 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Lazily loaded nodes.
+
+A lazy node is created (without calling `__init__`) with only its
+`parent` and a `_vn_src = (source, key)` attribute; its `data` and `childs`
+are loaded from the source on first access, so the memory used is
+proportional to the nodes that are touched. A source implements:
+
+    `load(node, key, attr)`: set the node attribute `attr` ("data", or
+        "childs" as a list of new lazy nodes), and for "data" the other
+        node attributes.
+    `name(key)` (optional): the name of the node, without loading its `data`.
+    `find_id(_id)` (optional): the node with `_id`, or `None`.
+
+Once loaded, the attributes are ordinary instance attributes, so a lazy
+node can be modified like any other node.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+_lazy_classes = {}
+
+
+class LazyNodeMixin:
+    """Mixin for node classes whose `data` and `childs` are loaded from a
+    source on first access (see `lazy_class`)."""
+
+    def __getattr__(self, attr):
+        # only called for attributes that are not (yet) set
+        if attr == "data" or attr == "childs":
+            _src = self.__dict__.get("_vn_src")
+            if _src is not None:
+                _loaded = "childs" in self.__dict__
+                _src[0].load(self, _src[1], attr)
+                _state = self.__dict__.get("_vn_tstate")
+                if _state is not None and not _loaded and "childs" in self.__dict__:
+                    _set_tree_state(self.__dict__["childs"], _state)
+                return self.__dict__[attr]
+        raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, attr))
+
+    def _vn_load(self):
+        """Load the `data` and `childs` of the node."""
+        self.data
+        self.childs
+
+    def _vn_state(self):
+        self._vn_load()
+        return super()._vn_state()
+
+    def to_treedict(self, recursive=True, treemeta=True, dataonly=False):
+        self.data
+        return super().to_treedict(recursive=recursive, treemeta=treemeta, dataonly=dataonly)
+
+    def get_child_by_name(self, childname):
+        _src = self.__dict__.get("_vn_src")
+        if _src is None or not hasattr(_src[0], "name"):
+            return super().get_child_by_name(childname)
+        # the names of the children that are not loaded are read from the source
+        _found = []
+        for _child in self.childs:
+            _csrc = _child.__dict__.get("_vn_src")
+            if _csrc is not None and _csrc[0] is _src[0] and "data" not in _child.__dict__:
+                _name = _src[0].name(_csrc[1])
+            else:
+                _name = _child.name
+            if _name == childname:
+                _found.append(_child)
+        if len(_found) > 1:
+            logger.warning("%s.get_child_by_name: node:«%s» has more than 1 childnode with name=«%s»." % (self.__class__.__name__, self.name, childname))
+        return _found[0] if _found else None
+
+    def get_node_by_id(self, _id):
+        _src = self.__dict__.get("_vn_src")
+        if _src is None or not hasattr(_src[0], "find_id"):
+            return super().get_node_by_id(_id)
+        _node = _src[0].find_id(_id)
+        if _node is not None and _node._id == _id:
+            # the node may have been moved or removed from the tree
+            _n = _node
+            while _n is not self and _n.parent is not None and any(_c is _n for _c in _n.parent.childs):
+                _n = _n.parent
+            if _n is self:
+                return _node
+        # the nodes whose children are not loaded are unchanged, so only
+        # the loaded nodes, which may have been modified, are searched
+        _stack = [self]
+        while _stack:
+            _n = _stack.pop()
+            _plain = _n.__dict__.get("_vn_src") is None
+            if (_plain or "data" in _n.__dict__) and _n._id == _id:
+                return _n
+            if _plain or "childs" in _n.__dict__:
+                _stack.extend(_c for _c in reversed(_n.childs) if _c is not None)
+        return None
+
+
+def _set_tree_state(nodes, state):
+    """Set the tree state (see `Node.add_maintainer`) of the newly loaded
+    `nodes` and of their loaded descendants."""
+    _stack = [_n for _n in nodes if _n is not None]
+    while _stack:
+        _node = _stack.pop()
+        _node._vn_tstate = state
+        _stack.extend(_c for _c in _node.__dict__.get("childs", ()) if _c is not None)
+
+
+def _new_instance(cls):
+    # referenced by the pickles of lazy nodes written by earlier versions
+    return cls.__new__(cls)
+
+
+def lazy_class(cls):
+    """Return the lazy node class of the node class `cls`."""
+    if issubclass(cls, LazyNodeMixin):
+        return cls
+    _lazycls = _lazy_classes.get(cls)
+    if _lazycls is None:
+        _lazycls = _lazy_classes[cls] = type("Lazy" + cls.__name__, (LazyNodeMixin, cls),
+                                             {"__module__": cls.__module__, "_vn_base": cls})
+    return _lazycls
+
+
+def load_all(rootnode):
+    """Load the `data` and `childs` of all the lazy nodes of the (sub-)tree
+    rooted at `rootnode`, without recursion."""
+    _stack = [rootnode]
+    while _stack:
+        _node = _stack.pop()
+        if isinstance(_node, LazyNodeMixin):
+            _node._vn_load()
+        _stack.extend(_c for _c in _node.childs if _c is not None)
+
+
+def new_node(cls, source, key, parent=None):
+    """Create a lazy node of the lazy node class `cls`."""
+    _node = cls.__new__(cls)
+    _node.parent = parent
+    _node._vn_src = (source, key)
+    return _node
@@ -4,6 +4,7 @@ Licensed under the MIT license.
 See «vntree» LICENSE file for details:
 https://github.com/qwilka/vntree/blob/master/LICENSE
 """
+import asyncio
 import copy
 from datetime import datetime, timezone
 import hashlib
@@ -226,6 +227,16 @@ class MongoNode(Node):
                 self.set_data(_key, value=_val)
         return _dsdoc
 
+    async def aload(self):
+        """Coroutine loading the node data from the database, see `db_load`.
+
+        The blocking `pymongo` calls run in the event loop's default 
+        executor, so that the event loop is not stalled.
+        """
+        _loop = asyncio.get_running_loop()
+        await _loop.run_in_executor(None, self.db_load)
+        return self
+
     def find_by_id(self, _id):
         _doc = find_by_id(self.db_uri, _id)
         return _doc
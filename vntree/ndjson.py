@@ -0,0 +1,139 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Loader for the flat NDJSON tree format (see `Node.to_ndjson`): one JSON
+object per line for each node, with keys `_id`, `parent_id`, `position`
+(index in the parent's `childs`), `name`, `data` (the node `data`, with
+the `_vntree` name and `_id` left out if they are its first keys, see
+`vnbfile.split_meta`), and `attrs` (other node attributes, only if there
+are any).
+
+Lines can be in any order and files can be appended to: when several
+lines have the same `_id`, the last line wins. Large files can be
+parsed in parallel, split into chunks at line boundaries.
+
+References
+http://ndjson.org/
+"""
+import concurrent.futures
+import inspect
+import logging
+import os
+
+from . import jsonbackends
+from . import vnbfile
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _split_chunks(filepath, nchunks):
+    """Byte ranges of `nchunks` chunks of a file, split at line boundaries."""
+    _size = os.path.getsize(filepath)
+    _offsets = [0]
+    with open(filepath, "rb") as _fh:
+        for ii in range(1, nchunks):
+            _fh.seek(max(_size * ii // nchunks, _offsets[-1]))
+            _fh.readline()
+            _offsets.append(min(_fh.tell(), _size))
+    _offsets.append(_size)
+    return [(_offsets[ii], _offsets[ii+1]) for ii in range(nchunks)
+            if _offsets[ii+1] > _offsets[ii]]
+
+
+def _parse_lines(lines, loads):
+    _records = []
+    for _line in lines:
+        if _line.strip():
+            _rec = loads(_line)
+            _records.append((_rec["_id"], _rec.get("parent_id"), _rec.get("position", 0),
+                             _rec.get("name"), _rec.get("data") or {}, _rec.get("attrs")))
+    return _records
+
+
+def _parse_chunk(filepath, start, end, backend):
+    """Parse the NDJSON lines in a byte range of a file (in a worker process)."""
+    _backend = jsonbackends.get_backend(backend)
+    with open(filepath, "rb") as _fh:
+        _fh.seek(start)
+        _lines = _fh.read(end - start).splitlines()
+    if _backend.name == "json":
+        _lines = [_l.decode("utf-8") for _l in _lines]
+    return _parse_lines(_lines, _backend.loads)
+
+
+def iter_records(filepath, workers=None, backend=None, chunksize=1<<26):
+    """Generate the node records `(_id, parent_id, position, name, data, attrs)`
+    of an NDJSON file or file-like object, in file order.
+
+    :param workers: number of worker processes parsing chunks of the
+        file in parallel, `None` or 1 to parse in the current process.
+    :type workers: int or None
+    :param chunksize: approximate size in bytes of the chunks parsed by
+        the workers.
+    :type chunksize: int
+    """
+    _backend = jsonbackends.get_backend(backend)
+    if hasattr(filepath, "read"):
+        for _line in filepath:
+            yield from _parse_lines((_line,), _backend.loads)
+        return
+    if not workers or workers <= 1:
+        with open(filepath, "r") as _fh:
+            for _line in _fh:
+                yield from _parse_lines((_line,), _backend.loads)
+        return
+    _nchunks = max(workers, -(-os.path.getsize(filepath) // chunksize))
+    _chunks = _split_chunks(filepath, _nchunks)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as _executor:
+        _futures = [_executor.submit(_parse_chunk, filepath, _start, _end, _backend.name)
+                    for _start, _end in _chunks]
+        for _future in _futures:
+            yield from _future.result()
+
+
+def build_tree(cls, records):
+    """Build a tree from node records (see `iter_records`).
+
+    The nodes are created as the records are read, with a dict of the
+    children pending for each parent `_id`; the children of each node are
+    then attached in `position` order, so the records can be in any order.
+
+    :returns: the root node (the node without a parent), or `None` if there
+        are no records.
+    :rtype: Node or None
+    """
+    _takes_id = "_id" in inspect.signature(cls).parameters
+    _nodes = {}
+    _pending = {}  # parent_id -> {_id: (position, seq)}
+    _parents = {}  # _id -> parent_id
+    for _seq, (_id, _parent_id, _position, _name, _data, _attrs) in enumerate(records):
+        _old = _parents.get(_id, _MISSING)
+        if _old is not _MISSING:
+            # the last record wins
+            _pending.get(_old, {}).pop(_id, None)
+        _node = cls(_id=_id) if _takes_id else cls()
+        vnbfile.join_meta(_data, {"name": _name, "_id": _id})
+        _node.data = _data
+        if _attrs:
+            for key, val in _attrs.items():
+                setattr(_node, key, val)
+        _nodes[_id] = _node
+        _parents[_id] = _parent_id
+        _pending.setdefault(_parent_id, {})[_id] = (_position, _seq)
+    if not _nodes:
+        return None
+    _roots = [_id for _id, _parent_id in _parents.items()
+              if _parent_id is None or _parent_id not in _nodes]
+    for _parent_id, _childs in _pending.items():
+        _parent = _nodes.get(_parent_id)
+        if _parent is None:
+            continue
+        for _id in sorted(_childs, key=_childs.get):
+            _parent.add_child(_nodes[_id])
+    if len(_roots) > 1:
+        logger.warning("ndjson.build_tree: %s nodes without a parent, using the first node «%s» as root." % (len(_roots), _roots[0]))
+    return _nodes[_roots[0]] if _roots else None
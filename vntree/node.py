@@ -4,8 +4,14 @@ Licensed under the MIT license.
 See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
 """
 #import collections
+from array import array
+from collections import namedtuple
+import contextlib
+import asyncio
 import copy
 from difflib import SequenceMatcher
+import functools
+import io
 import json
 import itertools
 import logging
@@ -14,16 +20,29 @@ import pathlib
 import pickle
 import re
 from string import Template
-import textwrap
+import sys
+import threading
 #from typing_extensions import Concatenate
 import uuid
 
-from .utilities import get_numeric
+from .utilities import get_numeric, RWLock
+from . import parallel
+from . import jsonstream
+from . import jsonbackends
+from . import ndjson
+from . import compressed
+from . import buffers
+from . import vnbfile
+from . import vn3cfile
+from . import vnmfile
+from . import lazy
+from . import journal
 
 logger = logging.getLogger(__name__)
 
 try:
     import yaml
+    from . import yamlstream
     yaml_imported = True
 except ImportError as err:
     logger.warning("PyYAML not installed (see https://pyyaml.org/); %s" % (err,) )
@@ -48,6 +67,461 @@ except ImportError as err:
 #     return obj
 
 
+# Marker for a `data` value that did not exist before a change.
+_MISSING = object()
+
+# A single tree mutation, as recorded for batches and passed to maintainers.
+# kind="insert": `node` was added to `parent` at index `idx`, `old` is the previous parent.
+# kind="remove": `node` was removed from `parent` at index `idx`.
+# kind="data": `node.data` value at `keys` was set (or deleted), `old` is the previous value or _MISSING.
+TreeChange = namedtuple("TreeChange", ["kind", "parent", "node", "idx", "keys", "old"])
+
+# Per-thread flag set while a tree snapshot is being taken for iteration.
+_snapshotting = threading.local()
+
+
+class _TreeState:
+    """Runtime (non-persistent) state of a tree, referenced by the
+    `_vn_tstate` attribute of each node of the tree, so that it is found
+    without walking to the root. Trees without a state pay no maintenance
+    cost on mutation."""
+    def __init__(self, rootnode):
+        self.root = rootnode
+        self.maintainers = []
+        self.batches = 0
+        self.pending = []
+        self.lock = None
+
+
+def _set_tree_state(node, state):
+    """Set the `_TreeState` of the nodes of the sub-tree rooted at `node`
+    (the lazy nodes that are not loaded get it when they are loaded)."""
+    _stack = [node]
+    while _stack:
+        _n = _stack.pop()
+        if state is None:
+            _n.__dict__.pop("_vn_tstate", None)
+        else:
+            _n._vn_tstate = state
+        _childs = _n.__dict__.get("childs")
+        if _childs:
+            _stack.extend(_c for _c in _childs if _c is not None)
+
+
+def _tree_state(node):
+    """Return the `_TreeState` of the tree containing `node`, created on first use."""
+    _state = node._vn_tstate
+    if _state is None:
+        _root = node._root
+        _state = _TreeState(_root)
+        _set_tree_state(_root, _state)
+    return _state
+
+
+def _snapshot_lock(node):
+    """Return the tree lock if iteration of `node` must take a snapshot."""
+    if getattr(_snapshotting, "active", False):
+        return None
+    return node._tree_lock()
+
+
+def _snapshot(node, lock):
+    """Return the list of nodes iterated from `node`, taken under the tree read lock."""
+    with lock.read_locked():
+        _snapshotting.active = True
+        try:
+            return list(iter(node))
+        finally:
+            _snapshotting.active = False
+
+
+def _write_locked(method):
+    """Decorator running a `Node` method under the tree write lock in concurrency mode."""
+    @functools.wraps(method)
+    def _wrapper(self, *args, **kwargs):
+        _state = self._vn_tstate
+        if _state is not None and _state.lock is not None:
+            with _state.lock.write_locked():
+                return method(self, *args, **kwargs)
+        return method(self, *args, **kwargs)
+    return _wrapper
+
+
+def _read_locked(method):
+    """Decorator running a `Node` method under the tree read lock in concurrency mode."""
+    @functools.wraps(method)
+    def _wrapper(self, *args, **kwargs):
+        _state = self._vn_tstate
+        if _state is not None and _state.lock is not None:
+            with _state.lock.read_locked():
+                return method(self, *args, **kwargs)
+        return method(self, *args, **kwargs)
+    return _wrapper
+
+
+# Node instance attributes holding `tree_cached` values and versions.
+_CACHE_ATTRS = ("_vn_cache", "_vn_mver", "_vn_dver", "_vn_sver")
+
+# Node instance attributes of lazily loaded nodes, see `vntree.lazy`.
+_LAZY_ATTRS = ("_vn_src",)
+
+# Node instance attributes that are not part of a node's `treedict`.
+_TRANSIENT_ATTRS = ("parent", "childs", "_vn_tstate", "_vntree_snapshot") + _CACHE_ATTRS + _LAZY_ATTRS
+_TRANSIENT_SET = frozenset(_TRANSIENT_ATTRS)
+
+# Node instance attributes that are not written to the `savefile` files;
+# the snapshot id of the root node (see `vntree.journal`) is only written there.
+_SNAPSHOT_TRANSIENT = tuple(_a for _a in _TRANSIENT_ATTRS if _a != "_vntree_snapshot")
+
+
+def _invalidate_caches(rootnode, changes):
+    """Tree maintainer incrementing the data versions of changed nodes, 
+    and the sub-tree versions of the changed nodes (or of the parents
+    of inserted and removed nodes) and their ancestors."""
+    _seen = set()
+    for _chg in changes:
+        if _chg.kind == "data":
+            _n = _chg.node
+            _n._vn_dver += 1
+        else:
+            _n = _chg.parent
+        while _n is not None and id(_n) not in _seen:
+            _seen.add(id(_n))
+            _n._vn_sver += 1
+            _n = _n.parent
+
+
+class tree_cached:
+    """Descriptor (decorator) memoizing a computed node attribute.
+
+    The value is computed on first access and cached in the node
+    instance, and recomputed when it has been invalidated by a change 
+    in the tree. `depends` specifies the changes that invalidate it:
+
+    |  "structure": the position of the node in the tree, i.e. the childs
+    |      of the node's ancestors, and the names and ids of the node 
+    |      and its ancestors;
+    |  "data": as "structure", and the node's own `data`;
+    |  "ancestors": as "data", and the `data` of the node's ancestors;
+    |  "descendants": as "data", and the `data` and the structure of 
+    |      the node's sub-tree.
+
+    Each node holds version counters, incremented by the changes made
+    through `add_child`, `remove_child`, `set_data` and `NodeAttr` 
+    attributes. Changes made directly to `childs`, `parent` or `data` 
+    are not tracked, the cached values must then be discarded with 
+    `tree_cached.invalidate`. Values are not cached inside a `batch()`
+    of the tree.
+
+    |  class ReportNode(Node):
+    |      @tree_cached(depends="descendants")
+    |      def total_size(self):
+    |          return self.get_data("size") + sum(c.total_size for c in self.childs)
+
+    :param func: function computing the value for a node instance.
+    :type func: callable
+    :param depends: "structure", "data", "ancestors" or "descendants".
+    :type depends: str
+    """
+    DEPENDS = ("structure", "data", "ancestors", "descendants")
+
+    def __init__(self, func=None, *, depends="data"):
+        if depends not in self.DEPENDS:
+            raise ValueError("tree_cached: argument «depends»=«{}» not valid, must be one of {}.".format(depends, self.DEPENDS))
+        self.depends = depends
+        self.func = None
+        if func is not None:
+            self(func)
+
+    def __call__(self, func):
+        self.func = func
+        self.name = func.__name__
+        self.__doc__ = func.__doc__
+        return self
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        _state = instance._vn_tstate
+        if _state is not None and _state.batches:
+            return self.func(instance)
+        _token = self._token(instance)
+        _cache = instance.__dict__.get("_vn_cache")
+        if _cache is None:
+            _cache = instance.__dict__["_vn_cache"] = {}
+        else:
+            _entry = _cache.get(self.name)
+            if _entry is not None and _entry[0] == _token:
+                return _entry[1]
+        if self.depends != "structure":
+            _ensure_cache_maintainer(instance)
+        _value = self.func(instance)
+        _cache[self.name] = (_token, _value)
+        return _value
+
+    def __set__(self, instance, value):
+        raise AttributeError("can't set attribute «{}»".format(self.name))
+
+    def _token(self, instance):
+        _versions = []
+        _n = instance
+        if self.depends == "ancestors":
+            while _n is not None:
+                _versions.append((id(_n), _n._vn_mver, _n._vn_dver))
+                _n = _n.parent
+            return tuple(_versions)
+        while _n is not None:
+            _versions.append((id(_n), _n._vn_mver))
+            _n = _n.parent
+        if self.depends == "data":
+            _versions.append(instance._vn_dver)
+        elif self.depends == "descendants":
+            _versions.append(instance._vn_sver)
+        return tuple(_versions)
+
+    @staticmethod
+    def invalidate(node):
+        """Discard the `tree_cached` values of the nodes in a sub-tree, 
+        e.g. after changing `childs`, `parent` or `data` directly.
+
+        :param node: root node of the sub-tree.
+        :type node: Node
+        """
+        for _n in node:
+            _n.__dict__.pop("_vn_cache", None)
+
+
+def _ensure_cache_maintainer(node):
+    _state = node._vn_tstate
+    if _state is None or _invalidate_caches not in _state.maintainers:
+        node.add_maintainer(_invalidate_caches)
+
+
+def _vn_class(node):
+    """The class of the copies and pickles of `node` (the non-lazy node
+    class of a lazily loaded node)."""
+    return node._vn_base if isinstance(node, lazy.LazyNodeMixin) else type(node)
+
+
+def _child_index(parent, node):
+    """Index of `node` in the childs of `parent` (not counting `None`
+    placeholders), or `None`."""
+    ii = 0
+    for _c in parent.childs:
+        if _c is node:
+            return ii
+        if _c is not None:
+            ii += 1
+    return None
+
+
+def _vn_tree(classes, parents):
+    """Create the linked nodes of a pickled tree, see `Node.__reduce_ex__`.
+
+    :returns: the root node.
+    """
+    _nodes = [_cls.__new__(_cls) for _cls in classes]
+    for _node in _nodes:
+        _node.childs = []
+    _nodes[0].parent = None
+    for _node, _pidx in zip(itertools.islice(_nodes, 1, None), parents):
+        _parent = _nodes[_pidx]
+        _node.parent = _parent
+        _parent.childs.append(_node)
+    return _nodes[0]
+
+
+def _vn_node(rootnode, coord):
+    """Return the node at `coord` in a pickled tree, see `Node.__reduce_ex__`."""
+    _node = rootnode
+    for _idx in coord:
+        _node = _node.childs[_idx]
+    return _node
+
+
+def _undo_changes(changes):
+    """Revert a sequence of `TreeChange` records, latest first."""
+    for _chg in reversed(changes):
+        if _chg.kind == "data":
+            _datadict = _chg.node.data
+            if _chg.keys[0] == "_vntree":
+                _chg.node._vn_mver += 1
+            if _chg.old is _MISSING:
+                # the value (or an intermediate dict created by `set_data`) is removed
+                for _key in _chg.keys[:-1]:
+                    _datadict = _datadict.get(_key)
+                    if not isinstance(_datadict, dict):
+                        break
+                else:
+                    _datadict.pop(_chg.keys[-1], None)
+                continue
+            for _key in _chg.keys[:-1]:
+                _datadict = _datadict.setdefault(_key, {})
+            _datadict[_chg.keys[-1]] = _chg.old
+        elif _chg.kind == "insert":
+            _chg.parent._vn_mver += 1
+            _childs = _chg.parent.childs
+            if _chg.idx < len(_childs) and _childs[_chg.idx] is _chg.node:
+                del _childs[_chg.idx]
+            else:
+                _childs[:] = [_n for _n in _childs if _n is not _chg.node]
+            _chg.node.parent = _chg.old
+            _set_tree_state(_chg.node, _chg.old._vn_tstate if _chg.old is not None else None)
+        elif _chg.kind == "remove":
+            _chg.parent._vn_mver += 1
+            _chg.parent.childs.insert(_chg.idx, _chg.node)
+
+
+
+# A change notification for tree observers, see `Node.add_observer`. 
+# `first` and `last` are the range of child indices in `parent` affected.
+# kind="inserted" | "removed" | "data_changed": rows `first`..`last` of `parent`;
+#   for the root node `parent` is None and first=last=0.
+# kind="moved": rows `first`..`last` of `parent` moved to `dest` at index `destidx`.
+TreeEvent = namedtuple("TreeEvent", ["kind", "parent", "first", "last", "dest", "destidx"])
+
+
+def tree_events(changes):
+    """Convert a sequence of `TreeChange` records into coalesced `TreeEvent`s.
+
+    Consecutive insertions (or removals, or moves) of adjacent rows under
+    the same parent are merged into a single event, a removal immediately
+    followed by the insertion of the same node is reported as a move, 
+    and data changes are reported once per run of adjacent sibling rows, 
+    after the structural events.
+
+    :param changes: `TreeChange` records in the order they were made.
+    :type changes: list
+    :returns: list of `TreeEvent`.
+    :rtype: list
+    """
+    _events = []
+    _datanodes = {}
+    _prev = None
+    ii = 0
+    while ii < len(changes):
+        _chg = changes[ii]
+        ii += 1
+        if _chg.kind == "data":
+            _datanodes[id(_chg.node)] = _chg.node
+            continue
+        if (_chg.kind == "remove" and ii < len(changes) and 
+                changes[ii].kind == "insert" and changes[ii].node is _chg.node):
+            _ins = changes[ii]
+            ii += 1
+            _ev = TreeEvent("moved", _chg.parent, _chg.idx, _chg.idx, _ins.parent, _ins.idx)
+            if (_prev and _prev.kind == "moved" and _prev.parent is _chg.parent and 
+                    _prev.dest is _ins.parent and _chg.parent is not _ins.parent and
+                    _chg.idx == _prev.first and 
+                    _ins.idx == _prev.destidx + _prev.last - _prev.first + 1):
+                _events[-1] = _prev = _prev._replace(last=_prev.last + 1)
+                continue
+        elif _chg.kind == "insert":
+            _ev = TreeEvent("inserted", _chg.parent, _chg.idx, _chg.idx, None, None)
+            if _prev and _prev.kind == "inserted" and _prev.parent is _chg.parent:
+                if _chg.idx == _prev.last + 1 or _chg.idx == _prev.first:
+                    _events[-1] = _prev = _prev._replace(last=_prev.last + 1)
+                    continue
+        elif _chg.kind == "remove":
+            _ev = TreeEvent("removed", _chg.parent, _chg.idx, _chg.idx, None, None)
+            if _prev and _prev.kind == "removed" and _prev.parent is _chg.parent:
+                if _chg.idx == _prev.first:
+                    _events[-1] = _prev = _prev._replace(last=_prev.last + 1)
+                    continue
+                elif _chg.idx == _prev.first - 1:
+                    _events[-1] = _prev = _prev._replace(first=_chg.idx)
+                    continue
+        else:
+            continue
+        _events.append(_ev)
+        _prev = _ev
+    # data changes refer to the current rows of the nodes
+    _rows = {}
+    for _node in _datanodes.values():
+        _parent = _node.parent
+        if _parent is None:
+            _events.append(TreeEvent("data_changed", None, 0, 0, None, None))
+            continue
+        _idx = next((jj for jj, _n in enumerate(_parent.childs) if _n is _node), None)
+        if _idx is not None:
+            _rows.setdefault(id(_parent), (_parent, []))[1].append(_idx)
+    for _parent, _idxs in _rows.values():
+        _idxs.sort()
+        _first = _last = _idxs[0]
+        for _idx in _idxs[1:] + [None]:
+            if _idx is not None and _idx == _last + 1:
+                _last = _idx
+                continue
+            _events.append(TreeEvent("data_changed", _parent, _first, _last, None, None))
+            _first = _last = _idx
+    return _events
+
+
+class _Observer:
+    """Tree maintainer dispatching coalesced `TreeEvent`s to a callback."""
+    def __init__(self, callback, before=None):
+        self.callback = callback
+        self.before = before
+        self.batched = False
+    def changing(self, rootnode, change):
+        for _event in tree_events([change]):
+            self.before(_event)
+    def begin_batch(self, rootnode):
+        self.batched = True
+        self.before(TreeEvent("layout_changed", rootnode, None, None, None, None))
+    def __call__(self, rootnode, changes):
+        _events = tree_events(changes)
+        if self.batched:
+            self.batched = False
+            self.callback(TreeEvent("layout_changed", rootnode, None, None, None, None))
+            _events = [_e for _e in _events if _e.kind == "data_changed"]
+        for _event in _events:
+            self.callback(_event)
+
+
+
+def _deep_sizeof(obj, seen):
+    """Size in bytes of `obj` and the objects it contains (excluding `Node`
+    instances), without recursion.
+
+    The `id` of each object counted is added to `seen`, so that shared
+    objects are counted once; `seen` grows with the number of objects.
+    """
+    _size = 0
+    _stack = [obj]
+    while _stack:
+        _obj = _stack.pop()
+        if isinstance(_obj, Node) or id(_obj) in seen:
+            continue
+        seen.add(id(_obj))
+        _size += sys.getsizeof(_obj)
+        if isinstance(_obj, dict):
+            _stack.extend(_obj.keys())
+            _stack.extend(_obj.values())
+        elif isinstance(_obj, (list, tuple, set, frozenset)):
+            _stack.extend(_obj)
+        elif hasattr(_obj, "__dict__") and not isinstance(_obj, type):
+            _stack.append(vars(_obj))
+    return _size
+
+
+def _write_chunks(chunks, write, bufsize):
+    """Write text chunks, joined into blocks of about `bufsize` characters."""
+    _buf = []
+    _size = 0
+    for _chunk in chunks:
+        _buf.append(_chunk)
+        _size += len(_chunk)
+        if _size >= bufsize:
+            write("".join(_buf))
+            _buf = []
+            _size = 0
+    if _buf:
+        write("".join(_buf))
+
 
 class NodeAttr:
     """Descriptor class for node attributes. 
@@ -71,17 +545,51 @@ class NodeAttr:
             _value = instance.data.get(self.name, self.initial)
         return _value
     def __set__(self, instance, value):
+        _state = instance._vn_tstate
+        if _state is not None and _state.lock is not None:
+            with _state.lock.write_locked():
+                return self._set_value(instance, value)
+        self._set_value(instance, value)
+    def _set_value(self, instance, value):
         if self.ns:
             if self.ns not in instance.data:
                 instance.data[self.ns] = {}
-            instance.data[self.ns][self.name] = value
+                if instance._vn_tstate is not None:
+                    instance._tree_changed(TreeChange("data", None, instance, None, (self.ns,), _MISSING))
+            _datadict = instance.data[self.ns]
+            _keys = (self.ns, self.name)
         else:
-            instance.data[self.name] = value
+            _datadict = instance.data
+            _keys = (self.name,)
+        if self.ns == "_vntree":
+            instance._vn_mver += 1
+        if instance._vn_tstate is not None:
+            _old = _datadict.get(self.name, _MISSING)
+            _datadict[self.name] = value
+            instance._tree_changed(TreeChange("data", None, instance, None, _keys, _old))
+        else:
+            _datadict[self.name] = value
     def __delete__(self, instance):
-        if self.ns and self.name in instance.data[self.ns]:
-            del instance.data[self.ns][self.name]
+        _state = instance._vn_tstate
+        if _state is not None and _state.lock is not None:
+            with _state.lock.write_locked():
+                return self._delete_value(instance)
+        self._delete_value(instance)
+    def _delete_value(self, instance):
+        _nsdict = instance.data.get(self.ns) if self.ns else None
+        if isinstance(_nsdict, dict) and self.name in _nsdict:
+            _datadict = _nsdict
+            _keys = (self.ns, self.name)
         elif self.name in instance.data:
-            del instance.data[self.name]
+            _datadict = instance.data
+            _keys = (self.name,)
+        else:
+            return
+        if self.ns == "_vntree":
+            instance._vn_mver += 1
+        _old = _datadict.pop(self.name)
+        if instance._vn_tstate is not None:
+            instance._tree_changed(TreeChange("data", None, instance, None, _keys, _old))
     def __set_name__(self, owner, name):
         self.name = name
 
@@ -124,6 +632,10 @@ class Node:
     :type treedict: dict or None
     """
     YAML_setup = False
+    _vn_mver = 0  # childs and `_vntree` metadata version, see `tree_cached`
+    _vn_dver = 0  # data version
+    _vn_sver = 0  # sub-tree data version
+    _vn_tstate = None  # `_TreeState` of the tree, see `add_maintainer`
     name = NodeAttr("_vntree")
     _id = NodeAttr("_vntree")
     _vntree_fpath = TreeAttr("_vntree")
@@ -133,7 +645,7 @@ class Node:
                 treedict=None, fpath=None, _id=None):
         if data and isinstance(data, dict):
             #self.data = collections.defaultdict(dict, copy.deepcopy(data))
-            self.data = copy.deepcopy(data)
+            self.data = copy.deepcopy(data, buffers.share_memo((data,)))
         else:
             self.data = {}
         if name:
@@ -141,21 +653,11 @@ class Node:
         elif not getattr(self, "name", None) and name is None:
             self.name = ""
         self.childs = []
-        ##print("in Node parent=",parent)
-        ##print("issubclass(parent.__class__, Node)=",issubclass(parent.__class__, Node))
-        if parent and issubclass(parent.__class__, Node):
-            parent.add_child(self)
-            ##print("in Node self.parent=",self.parent)
-        elif parent is None:
-            self.parent = None
-        else:
+        if parent is not None and not issubclass(parent.__class__, Node):
             raise TypeError("{}.__init__: instance «{}» argument «parent» type not valid: {}".format(self.__class__.__name__, name, type(parent)))
-        if callable(name):
-            self.name = str(name(self))
+        self.parent = None
         if treedict and isinstance(treedict, dict):
             self.from_treedict(treedict)
-        if fpath and isinstance(fpath, str):
-            self._vntree_fpath = fpath
         # if self._id is None:
         #     if _id is None:
         #         self._id = str(uuid.uuid4())
@@ -165,6 +667,17 @@ class Node:
             self._id = _id
         elif self._id is None:
             self._id = str(uuid.uuid4())
+        # the node is complete before it is attached, so that adding 
+        # it to the tree is recorded as a single change.
+        ##print("in Node parent=",parent)
+        ##print("issubclass(parent.__class__, Node)=",issubclass(parent.__class__, Node))
+        if parent:
+            parent.add_child(self)
+            ##print("in Node self.parent=",self.parent)
+        if callable(name):
+            self.name = str(name(self))
+        if fpath and isinstance(fpath, str):
+            self._vntree_fpath = fpath
 
 
     def __repr__(self):
@@ -172,6 +685,10 @@ class Node:
 
 
     def __iter__(self): 
+        _lock = self._vn_tstate is not None and _snapshot_lock(self)
+        if _lock:
+            yield from _snapshot(self, _lock)
+            return
         yield self  
         for node in itertools.chain(*map(iter, self.childs)):
             yield node
@@ -189,6 +706,114 @@ class Node:
         return sum([1 for n in self])
 
 
+    def _vn_state(self):
+        """The node attributes that are pickled and copied (without the
+        `parent` and `childs` links, see `__reduce_ex__`)."""
+        _state = self.__dict__.copy()
+        _state.pop("parent", None)
+        _state.pop("childs", None)
+        if len(_state) > 1 or "data" not in _state:
+            for _key in _TRANSIENT_SET.intersection(_state):
+                del _state[_key]
+        return _state
+
+
+    def __reduce_ex__(self, protocol):
+        """A tree is pickled from its root node without recursion: the
+        nodes are created and linked by `_vn_tree` from their classes and
+        the index of the parent of each node in pre-order, and their 
+        attributes are set by `__setstate__`.
+        Another node is pickled as `_vn_node(root node, coordinates)`, so
+        the whole tree is pickled with the node, and a node pickled on its
+        own only walks up its ancestors.
+        """
+        _node = self
+        _coord = []
+        while _node.parent is not None:
+            _idx = _child_index(_node.parent, _node)
+            if _idx is None:
+                break  # removed from its parent, pickled as a root node
+            _coord.append(_idx)
+            _node = _node.parent
+        if _node is not self:
+            return _vn_node, (_node, tuple(reversed(_coord)))
+        _nodes = [self]
+        _classes = [_vn_class(self)]
+        _parents = array("I")
+        _stack = [(0, _c) for _c in reversed(self.childs) if _c is not None]
+        while _stack:
+            _pidx, _node = _stack.pop()
+            _parents.append(_pidx)
+            _idx = len(_nodes)
+            _nodes.append(_node)
+            _classes.append(_vn_class(_node))
+            _stack.extend((_idx, _c) for _c in reversed(_node.childs) if _c is not None)
+        return _vn_tree, (_classes, _parents), [_n._vn_state() for _n in _nodes]
+
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # pickled by an earlier version, with the `parent` and `childs` links
+            self.__dict__.update(state)
+            return
+        # the attributes of the nodes created by `_vn_tree`, in pre-order
+        _stack = [self]
+        for _state in state:
+            _node = _stack.pop()
+            _node.__dict__.update(_state)
+            _stack.extend(reversed(_node.childs))
+
+
+    def __deepcopy__(self, memo):
+        # the whole tree is copied, as it is pickled
+        _root = self
+        while _root.parent is not None:
+            _root = _root.parent
+        _root._copy_tree(memo)
+        return memo[id(self)]
+
+
+    def _copy_tree(self, memo, share=False):
+        """Copy the sub-tree rooted at this node instance without
+        recursion, adding the node copies to the `copy.deepcopy` memo.
+
+        :param share: if True, the large buffers in the node data are 
+            shared by the copy (see `vntree.buffers.share_memo`).
+        :type share: bool
+        :returns: the copy of this node instance, without parent.
+        """
+        _nodes = [self]
+        _stack = [self]
+        while _stack:
+            _node = _stack.pop()
+            _childs = [_c for _c in _node.childs if _c is not None]
+            _nodes.extend(_childs)
+            _stack.extend(_childs)
+        _states = [_n._vn_state() for _n in _nodes]
+        if share:
+            buffers.share_memo((_v for _state in _states for _v in _state.values()), memo)
+        _copies = {}
+        for _node in _nodes:
+            _cls = _vn_class(_node)
+            _copy = _copies[id(_node)] = memo[id(_node)] = _cls.__new__(_cls)
+            _copy.parent = None
+        for _node, _state in zip(_nodes, _states):
+            _copy = _copies[id(_node)]
+            _copy.__dict__.update(copy.deepcopy(_state, memo))
+            _copy.childs = [_copies[id(_c)] for _c in _node.childs if _c is not None]
+            for _c in _copy.childs:
+                _c.parent = _copy
+        return _copies[id(self)]
+
+
+    def __bool__(self):
+        """ A node is always truthy; this avoids calling `__len__`, which
+        traverses the sub-tree, in tests such as `while node.parent:`.
+        """
+        return True
+
+
+    @_write_locked
     def add_child(self, node, *, idx=None, check_id=False):
         """Add a child node to the current node instance.
 
@@ -215,12 +840,24 @@ class Node:
         if _newnode is None:
             _newnode = node
         if idx is None:
-            self.childs.append(_newnode)
+            _idx = len(self.childs)
         elif isinstance(idx, int) and idx < len(self.childs):
-            self.childs.insert(idx, _newnode)
+            _idx = idx if idx >= 0 else max(len(self.childs) + idx, 0)
         else:
             raise ValueError("{}.add_child: cannot add node «{}», argument «idx»={} not correctly specified.".format(self.__class__.__name__, _newnode.name, idx))
+        _oldparent = getattr(_newnode, "parent", None)
+        if self._vn_tstate is not None:
+            self._tree_changing(TreeChange("insert", self, _newnode, _idx, None, _oldparent))
+        if idx is None:
+            self.childs.append(_newnode)
+        else:
+            self.childs.insert(idx, _newnode)
         _newnode.parent = self
+        if _newnode._vn_tstate is not self._vn_tstate:
+            _set_tree_state(_newnode, self._vn_tstate)
+        self._vn_mver += 1
+        if self._vn_tstate is not None:
+            self._tree_changed(TreeChange("insert", self, _newnode, _idx, None, _oldparent))
         return _newnode    
 
 
@@ -237,18 +874,23 @@ class Node:
     def clone(self, change_id=False):
         """Return a deep copy of the sub-tree rooted at this node instance.
 
+        The copy has no parent. The large buffers in the node data (NumPy
+        arrays, `bytearray`... of at least `vntree.buffers.BUFFER_MIN`
+        bytes) are shared by the copy, not copied.
+
         :param change_id:  if `True` set new _id for all nodes in the new tree.
         :type change_id: bool
         :returns: Copy of the sub-tree rooted at this node instance.
         :rtype: Node 
         """
-        _newtree = copy.deepcopy(self)
+        _newtree = self._copy_tree({}, share=True)
         if change_id:
             for _n in _newtree:
                 _n._id = str(uuid.uuid4())
         return _newtree
 
 
+    @_write_locked
     def remove_child(self, idx=None, *, name=None, node=None):
         """Remove a child node from the current node instance.
 
@@ -261,22 +903,26 @@ class Node:
         :returns: The node that has been removed, or False if not successful.
         :rtype: Node or False 
         """
+        _idx = None
         if (idx and isinstance(idx, int) and 
             -len(self.childs) <= idx < len(self.childs) ):
-                return self.childs.pop(idx)
-        if name and isinstance(name, str):
-            found_node = None
-            for _n in self.childs:
+                _idx = idx if idx >= 0 else len(self.childs) + idx
+        elif name and isinstance(name, str):
+            for ii, _n in enumerate(self.childs):
                 if _n.name == name:
-                    found_node = _n
+                    _idx = ii
                     break
-            if found_node:
-                self.childs.remove(found_node)
-                return found_node
-        if node and node in self.childs:
-            self.childs.remove(node)
-            return node
-        return False
+        if _idx is None and node and node in self.childs:
+            _idx = self.childs.index(node)
+        if _idx is None:
+            return False
+        if self._vn_tstate is not None:
+            self._tree_changing(TreeChange("remove", self, self.childs[_idx], _idx, None, None))
+        _removed = self.childs.pop(_idx)
+        self._vn_mver += 1
+        if self._vn_tstate is not None:
+            self._tree_changed(TreeChange("remove", self, _removed, _idx, None, None))
+        return _removed
 
     @property
     def _path(self):
@@ -335,6 +981,7 @@ class Node:
         return len(self._coord) + 1
 
 
+    @_read_locked
     def get_data(self, *keys):
         """Get a value from the instance `data` dict. 
 
@@ -361,6 +1008,7 @@ class Node:
         return _val
 
 
+    @_write_locked
     def set_data(self, *keys, value):
         """Set a value in the instance `data` dict.
 
@@ -370,18 +1018,242 @@ class Node:
             `value` is a keyword-only argument.
         :returns: `True` if successful. 
         """
+        if keys and keys[0] == "_vntree":
+            self._vn_mver += 1
         _datadict = self.data
         for ii, _key in enumerate(keys):
             if ii==len(keys)-1:
-                _datadict[_key] = value
+                if self._vn_tstate is not None:
+                    _old = _datadict.get(_key, _MISSING)
+                    _datadict[_key] = value
+                    self._tree_changed(TreeChange("data", None, self, None, keys, _old))
+                else:
+                    _datadict[_key] = value
             else:
-                # if _key not in _datadict:
-                #     _datadict[_key] = {}
-                # _datadict = _datadict[_key]
+                if self._vn_tstate is not None and _key not in _datadict:
+                    # the intermediate dict is recorded, so that it is removed by a rollback
+                    _datadict[_key] = {}
+                    self._tree_changed(TreeChange("data", None, self, None, keys[:ii+1], _MISSING))
                 _datadict = _datadict.setdefault(_key, {})
         return True
 
 
+    def _tree_changed(self, change):
+        """Record a `TreeChange` in the tree containing this node instance.
+
+        Outside a batch the tree maintainers are called immediately, 
+        inside a batch the change is deferred until the outermost batch exits.
+        """
+        _state = self._vn_tstate
+        if _state is None:
+            return
+        if _state.batches:
+            _state.pending.append(change)
+        else:
+            for _maintainer in list(_state.maintainers):
+                _maintainer(_state.root, [change])
+
+
+    def _tree_changing(self, change):
+        """Notify the observers registered with a `before` callback that a
+        structural `TreeChange` is about to be made (outside a batch).
+        """
+        _state = self._vn_tstate
+        if _state is None or _state.batches:
+            return
+        for _maintainer in list(_state.maintainers):
+            if isinstance(_maintainer, _Observer) and _maintainer.before is not None:
+                _maintainer.changing(_state.root, change)
+
+
+    def add_maintainer(self, maintainer):
+        """Register a tree maintainer on the tree containing this node instance.
+
+        A maintainer is a callable `maintainer(rootnode, changes)` that keeps
+        derived structures (indexes, counts, hashes, observers) up to date. 
+        `changes` is a list of `TreeChange` records: outside a batch it is called
+        for each change, inside `batch()` it is called once with all changes
+        when the outermost batch exits. The nodes added to the tree with
+        `add_child` are maintained, the nodes linked directly through 
+        `childs` and `parent` are not.
+
+        :param maintainer: the maintainer callable.
+        :type maintainer: callable
+        :returns: the maintainer. 
+        """
+        _tree_state(self).maintainers.append(maintainer)
+        return maintainer
+
+
+    def remove_maintainer(self, maintainer):
+        """Unregister a tree maintainer added with `add_maintainer`.
+
+        :param maintainer: the maintainer callable.
+        :type maintainer: callable
+        :returns: `True` if successful. 
+        :rtype: bool
+        """
+        _state = self._vn_tstate
+        if _state is None or maintainer not in _state.maintainers:
+            return False
+        _state.maintainers.remove(maintainer)
+        return True
+
+
+    def _tree_lock(self):
+        """Return the tree `RWLock` in concurrency mode, otherwise `None`."""
+        _state = self._vn_tstate
+        return _state and _state.lock
+
+
+    def enable_concurrency(self):
+        """Enable thread-safe access to the tree containing this node instance.
+
+        In concurrency mode the tree is protected by a reader-writer lock: 
+        `add_child`, `remove_child`, `set_data`, `NodeAttr` attributes and 
+        `batch()` blocks take the write lock, `get_data` and `to_treedict` 
+        take the read lock, and iterating over a node takes a snapshot of the 
+        sub-tree under the read lock, so that iteration is not affected by 
+        concurrent changes. Use `read_locked()` and `write_locked()` to make 
+        a compound operation atomic. The lock is held by the nodes of the
+        tree (including the nodes added later with `add_child`), the other
+        trees are not affected.
+
+        :returns: the tree lock.
+        :rtype: RWLock
+        """
+        _state = _tree_state(self)
+        if _state.lock is None:
+            _state.lock = RWLock()
+        return _state.lock
+
+
+    def disable_concurrency(self):
+        """Disable the concurrency mode set with `enable_concurrency`.
+
+        :returns: `True` if successful. 
+        :rtype: bool
+        """
+        _state = self._vn_tstate
+        if _state is None or _state.lock is None:
+            return False
+        with _state.lock.write_locked():
+            _state.lock = None
+        return True
+
+
+    def read_locked(self):
+        """Context manager holding the tree read lock in concurrency mode.
+
+        :returns: context manager (a no-op if concurrency mode is not enabled).
+        """
+        _lock = self._tree_lock()
+        return _lock.read_locked() if _lock else contextlib.nullcontext(self)
+
+
+    def write_locked(self):
+        """Context manager holding the tree write lock in concurrency mode.
+
+        :returns: context manager (a no-op if concurrency mode is not enabled).
+        """
+        _lock = self._tree_lock()
+        return _lock.write_locked() if _lock else contextlib.nullcontext(self)
+
+
+    def add_observer(self, callback, before=None):
+        """Register an observer of changes in the tree containing this node instance.
+
+        The observer is called with a `TreeEvent` for each insertion, removal,
+        move or data change, e.g. to drive `rowsInserted`-style notifications 
+        in a UI model. Events from a `batch()` are coalesced, so that 
+        consecutive insertions emit a single event for the row range.
+
+        If `before` is given, it is called with the same `TreeEvent` before
+        each insertion or removal is made, so that the pairs of 
+        `beginInsertRows`/`endInsertRows`-style notifications can be emitted
+        around the change. A `batch()` is then reported as a 
+        `"layout_changed"` event, passed to `before` when the outermost batch
+        starts and to `callback` when it exits (followed by the data 
+        change events of the batch).
+
+        :param callback: callable `callback(event)`.
+        :type callback: callable
+        :param before: callable `before(event)`, or `None`.
+        :type before: callable
+        :returns: the observer callback. 
+        """
+        self.add_maintainer(_Observer(callback, before))
+        return callback
+
+
+    def remove_observer(self, callback):
+        """Unregister an observer added with `add_observer`.
+
+        :param callback: the observer callback.
+        :type callback: callable
+        :returns: `True` if successful. 
+        :rtype: bool
+        """
+        _state = self._vn_tstate
+        if _state is None:
+            return False
+        for _maintainer in _state.maintainers:
+            if isinstance(_maintainer, _Observer) and _maintainer.callback == callback:
+                return self.remove_maintainer(_maintainer)
+        return False
+
+
+    @contextlib.contextmanager
+    def batch(self, rollback=False):
+        """Context manager suspending tree maintenance during a block of changes.
+
+        Changes made with `add_child`, `remove_child`, `set_data` and 
+        `NodeAttr` attributes inside the block are recorded, and the tree 
+        maintainers are called once with all the changes when the 
+        outermost batch exits. Batches can be nested. In concurrency mode
+        (see `enable_concurrency`) the block holds the tree write lock.
+
+        |  with rootnode.batch(rollback=True):
+        |      for _n in rootnode:
+        |          _n.set_data("status", value="ingested")
+
+        :param rollback: if `True`, revert the changes made in this block
+            if an exception escapes from it.
+        :type rollback: bool
+        :returns: the node instance (`self`).
+        :rtype: Node
+        """
+        _state = _tree_state(self)
+        _root = _state.root
+        _lock = _state.lock
+        if _lock is not None:
+            _lock.acquire_write()
+        _mark = len(_state.pending)
+        if not _state.batches:
+            for _maintainer in list(_state.maintainers):
+                if isinstance(_maintainer, _Observer) and _maintainer.before is not None:
+                    _maintainer.begin_batch(_root)
+        _state.batches += 1
+        try:
+            yield self
+        except BaseException:
+            if rollback:
+                _undo_changes(_state.pending[_mark:])
+                del _state.pending[_mark:]
+            raise
+        finally:
+            _state.batches -= 1
+            try:
+                if not _state.batches:
+                    _changes, _state.pending = _state.pending, []
+                    for _maintainer in list(_state.maintainers):
+                        if _changes or (isinstance(_maintainer, _Observer) and _maintainer.batched):
+                            _maintainer(_root, _changes)
+            finally:
+                if _lock is not None:
+                    _lock.release_write()
+
+
     @property
     def _root(self):
         """Attribute referencing the root node of the tree.
@@ -534,6 +1406,113 @@ class Node:
         return _node
 
 
+    def parallel_map(self, func, processes=None, chunk="subtree", key=None):
+        """Apply a function to the `data` of every node in the (sub-)tree 
+        rooted at this node instance, using a pool of worker processes.
+
+        Only the node `data` dicts are sent to the workers, so `func` 
+        must be picklable, e.g. a function defined at module level.
+
+        :param func: function `func(data)` returning a value for a node.
+        :type func: callable
+        :param processes: number of worker processes, default `os.cpu_count()`.
+            `processes=1` runs `func` in the current process.
+        :type processes: int or None
+        :param chunk: `"subtree"` partitions the tree into independent
+            sub-trees of balanced size, one chunk per process; 
+            `"nodes"` splits the nodes in pre-order into smaller chunks.
+        :type chunk: str
+        :param key: if specified, the result for each node is saved
+            in `data` with this key (or tuple of nested keys), as a batch.
+        :type key: str or tuple or None
+        :returns: the results, in the order of iteration over the (sub-)tree.
+        :rtype: list
+        """
+        return parallel.parallel_map(self, func, processes=processes, chunk=chunk, key=key)
+
+
+    def parallel_fold(self, leaf_fn, combine_fn, workers=None):
+        """Fold (reduce) the (sub-)tree rooted at this node instance 
+        bottom-up, using a pool of worker processes.
+
+        The folded value of a node is 
+        `combine_fn(leaf_fn(node.data), [folded values of node.childs])`,
+        e.g. a size rollup with `leaf_fn=lambda d: d.get("size", 0)` and
+        `combine_fn=lambda v, cvals: v + sum(cvals)`.
+        The tree is split into independent sub-trees of roughly equal size 
+        that are folded in the workers, then the partial results are combined
+        up the top of the tree in the current process. The result is 
+        deterministic, as the children values are always combined in order.
+        `leaf_fn` and `combine_fn` must be picklable, e.g. module-level functions.
+
+        :param leaf_fn: function `leaf_fn(data)` returning a node's own value.
+        :type leaf_fn: callable
+        :param combine_fn: function `combine_fn(value, childvalues)`.
+        :type combine_fn: callable
+        :param workers: number of worker processes, default `os.cpu_count()`.
+            `workers=1` folds the tree in the current process.
+        :type workers: int or None
+        :returns: the folded value for this node instance.
+        """
+        return parallel.parallel_fold(self, leaf_fn, combine_fn, workers=workers)
+
+
+    async def aload(self):
+        """Coroutine loading the data of this node instance from its backend.
+
+        In-memory `Node` data is always loaded, so this returns immediately;
+        backend node classes (e.g. `MongoNode`, `SqliteNode`) override it
+        to load without blocking the event loop.
+
+        :returns: the node instance (`self`).
+        :rtype: Node
+        """
+        return self
+
+
+    async def awalk(self, concurrency=8):
+        """Asynchronous pre-order iteration over the (sub-)tree rooted at 
+        this node instance, loading nodes with `aload`.
+
+        |  async for node in rootnode.awalk():
+        |      print(node.name)
+
+        Each node is loaded before it is yielded, and the loading of its
+        children (the next level) is started before it is yielded, so 
+        that it proceeds while the node is being processed. At most 
+        `concurrency` nodes are loaded at a time. Nodes with the trivial 
+        `Node.aload` are yielded without creating a task.
+
+        :param concurrency: maximum number of concurrent `aload` calls.
+        :type concurrency: int
+        :returns: asynchronous iterator of nodes.
+        """
+        _semaphore = asyncio.Semaphore(concurrency)
+        _tasks = {}
+        async def _load(node):
+            async with _semaphore:
+                await node.aload()
+        def _prefetch(node):
+            if type(node).aload is not Node.aload and id(node) not in _tasks:
+                _tasks[id(node)] = asyncio.ensure_future(_load(node))
+        _prefetch(self)
+        _stack = [self]
+        try:
+            while _stack:
+                _n = _stack.pop()
+                _task = _tasks.pop(id(_n), None)
+                if _task is not None:
+                    await _task
+                _childs = [_c for _c in _n.childs if _c is not None]
+                for _c in _childs:
+                    _prefetch(_c)
+                yield _n
+                _stack.extend(reversed(_childs))
+        finally:
+            for _task in _tasks.values():
+                _task.cancel()
+
+
     def to_texttree(self, indent=3, func=True, symbol='ascii'):
         """Method returning a text representation of the (sub-)tree  
         rooted at the current node instance (`self`).
@@ -616,15 +1595,105 @@ class Node:
         print(self.to_texttree())
 
 
+    def memory_report(self, depth=None, by="class", output="dict"):
+        """Report the memory used by the (sub-)tree rooted at the current
+        node instance (`self`).
+
+        The memory is split into the `Node` objects (including their 
+        `__dict__` and attributes other than `data` and `childs`), the 
+        `childs` lists, the `data` dicts, the `_vntree` metadata and the 
+        `data` payload. Shared objects are counted once. The tree is 
+        traversed without recursion, and without holding a list of nodes,
+        but the ids of the objects counted are kept, so the memory used 
+        by the report is proportional to the number of objects in the 
+        (sub-)tree.
+
+        :param depth: the maximum depth of nodes below `self` to include, 
+            `None` for the complete sub-tree.
+        :type depth: int or None
+        :param by: group the report by node "class", "level" (relative
+            to `self`), or "data_key" (the top-level keys of `data`).
+        :type by: str
+        :param output: "dict" or "table".
+        :type output: str
+        :returns: for `by="class"` or "level", a dict of group to a dict of 
+            `nodes` (count) and bytes for `node`, `childs`, `data`, `_vntree`, 
+            `payload` and `total`; for `by="data_key"`, a dict of key to a
+            dict of `count` and `bytes`, with keys "(node)", "(childs)" and 
+            "(data)" for the containers. A text table if `output="table"`.
+        :rtype: dict or str
+        """
+        if by not in ("class", "level", "data_key"):
+            raise ValueError("{}.memory_report: argument «by»=«{}» not valid, must be 'class', 'level' or 'data_key'.".format(self.__class__.__name__, by))
+        _seen = set()
+        _report = {}
+        def _add(group, **sizes):
+            _row = _report.setdefault(group, dict.fromkeys(sizes, 0))
+            for _k, _v in sizes.items():
+                _row[_k] += _v
+        _stack = [(self, 0)]
+        while _stack:
+            _n, _level = _stack.pop()
+            _attrs = vars(_n)
+            _nodesize = sys.getsizeof(_n) + sys.getsizeof(_attrs) + sum(
+                _deep_sizeof(_v, _seen) for _k, _v in _attrs.items() 
+                if _k not in ("data", "childs", "parent", "_vn_tstate"))
+            _childssize = sys.getsizeof(_n.childs)
+            _datasize = 0
+            if id(_n.data) not in _seen:
+                _seen.add(id(_n.data))
+                _datasize = sys.getsizeof(_n.data)
+            if by == "data_key":
+                _add("(node)", count=1, bytes=_nodesize)
+                _add("(childs)", count=1, bytes=_childssize)
+                _add("(data)", count=1, bytes=_datasize)
+                for _key, _val in _n.data.items():
+                    _add(_key, count=1, bytes=_deep_sizeof(_key, _seen) + _deep_sizeof(_val, _seen))
+            else:
+                _metasize = _payloadsize = 0
+                for _key, _val in _n.data.items():
+                    _size = _deep_sizeof(_key, _seen) + _deep_sizeof(_val, _seen)
+                    if _key == "_vntree":
+                        _metasize += _size
+                    else:
+                        _payloadsize += _size
+                _add(_n.__class__.__name__ if by == "class" else _level, 
+                     nodes=1, node=_nodesize, childs=_childssize, data=_datasize, 
+                     _vntree=_metasize, payload=_payloadsize,
+                     total=_nodesize + _childssize + _datasize + _metasize + _payloadsize)
+            if depth is None or _level < depth:
+                _stack.extend((_c, _level + 1) for _c in reversed(_n.childs) if _c is not None)
+        if output == "table":
+            return self._memory_table(_report, by)
+        return _report
+
+
+    @staticmethod
+    def _memory_table(report, by):
+        _sizekey = "bytes" if by == "data_key" else "total"
+        _cols = list(next(iter(report.values())).keys()) if report else []
+        if by == "level":
+            _rows = sorted(report.items())
+        else:
+            _rows = sorted(report.items(), key=lambda kv: -kv[1][_sizekey])
+        _totals = {_c: sum(_r[_c] for _g, _r in _rows) for _c in _cols}
+        _width = max([len(str(_g)) for _g, _r in _rows] + [len(by), 5])
+        _lines = ["{:<{w}}".format(by, w=_width) + "".join("{:>14}".format(_c) for _c in _cols)]
+        for _group, _row in _rows + [("TOTAL", _totals)]:
+            _lines.append("{:<{w}}".format(str(_group), w=_width) 
+                          + "".join("{:>14,d}".format(_row[_c]) for _c in _cols))
+        return "\n".join(_lines) + "\n"
+
+
     def from_treedict(self, treedict):
         if "data" in treedict:
             #self.data = collections.defaultdict(dict, treedict["data"])
-            _nodedata = copy.deepcopy(treedict["data"])
+            _nodedata = copy.deepcopy(treedict["data"], buffers.share_memo((treedict["data"],)))
             # if new_id and "_id" in _nodedata["_vntree"]:
             #     _nodedata["_vntree"].pop("_id")
             self.data = _nodedata
         for key, val in treedict.items():
-            if key in ["parent", "childs", "data"]:
+            if key == "data" or key in _SNAPSHOT_TRANSIENT:
                 continue
             setattr(self, key, val)
         if "childs" in treedict.keys():
@@ -633,12 +1702,16 @@ class Node:
                 self.__class__(parent=self, treedict=_childdict)
 
 
+    @_read_locked
     def to_treedict(self, recursive=True, treemeta=True, dataonly=False):
         # NOTE: replace vars(self) with self.__dict__ ( and self.__class__.__dict__ ?)
+        # the large buffers (e.g. NumPy arrays) are shared, not copied
         if dataonly:
-            _dct = {"data": copy.deepcopy(self.data)}
+            _dct = {"data": copy.deepcopy(self.data, buffers.share_memo((self.data,)))}
         else:
-            _dct = {k:copy.deepcopy(v) for k, v in vars(self).items() if k not in ["parent", "childs"]}
+            _vars = {k: v for k, v in vars(self).items() if k not in _TRANSIENT_ATTRS}
+            _memo = buffers.share_memo(_vars.values())
+            _dct = {k:copy.deepcopy(v, _memo) for k, v in _vars.items()}
         if "_vntree" in _dct["data"]:
             if not treemeta:
                 _dct["data"].pop("_vntree")
@@ -652,32 +1725,178 @@ class Node:
         return _dct 
 
 
-    def to_JSON(self, filepath=None, treemeta=True, dataonly=False, cls=None, default=None):
-        _treedict = self.to_treedict(treemeta=treemeta, dataonly=dataonly)
+    def _JSON_head(self, encode, treemeta, dataonly, separators=(", ", ": ")):
+        """JSON text of the node's treedict (see `to_treedict`), up to and
+        including the opening bracket of the `childs` list."""
+        _item, _key = separators
+        _data = self.data
+        if not treemeta and "_vntree" in _data:
+            _data = {k: v for k, v in _data.items() if k != "_vntree"}
+        _parts = ['{"data"', _key, encode(_data)]
+        if not dataonly:
+            for k, v in vars(self).items():
+                if k == "data" or k in _TRANSIENT_ATTRS:
+                    continue
+                _parts.extend((_item, encode(k), _key, encode(v)))
+        _parts.extend((_item, '"childs"', _key, '['))
+        return "".join(_parts)
+
+
+    def iter_JSON(self, treemeta=True, dataonly=False, cls=None, default=None, backend=None):
+        """Generate the JSON representation of the (sub-)tree rooted at 
+        the current node instance in chunks of text, without building the
+        treedict and without recursion. With the default backend "json", 
+        the concatenated chunks are identical to 
+        `json.dumps(self.to_treedict(treemeta, dataonly), cls=cls, default=default)`
+        (except that datetime and UUID values are encoded natively, 
+        see `vntree.jsonbackends`).
+
+        Note: in concurrency mode, use `with node.read_locked():` to prevent
+        changes to the tree while the chunks are generated.
+
+        :param treemeta: if False, omit the `_vntree` metadata from `data`.
+        :type treemeta: bool
+        :param dataonly: if True, only output `data` (and `childs`).
+        :type dataonly: bool
+        :param cls: JSON encoder class, uses the standard library `json`.
+        :param default: function for objects that cannot be serialized.
+        :param backend: name of the JSON backend, `None` for the default 
+            backend (see `vntree.jsonbackends`).
+        :type backend: str or None
+        :returns: generator of `str` chunks.
+        """
+        _backend = jsonbackends.get_backend(backend)
+        encode = _backend.encoder(default, cls)
+        _separators = (", ", ": ") if cls is not None else _backend.separators
+        _item = _separators[0]
+        _stack = [(self, None)]
+        while _stack:
+            _n, _childs = _stack[-1]
+            if _childs is None:
+                if type(_n).to_treedict is not Node.to_treedict:
+                    # a sub-class with its own treedict, e.g. SqliteNode
+                    _stack.pop()
+                    yield encode(_n.to_treedict(treemeta=treemeta, dataonly=dataonly))
+                    continue
+                yield _n._JSON_head(encode, treemeta, dataonly, _separators)
+                _stack[-1] = (_n, iter(_n.childs))
+                continue
+            _child = next(_childs, _MISSING)
+            if _child is _MISSING:
+                _stack.pop()
+                yield "]}"
+                continue
+            if _child is not _n.childs[0]:
+                yield _item
+            _stack.append((_child, None))
+
+
+    @_read_locked
+    def to_JSON(self, filepath=None, treemeta=True, dataonly=False, cls=None, default=None, 
+                bufsize=1<<16, backend=None, compression="auto", level=None):
+        """Serialize the (sub-)tree rooted at the current node instance to 
+        JSON, see `iter_JSON`. The JSON is written directly to the file, so
+        the memory used does not depend on the size of the tree.
+
+        :param filepath: file path, or a file-like object opened in text 
+            mode (e.g. `socket.makefile("w")`), or `None` to return a string.
+        :type filepath: str or file-like or None
+        :param treemeta: if False, omit the `_vntree` metadata from `data`.
+        :type treemeta: bool
+        :param dataonly: if True, only output `data` (and `childs`).
+        :type dataonly: bool
+        :param cls: JSON encoder class, uses the standard library `json`.
+        :param default: function for objects that cannot be serialized.
+        :param bufsize: the number of characters buffered between writes.
+        :type bufsize: int
+        :param backend: name of the JSON backend, `None` for the default 
+            backend (see `vntree.jsonbackends`).
+        :type backend: str or None
+        :param compression: compression of the file, "gzip", "bz2", "lzma",
+            `None`, or "auto" to use the file extension (see `vntree.compressed`).
+        :type compression: str or None
+        :param level: compression level, `None` for the default level.
+        :type level: int or None
+        :returns: the JSON string if `filepath=None`, the absolute file path,
+            or the file-like object.
+        """
+        _chunks = self.iter_JSON(treemeta=treemeta, dataonly=dataonly, cls=cls, 
+                                 default=default, backend=backend)
         if filepath is None:
-            #return json.dumps(_treedict, default=default, cls=VntreeEncoder)
-            return json.dumps(_treedict, default=default, cls=cls)
+            return "".join(_chunks)
+        elif hasattr(filepath, "write"):
+            _write_chunks(_chunks, filepath.write, bufsize)
+            return filepath
         else:
-            with open(filepath, 'w') as _fh:
-                #json.dump(_treedict, _fh, default=default, cls=VntreeEncoder)
-                json.dump(_treedict, _fh, default=default, cls=cls)
+            with compressed.open_file(filepath, 'w', compression, level) as _fh:
+                _write_chunks(_chunks, _fh.write, bufsize)
             return os.path.abspath(filepath)
 
 
     @classmethod
-    def from_JSON(cls, filepath, object_hook=None):
+    def from_JSON(cls, filepath, object_hook=None, max_nodes=None, coord=None, path=None,
+                  compression="auto"):
+        """Class method that loads a tree from JSON (see `to_JSON`).
+
+        The JSON is parsed incrementally and the nodes are built as they 
+        are read, without recursion (see `vntree.jsonstream`). A sub-tree 
+        can be loaded, without loading the rest of the tree, by specifying 
+        its `coord` or `path`. 
+
+        :param filepath: file path, JSON string, or file-like object opened
+            in text mode.
+        :type filepath: str or file-like
+        :param object_hook: function applied to the decoded dicts in 
+            the node `data` and attribute values (see `json.load`). It is
+            not applied to the node objects (the dicts with `data` and 
+            `childs`), except for sub-classes that override `from_treedict`.
+        :param max_nodes: the maximum number of nodes to load, `None` for all.
+        :type max_nodes: int or None
+        :param coord: absolute coordinates of the sub-tree to load.
+        :type coord: tuple or None
+        :param path: absolute node path of the sub-tree to load (see `get_node_by_path`).
+        :type path: str or None
+        :param compression: compression of the file, "gzip", "bz2", "lzma",
+            `None`, or "auto" to detect it (see `vntree.compressed`).
+        :type compression: str or None
+        :returns: root node of the (sub-)tree or `False` if failure. 
+        :rtype: Node or bool
+        """
+        if cls.from_treedict is not Node.from_treedict:
+            # sub-classes with their own treedict loading need the complete treedict
+            return cls._from_JSON_treedict(filepath, object_hook, compression)
+        rootnode = None
+        try:
+            if hasattr(filepath, "read"):
+                rootnode = jsonstream.load_tree(filepath, cls, object_hook, max_nodes, coord, path)
+            elif isinstance(filepath, str) and os.path.isfile(filepath):
+                with compressed.open_file(filepath, 'r', compression) as _fh:
+                    rootnode = jsonstream.load_tree(_fh, cls, object_hook, max_nodes, coord, path)
+            elif isinstance(filepath, str):
+                rootnode = jsonstream.load_tree(io.StringIO(filepath), cls, object_hook, max_nodes, coord, path)
+        except ValueError as err: 
+            _src = filepath if not isinstance(filepath, str) or os.path.isfile(filepath) else filepath[:100]
+            logger.warning("%s.from_json: does not appear to be valid JSON «%s», %s." % (cls.__name__, _src, err))
+            return False
+        if rootnode is None:
+            return False
+        return rootnode
+
+
+    @classmethod
+    def _from_JSON_treedict(cls, filepath, object_hook=None, compression="auto"):
         err = ""
         _treedict = None
         if isinstance(filepath, str) and os.path.isfile(filepath):
             try:
-                with open(filepath, 'r') as _fh:
+                with compressed.open_file(filepath, 'r', compression) as _fh:
                     #_treedict = json.load(_fh, object_hook=as_vntree)
-                    _treedict = json.load(_fh, object_hook=object_hook)
+                    _treedict = jsonbackends.get_backend().loads(_fh.read(), object_hook=object_hook)
             except Exception as err: 
                 logger.warning("%s.from_json: cannot open «filepath»=«%s», %s." % (cls.__name__, filepath, err))
         elif isinstance(filepath, str):
             try:
-                _treedict = json.loads(filepath, object_hook=object_hook)
+                _treedict = jsonbackends.get_backend().loads(filepath, object_hook=object_hook)
             except Exception as err: 
                 logger.warning("%s.from_json: does not appear to be valid JSON «%s», %s." % (cls.__name__, filepath[:100], err))
         if not _treedict:
@@ -688,7 +1907,7 @@ class Node:
             return rootnode
 
 
-    def tree_compare(self, othertree, treemeta=False):
+    def tree_compare(self, othertree, treemeta=False, backend=None):
         """Compare the (sub-)tree rooted at `self` with another tree.
 
         `tree_compare` converts the trees being compared into JSON string
@@ -699,55 +1918,291 @@ class Node:
         :type othertree: Node
         :param treemeta: include private vntree metadata in comparison.
         :type treemeta: bool
+        :param backend: name of the JSON backend, `None` for the default 
+            backend (see `vntree.jsonbackends`).
+        :type backend: str or None
         :returns: similarity of the trees as a number between 0 and 1. 
         :rtype: float 
         """
         return SequenceMatcher(None, 
-                json.dumps(self.to_treedict(treemeta=treemeta), default=str), 
-                json.dumps(othertree.to_treedict(treemeta=treemeta), default=str)
+                self.to_JSON(treemeta=treemeta, default=str, backend=backend), 
+                othertree.to_JSON(treemeta=treemeta, default=str, backend=backend)
                 ).ratio()
 
 
-    def savefile(self, filepath=None, enforceext=False, protocol=4):
-        """Save (dump) the tree in a pickle file.
+    def _ndjson_record(self, parent_id, position):
+        """The NDJSON record of the node (see `to_ndjson`)."""
+        _data = self.data
+        _meta = _data.get("_vntree")
+        if isinstance(_meta, dict):
+            # keep the `_vntree` key, so that the order of the keys is preserved
+            _data = dict(_data)
+            _data["_vntree"] = vnbfile.split_meta(_meta)
+        _rec = {"_id": self._id, "parent_id": parent_id, "position": position,
+                "name": self.name, "data": _data}
+        _attrs = {k: v for k, v in vars(self).items()
+                  if k != "data" and k not in _TRANSIENT_ATTRS}
+        if _attrs:
+            _rec["attrs"] = _attrs
+        return _rec
+
+
+    def iter_ndjson(self, default=None, backend=None):
+        """Generate the NDJSON lines of the (sub-)tree rooted at the
+        current node instance in pre-order, without recursion (see `to_ndjson`).
+
+        :param default: function for objects that cannot be serialized.
+        :param backend: name of the JSON backend, `None` for the default
+            backend (see `vntree.jsonbackends`).
+        :type backend: str or None
+        :returns: generator of lines of text, including the newline.
+        """
+        encode = jsonbackends.get_backend(backend).encoder(default)
+        _parent = self.parent
+        if _parent is not None:
+            _stack = [(self, _parent._id, _parent.childs.index(self))]
+        else:
+            _stack = [(self, None, 0)]
+        while _stack:
+            _node, _parent_id, _position = _stack.pop()
+            yield encode(_node._ndjson_record(_parent_id, _position)) + "\n"
+            _childs = _node.childs
+            for ii in range(len(_childs) - 1, -1, -1):
+                _stack.append((_childs[ii], _node._id, ii))
+
+
+    @_read_locked
+    def to_ndjson(self, filepath=None, append=False, default=None,
+                  bufsize=1<<16, backend=None):
+        """Serialize the (sub-)tree rooted at the current node instance to
+        the flat NDJSON format, one line per node with keys `_id`, `parent_id`,
+        `position`, `name`, `data` and (if the node has other attributes)
+        `attrs`, see `vntree.ndjson`.
+
+        The `parent_id` of the current node is the `_id` of its parent (if
+        it has one), so that a sub-tree appended to the NDJSON file of its
+        tree is attached to its parent by `from_ndjson`. A node written
+        again (with the same `_id`) replaces the earlier one.
+
+        :param filepath: file path, or a file-like object opened in text
+            mode, or `None` to return a string.
+        :type filepath: str or file-like or None
+        :param append: if True, append the lines to the file.
+        :type append: bool
+        :param default: function for objects that cannot be serialized.
+        :param bufsize: the number of characters buffered between writes.
+        :type bufsize: int
+        :param backend: name of the JSON backend, `None` for the default
+            backend (see `vntree.jsonbackends`).
+        :type backend: str or None
+        :returns: the NDJSON string if `filepath=None`, the absolute file path,
+            or the file-like object.
+        """
+        _chunks = self.iter_ndjson(default=default, backend=backend)
+        if filepath is None:
+            return "".join(_chunks)
+        elif hasattr(filepath, "write"):
+            _write_chunks(_chunks, filepath.write, bufsize)
+            return filepath
+        else:
+            with open(filepath, 'a' if append else 'w') as _fh:
+                _write_chunks(_chunks, _fh.write, bufsize)
+            return os.path.abspath(filepath)
+
+
+    @classmethod
+    def from_ndjson(cls, filepath, workers=None, chunksize=1<<26, backend=None):
+        """Class method that loads a tree from the flat NDJSON format
+        (see `to_ndjson`). The lines can be in any order; when several
+        lines have the same `_id`, the last line wins.
+
+        :param filepath: file path, NDJSON string, or file-like object
+            opened in text mode.
+        :type filepath: str or file-like
+        :param workers: number of worker processes parsing chunks of a
+            file in parallel, `None` to parse in the current process.
+        :type workers: int or None
+        :param chunksize: approximate size in bytes of the chunks parsed
+            by the workers.
+        :type chunksize: int
+        :param backend: name of the JSON backend, `None` for the default
+            backend (see `vntree.jsonbackends`).
+        :type backend: str or None
+        :returns: root node of the tree or `False` if failure.
+        :rtype: Node or bool
+        """
+        if isinstance(filepath, str) and not os.path.isfile(filepath):
+            filepath, workers = io.StringIO(filepath), None
+        try:
+            _records = ndjson.iter_records(filepath, workers=workers,
+                                           chunksize=chunksize, backend=backend)
+            rootnode = ndjson.build_tree(cls, _records)
+        except (ValueError, KeyError, TypeError) as err:
+            logger.warning("%s.from_ndjson: cannot load NDJSON «%s», %s." % (cls.__name__, filepath, err))
+            return False
+        if rootnode is None:
+            return False
+        return rootnode
+
+
+    def savefile(self, filepath=None, enforceext=False, protocol=4, format="vn3",
+                 compress=True, chunksize=vn3cfile.CHUNKSIZE, compression="auto",
+                 level=None):
+        """Save (dump) the tree in a pickle file, in a chunked pickle file
+        that can be loaded lazily (see `vntree.vn3cfile`), in the compact
+        binary «vnb» format (see `vntree.vnbfile`), or in the random-access
+        «vnm» format that can be memory-mapped (see `vntree.vnmfile`).
+
+        With `protocol=5` (or higher), the large binary values of a «vn3»
+        file (NumPy arrays, `bytes`...) are stored out-of-band, and are
+        memory-mapped by `openfile` (see `vntree.buffers`).
+
+        The file is written to a temporary file that replaces `filepath`
+        when it is complete, so a tree loaded from `filepath` (lazily or
+        memory-mapped) can be saved to the same file.
 
         Note: This method saves the complete tree even when invoked on
         a non-root node.
-        Note: It is recommended to use the extension `.vn3` for this type of file.
+        Note: It is recommended to use the extension `.vn3` for this type of file
+        (`.vn3c`, `.vnb` and `.vnm` for the «vn3c», «vnb» and «vnm» formats).
 
         :param filepath: the file path for the pickle file. 
             If `filepath=None` use `self._vntree_fpath` attribute, if set.
         :type filepath: str or None   
-        :param enforceext: if True, enforce filename extension .vn3
+        :param enforceext: if True, enforce filename extension .vn3 (or .vn3c, .vnb, .vnm)
         :type enforceext: bool    
         :param protocol: pickle protocol version number
         :type protocol: int   
+        :param format: file format, "vn3" (pickle), "vn3c" (chunked pickle),
+            "vnb" (binary) or "vnm" (memory-mapped).
+        :type format: str
+        :param compress: if True, compress the blocks of a «vnb» file with
+            zlib, or an int for the zlib compression level.
+        :type compress: bool or int
+        :param chunksize: maximum number of nodes per chunk of a «vn3c» file.
+        :type chunksize: int
+        :param compression: compression of a «vn3» or «vnb» file, "gzip",
+            "bz2", "lzma", `None`, or "auto" to use the file extension
+            (see `vntree.compressed`).
+        :type compression: str or None
+        :param level: compression level, `None` for the default level.
+        :type level: int or None
         :returns: `True` if successful. 
         :rtype: bool
         """
-        froot, fext = os.path.splitext(filepath)
-        if enforceext and fext != ".vn3":
-            filepath = froot + ".vn3"
+        if format not in ("vn3", "vn3c", "vnb", "vnm"):
+            raise ValueError("{}.savefile: argument «format»=«{}» not valid, must be 'vn3', 'vn3c', 'vnb' or 'vnm'.".format(self.__class__.__name__, format))
+        if filepath and enforceext:
+            froot, fext = os.path.splitext(filepath)
+            if fext != "." + format:
+                filepath = froot + "." + format
         if filepath:
             self._vntree_fpath = os.path.abspath(filepath)
+        _compression = compressed.resolve(compression, self._vntree_fpath or "", "w")
+        if _compression and format in ("vn3c", "vnm"):
+            raise ValueError("{}.savefile: a «{}» file is random-access, it cannot be compressed with «{}».".format(self.__class__.__name__, format, _compression))
         # if not _pfpath:
         #     logger.error("%s.save: «%s» file path «%s» not valid." % (self.__class__.__name__, self.name, _pfpath))
         #     return False
+        _journal = self.get_journal()
+        if _journal is not None:
+            _journal.wait()
+        # a new snapshot id, so that a journal of the former file does not apply
+        _root = self._root
+        _snapshot = journal.snapshot_id(_root)
+        if _journal is not None or _snapshot is not None:
+            _root._vntree_snapshot = journal.new_snapshot_id()
+        _tmp = self._vntree_fpath + ".tmp"
         try:
-            with open(self._vntree_fpath, "wb") as pf:
-                pickle.dump(self._root.to_treedict(treemeta=True), pf, protocol=protocol) 
+            # a lazily loaded tree may be read from the file that is overwritten
+            lazy.load_all(self._root)
+            with compressed.open_file(_tmp, "wb", _compression, level) as pf:
+                self._root._dump_snapshot(pf, format, protocol, compress, chunksize)
+            os.replace(_tmp, self._vntree_fpath)
+            if _journal is not None and _journal.filepath == self._vntree_fpath:
+                _journal.reset()
         except Exception as err:
             logger.error("%s.savefile: arg `filepath`=«%s» `self._vntree_fpath`=«%s» error: %s" % (self.__class__.__name__, filepath, self._vntree_fpath, err))
+            if os.path.exists(_tmp):
+                os.remove(_tmp)
+            if _snapshot is not None:
+                _root._vntree_snapshot = _snapshot
+            else:
+                _root.__dict__.pop("_vntree_snapshot", None)
             return False
         return True       
 
 
+    def _dump_snapshot(self, fh, format="vn3", protocol=4, compress=True,
+                       chunksize=vn3cfile.CHUNKSIZE, forked=False):
+        """Write the tree rooted at this node instance to a binary file
+        object, in a `savefile` format.
+
+        :param forked: True in a forked process (see `vntree.journal`),
+            which has only one thread, so the tree lock is not used.
+        :type forked: bool
+        """
+        if forked and self._vn_tstate is not None:
+            self._vn_tstate.lock = None
+        if format == "vnb":
+            _level = compress if compress is not True else 6
+            vnbfile.dump(self, fh, _SNAPSHOT_TRANSIENT, compress=bool(compress), level=_level)
+        elif format == "vnm":
+            vnmfile.dump(self, fh, _SNAPSHOT_TRANSIENT)
+        elif format == "vn3c":
+            vn3cfile.dump(self, fh, _SNAPSHOT_TRANSIENT, chunksize=chunksize, protocol=protocol)
+        else:
+            _treedict = self.to_treedict(treemeta=True)
+            _snapshot = journal.snapshot_id(self)
+            if _snapshot is not None:
+                _treedict["_vntree_snapshot"] = _snapshot
+            if protocol >= 5:
+                buffers.dump(_treedict, fh, protocol=protocol)
+            else:
+                pickle.dump(_treedict, fh, protocol=protocol)
+
+
     @classmethod
-    def openfile(cls, filepath):
-        """Class method that opens (load) a vntree pickle file.
+    def openfile(cls, filepath, mmap=False, zerocopy=False, lazy=False, compression="auto",
+                 replay=True, gcpause=False):
+        """Class method that opens (load) a vntree pickle file, a chunked
+        «vn3c» pickle file, a «vnb» binary file or a «vnm» file (detected
+        from the magic number at the start of the file).
+
+        With `lazy=True`, a lazy root node of a «vn3c» file is returned:
+        only the chunk of the root node is unpickled when it is accessed,
+        and each other chunk when its root node is accessed (see
+        `vntree.vn3cfile`). A modified chunk can be saved with
+        `rewrite_chunk`. For a «vnm» file, `lazy=True` is the same as
+        `mmap=True`.
+
+        With `mmap=True`, a «vnm» file is memory-mapped and a lazy root node
+        is returned immediately: the `data` and `childs` of each node are
+        decoded from the mapped file on first access, and `get_node_by_id`
+        and `get_node_by_path` use the indexes in the file (see `vntree.lazy`).
+        The file must not be modified while the tree is in use.
 
         :param filepath: the file path for the pickle file. 
         :type filepath: str         
+        :param mmap: if True, memory-map a «vnm» file.
+        :type mmap: bool
+        :param zerocopy: if True (with `mmap=True`, or for a «vn3» file saved
+            with `protocol=5`), the large `bytes` values are memoryviews of
+            the mapped file, see `vntree.vnmfile.MappedTree` and `vntree.buffers`.
+        :type zerocopy: bool
+        :param lazy: if True, load a «vn3c» or «vnm» file lazily.
+        :type lazy: bool
+        :param compression: compression of the file, "gzip", "bz2", "lzma",
+            `None`, or "auto" to detect it (see `vntree.compressed`).
+        :type compression: str or None
+        :param replay: if True, replay the changes in the journal of the
+            file, if there is one (see `enable_journal`); a journal is not
+            replayed for a tree that is loaded lazily.
+        :type replay: bool
+        :param gcpause: if True, disable the cyclic garbage collector (of
+            the whole process) while a «vnb» or «vn3c» file is loaded, 
+            which is faster for large trees (see `vntree.vnbfile.load`).
+        :type gcpause: bool
         :returns: root node of tree or `False` if failure. 
         :rtype: Node or bool
         """
@@ -755,27 +2210,204 @@ class Node:
             logger.error("%s.openfile: arg `filepath`=«%s» not valid." % (cls.__name__, filepath))
             return False
         try:
-            with open(filepath, "rb") as pf:
-                pkldata = pickle.load(pf)
-            rootnode = cls(treedict=pkldata)
+            _compression = compressed.resolve(compression, filepath, "r")
+            with compressed.open_file(filepath, "rb", _compression) as pf:
+                _magic = pf.read(len(vnbfile.MAGIC))
+                pf.seek(0)
+                _fastinit = cls.__init__ is Node.__init__
+                if _compression and (mmap or lazy or _magic in (vnmfile.MAGIC, vn3cfile.MAGIC)):
+                    logger.error("%s.openfile: «%s» is compressed with «%s», it cannot be memory-mapped or loaded lazily." % (cls.__name__, filepath, _compression))
+                    return False
+                if mmap and _magic != vnmfile.MAGIC:
+                    logger.error("%s.openfile: «%s» is not a vnm file, cannot memory-map it." % (cls.__name__, filepath))
+                    return False
+                if lazy and _magic not in (vnmfile.MAGIC, vn3cfile.MAGIC):
+                    logger.error("%s.openfile: «%s» is not a vn3c or vnm file, cannot load it lazily." % (cls.__name__, filepath))
+                    return False
+                if mmap or lazy and _magic == vnmfile.MAGIC:
+                    rootnode = vnmfile.MappedTree(filepath, zerocopy=zerocopy).root(cls)
+                elif lazy:
+                    rootnode = vn3cfile.ChunkedTree(filepath, _fastinit).root(cls)
+                elif _magic == vn3cfile.MAGIC:
+                    rootnode = vn3cfile.load(filepath, cls, _fastinit, gcpause=gcpause)
+                elif _magic == vnmfile.MAGIC:
+                    rootnode = vnmfile.load(filepath, cls, fastinit=_fastinit)
+                elif _magic == vnbfile.MAGIC:
+                    rootnode = vnbfile.load(pf, cls, fastinit=_fastinit, gcpause=gcpause)
+                elif _magic == buffers.MAGIC:
+                    _treedict = buffers.load(pf, None if _compression else filepath, zerocopy)
+                    rootnode = cls(treedict=_treedict)
+                else:
+                    rootnode = cls(treedict=pickle.load(pf))
+            if replay and (mmap or lazy):
+                if journal.find_journal(filepath, journal.snapshot_id(rootnode)):
+                    logger.warning("%s.openfile: the journal of «%s» is not replayed for a lazily loaded tree." % (cls.__name__, filepath))
+            elif replay:
+                journal.replay(rootnode, filepath)
             rootnode._vntree_fpath = os.path.abspath(filepath)
         except Exception as err:
             logger.error("%s.openfile: data in file «%s» not valid: %s" % (cls.__name__, filepath, err))
             return False
-        return rootnode            
+        return rootnode
+
+
+    def rewrite_chunk(self, protocol=4):
+        """Save the chunk that contains this node instance in the «vn3c» file
+        of a tree opened with `openfile(..., lazy=True)`, without rewriting
+        the other chunks (see `vntree.vn3cfile`).
+
+        Note: a node that has been moved to another chunk is saved in both
+        chunks, and both chunks must be rewritten.
+
+        :param protocol: pickle protocol version number
+        :type protocol: int
+        :returns: `True` if successful.
+        :rtype: bool
+        """
+        _n = self
+        while _n is not None and not isinstance(_n.__dict__.get("_vn_src", (None,))[0], vn3cfile.ChunkedTree):
+            _n = _n.parent
+        if _n is None:
+            logger.error("%s.rewrite_chunk: node «%s» is not in a tree opened lazily from a vn3c file." % (self.__class__.__name__, self.name))
+            return False
+        _source = _n._vn_src[0]
+        try:
+            _source.rewrite(self, _SNAPSHOT_TRANSIENT, protocol=protocol)
+        except Exception as err:
+            logger.error("%s.rewrite_chunk: file «%s» error: %s" % (self.__class__.__name__, _source.filepath, err))
+            return False
+        return True
+
+
+    def enable_journal(self, filepath=None, threshold=None, background=False, fsync=False,
+                       format="vn3", protocol=4):
+        """Enable the journal persistence of the tree containing this node
+        instance: the changes made with `add_child`, `remove_child`,
+        `set_data` and `NodeAttr` attributes (e.g. renames) are appended to
+        a journal file next to the snapshot file `filepath`, and the
+        snapshot and journal are loaded by `openfile` (see `vntree.journal`).
+
+        The journal should be enabled just after the tree is loaded with
+        `openfile` or saved with `savefile`; if the tree was not loaded from
+        or saved to `filepath`, a new snapshot is saved first. Changes made
+        directly to the `data` dict are not recorded.
+
+        |  rootnode = Node.openfile("tree.vn3")
+        |  rootnode.enable_journal(threshold=100*2**20, background=True)
+        |  rootnode.childs[0].set_data("status", value="done")  # appended to tree.vn3.journal
+
+        :param filepath: the snapshot file path, `None` to use the
+            `_vntree_fpath` attribute.
+        :type filepath: str or None
+        :param threshold: journal size in bytes that triggers `compact`,
+            `None` for no automatic compaction.
+        :type threshold: int or None
+        :param background: if True, the automatic compactions are run in
+            the background.
+        :type background: bool
+        :param fsync: if True, `os.fsync` the journal after each change.
+        :type fsync: bool
+        :param format: the `savefile` format of the snapshots.
+        :type format: str
+        :param protocol: pickle protocol version number
+        :type protocol: int
+        :returns: the journal, or `False` if not successful.
+        :rtype: vntree.journal.Journal or bool
+        """
+        _root = self._root
+        if self.get_journal():
+            logger.error("%s.enable_journal: the journal is already enabled." % (self.__class__.__name__,))
+            return False
+        filepath = os.path.abspath(filepath or _root._vntree_fpath or "")
+        if not filepath or os.path.isdir(filepath):
+            logger.error("%s.enable_journal: arg `filepath`=«%s» not valid." % (self.__class__.__name__, filepath))
+            return False
+        if format not in ("vn3", "vn3c", "vnb", "vnm"):
+            raise ValueError("{}.enable_journal: argument «format»=«{}» not valid, must be 'vn3', 'vn3c', 'vnb' or 'vnm'.".format(self.__class__.__name__, format))
+        # the snapshots replace the file that a lazily loaded tree is read from
+        lazy.load_all(_root)
+        if not os.path.isfile(filepath) or _root._vntree_fpath != filepath or journal.snapshot_id(_root) is None:
+            _root._vntree_snapshot = journal.new_snapshot_id()
+            if not _root.savefile(filepath, format=format, protocol=protocol):
+                return False
+        _dump = lambda fh, forked: _root._dump_snapshot(fh, format, protocol, forked=forked)
+        try:
+            _journal = journal.Journal(_root, filepath, _dump, _TRANSIENT_ATTRS, _MISSING,
+                                       threshold=threshold, background=background, fsync=fsync)
+        except Exception as err:
+            logger.error("%s.enable_journal: journal of «%s» error: %s" % (self.__class__.__name__, filepath, err))
+            return False
+        return _root.add_maintainer(_journal)
+
+
+    def get_journal(self):
+        """Return the journal of the tree containing this node instance
+        (see `enable_journal`), or `None`."""
+        _state = self._vn_tstate
+        if _state is not None:
+            for _maintainer in _state.maintainers:
+                if isinstance(_maintainer, journal.Journal):
+                    return _maintainer
+        return None
+
+
+    def disable_journal(self, compact=False):
+        """Disable the journal persistence enabled with `enable_journal`.
+
+        :param compact: if True, fold the journal into the snapshot first.
+        :type compact: bool
+        :returns: `True` if successful.
+        :rtype: bool
+        """
+        _journal = self.get_journal()
+        if _journal is None:
+            return False
+        self.remove_maintainer(_journal)
+        _journal.wait()
+        if compact:
+            _journal.compact()
+        _journal.close()
+        return True
+
+
+    def compact(self, background=False):
+        """Fold the journal of the tree into a new snapshot, which replaces
+        the snapshot file atomically (see `enable_journal`).
+
+        :param background: if True, write the snapshot in a forked process
+            (if `os.fork` is available) while the tree can still be changed,
+            see `vntree.journal.Journal.wait`.
+        :type background: bool
+        :returns: `True` if successful.
+        :rtype: bool
+        """
+        _journal = self.get_journal()
+        if _journal is None:
+            logger.error("%s.compact: the journal is not enabled." % (self.__class__.__name__,))
+            return False
+        try:
+            return _journal.compact(background=background)
+        except Exception as err:
+            logger.error("%s.compact: snapshot «%s» error: %s" % (self.__class__.__name__, _journal.filepath, err))
+            return False
 
 
     @classmethod
     def setup_yaml(cls):
+        """Register the constructor of the YAML tag `!<class name>` with the
+        safe loaders, for `yaml.safe_load` (`yaml2tree` does not need it)."""
         def yamlnode_constructor(loader, yamlnode) :
             fields = loader.construct_mapping(yamlnode, deep=True)
             return  cls(**fields)
         yaml.SafeLoader.add_constructor('!'+cls.__name__, yamlnode_constructor)
+        if hasattr(yaml, "CSafeLoader"):
+            yaml.CSafeLoader.add_constructor('!'+cls.__name__, yamlnode_constructor)
        
 
     @classmethod
-    def yaml2tree(cls, yamltree):
-        """Class method that creates a tree from YAML.
+    def yaml2tree(cls, yamltree, compression="auto", gcpause=False):
+        """Class method that creates a tree from YAML, in the "list" layout
+        (a list of nodes, with aliases to the parent nodes):
 
         | # Example yamltree data:
         | - !Node &root
@@ -790,66 +2422,74 @@ class Node:
         |   name: "grand-child node"
         |   parent: *child1
 
+        or in the "nested" layout (the treedict of the tree, see `from_treedict`):
+
+        | name: "root node"
+        | data:
+        |   testpara: 111
+        | childs:
+        | - name: "child node"
+        |   childs:
+        |   - name: "grand-child node"
+
+        The YAML is parsed as a stream of events (with `yaml.CSafeLoader`
+        if PyYAML is built with libyaml), and the nodes are built as they
+        are read, see `vntree.yamlstream`.
+
         :param yamltree: a string of YAML describing the nodes in the
             tree, or the path to a file containing the data.
         :type yamltree: str
+        :param compression: compression of the file, "gzip", "bz2", "lzma",
+            `None`, or "auto" to detect it (see `vntree.compressed`).
+        :type compression: str or None
+        :param gcpause: if True, disable the cyclic garbage collector (of 
+            the whole process) while loading, see `openfile`.
+        :type gcpause: bool
         :returns: the root node of the tree. 
         :rtype: Node 
         """
-        if not cls.YAML_setup:
-            cls.setup_yaml()
-            cls.YAML_setup = True 
+        _fastinit = cls.__init__ is Node.__init__
         if os.path.isfile(yamltree):
-            with open(yamltree) as fh:
-                yaml_data = fh.read()
-        else:
-            yaml_data = yamltree
-        list_of_nodes = yaml.safe_load(yaml_data)
-        yamltree_root = list_of_nodes[0]
-        return yamltree_root
+            with compressed.open_file(yamltree, "r", compression) as fh:
+                return yamlstream.load_tree(fh, cls, _fastinit, _TRANSIENT_ATTRS, gcpause)
+        return yamlstream.load_tree(yamltree, cls, _fastinit, _TRANSIENT_ATTRS, gcpause)
+
 
+    @_read_locked
+    def tree2yaml(self, fpath=None, treemeta=False, compression="auto", level=None, 
+                  layout="list"):
+        """Create YAML format representation of the tree, see `yaml2tree`.
+        The nodes are written one at a time with `yaml.CSafeDumper` (if
+        available), see `vntree.yamlstream`.
 
-    def tree2yaml(self, fpath=None, treemeta=False):
-        """Create YAML format representation of the tree.
+        Note: in the "list" layout, only the node `name` and `data` are written.
 
         :param fpath: an optional filepath for saving the YAML.
         :type fpath: str or None
         :param treemeta: if True, retain node metadata _vntree.
         :type treemeta: bool
+        :param compression: compression of the file, "gzip", "bz2", "lzma",
+            `None`, or "auto" to use the file extension (see `vntree.compressed`).
+        :type compression: str or None
+        :param level: compression level, `None` for the default level.
+        :type level: int or None
+        :param layout: "list" for a list of nodes with aliases to the parent
+            nodes, or "nested" for the treedict of the tree (see `to_treedict`).
+        :type layout: str
         :returns: YAML representation of the tree (fpath=None),
             or the absolute filepath if `fpath` is specified. 
         :rtype: str 
         """
-        def make_anchor(node):
-            anchor = "coord"
-            for _c in node._coord:
-                anchor += "-" + str(_c)
-            return anchor
-        yltree = "# «vntree» YAML format, see https://github.com/qwilka/vntree\n"
-        for _n in self:
-            _ncopy = _n.copy()
-            delattr(_ncopy, "childs")
-            delattr(_ncopy, "parent")
-            if not treemeta and "_vntree" in _ncopy.data:
-                del _ncopy.data["_vntree"]
-            _yl = yaml.dump(_ncopy, default_flow_style=False)
-            _n_yl = '!'+_n.__class__.__name__  + " &" + make_anchor(_n)
-            if _n.parent:
-                _n_yl += "\nparent: " + "*" + make_anchor(_n.parent)
-            _n_yl += _yl[_yl.index("\n"):]
-            yltree += _n_yl
-        yltree = textwrap.indent(yltree, "  ")
-        yltree = yltree.strip()
-        yltree = yltree.replace("\n  !", "\n- !")
-        retVal = yltree
+        if layout not in yamlstream.LAYOUTS:
+            raise ValueError("{}.tree2yaml: argument «layout»=«{}» not valid, must be 'list' or 'nested'.".format(self.__class__.__name__, layout))
         if fpath:
             _abspath = os.path.abspath(fpath) 
-            # _dir, _fname = os.path.split(_abspath)
-            # if os.path.isdir(_dir):
-            with open(_abspath, 'w') as fh:
-                fh.write(yltree)
-            retVal = _abspath
-        return retVal
+            with compressed.open_file(_abspath, 'w', compression, level) as fh:
+                yamlstream.dump(self, fh, treemeta, layout, _TRANSIENT_ATTRS)
+            return _abspath
+        _buf = io.StringIO()
+        yamlstream.dump(self, _buf, treemeta, layout, _TRANSIENT_ATTRS)
+        return _buf.getvalue()
 
 
     @classmethod
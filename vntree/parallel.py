@@ -0,0 +1,186 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Process-pool parallel operations on «vntree» trees.
+
+Only node `data` (not `Node` instances with their parent links) is
+shipped to the worker processes, so functions passed to these
+operations must be picklable (e.g. defined at module level).
+
+References
+https://docs.python.org/3/library/concurrent.futures.html#processpoolexecutor
+"""
+import concurrent.futures
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def _node_childs(node):
+    return [_c for _c in node.childs if _c is not None]
+
+
+def subtree_sizes(node):
+    """Calculate the number of nodes in each sub-tree of `node`.
+
+    :param node: root of the (sub-)tree.
+    :type node: Node
+    :returns: dict mapping `id(node)` to the size of its sub-tree.
+    :rtype: dict
+    """
+    _sizes = {}
+    _stack = [(node, False)]
+    while _stack:
+        _n, _visited = _stack.pop()
+        if _visited:
+            _sizes[id(_n)] = 1 + sum(_sizes[id(_c)] for _c in _node_childs(_n))
+        else:
+            _stack.append((_n, True))
+            _stack.extend((_c, False) for _c in _node_childs(_n))
+    return _sizes
+
+
+def partition_subtrees(node, nchunks, sizes=None):
+    """Partition the (sub-)tree rooted at `node` into independent sub-trees
+    of roughly equal size.
+
+    Sub-trees larger than `1/nchunks` of the tree are cut, the cut nodes
+    form the "top" of the tree. The remaining sub-trees are distributed
+    over `nchunks` bins (largest first, into the least loaded bin).
+    The partition is deterministic.
+
+    :param node: root of the (sub-)tree.
+    :type node: Node
+    :param nchunks: the number of bins.
+    :type nchunks: int
+    :param sizes: sub-tree sizes from `subtree_sizes`, calculated if `None`.
+    :type sizes: dict or None
+    :returns: `(top, bins)`, the list of top nodes in pre-order,
+        and a list of `nchunks` lists of sub-tree root nodes in pre-order.
+    :rtype: tuple
+    """
+    if sizes is None:
+        sizes = subtree_sizes(node)
+    nchunks = max(int(nchunks), 1)
+    _target = max(sizes[id(node)] // nchunks, 1)
+    _top = []
+    _subtrees = []
+    _stack = [node]
+    while _stack:
+        _n = _stack.pop()
+        if sizes[id(_n)] > _target and _n.childs:
+            _top.append(_n)
+            _stack.extend(reversed(_node_childs(_n)))
+        else:
+            _subtrees.append(_n)
+    _order = sorted(range(len(_subtrees)), key=lambda ii: -sizes[id(_subtrees[ii])])
+    _bins = [[] for ii in range(nchunks)]
+    _loads = [0] * nchunks
+    for ii in _order:
+        _jj = _loads.index(min(_loads))
+        _bins[_jj].append(ii)
+        _loads[_jj] += sizes[id(_subtrees[ii])]
+    _bins = [[_subtrees[ii] for ii in sorted(_bin)] for _bin in _bins]
+    return _top, _bins
+
+
+def _map_chunk(func, datas):
+    return [func(_data) for _data in datas]
+
+
+def _chunk_nodes(node, processes, chunk):
+    """Split the nodes of the (sub-)tree into lists of nodes for the workers."""
+    if chunk == "subtree":
+        _top, _bins = partition_subtrees(node, processes)
+        _chunks = [[_n for _sub in _bin for _n in _sub] for _bin in _bins]
+        _smallest = min(range(len(_chunks)), key=lambda ii: len(_chunks[ii]))
+        _chunks[_smallest] = _top + _chunks[_smallest]
+    elif chunk == "nodes":
+        _nodes = list(node)
+        _size = max(len(_nodes) // (processes * 4), 1)
+        _chunks = [_nodes[ii:ii+_size] for ii in range(0, len(_nodes), _size)]
+    else:
+        raise ValueError("parallel_map: argument «chunk»=«{}» not valid, must be 'subtree' or 'nodes'.".format(chunk))
+    return [_c for _c in _chunks if _c]
+
+
+def parallel_map(node, func, processes=None, chunk="subtree", key=None):
+    """Apply `func` to the `data` of each node in the (sub-)tree, in
+    parallel worker processes. See `Node.parallel_map`.
+    """
+    if processes is None:
+        processes = os.cpu_count() or 1
+    _chunks = _chunk_nodes(node, processes, chunk)
+    if processes <= 1:
+        _results = [_map_chunk(func, [_n.data for _n in _chunk]) for _chunk in _chunks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as _executor:
+            _futures = [_executor.submit(_map_chunk, func, [_n.data for _n in _chunk])
+                        for _chunk in _chunks]
+            _results = [_f.result() for _f in _futures]
+    _byid = {}
+    for _chunk, _chunkresults in zip(_chunks, _results):
+        for _n, _res in zip(_chunk, _chunkresults):
+            _byid[id(_n)] = _res
+    if key is not None:
+        _keys = (key,) if isinstance(key, str) else tuple(key)
+        with node.batch():
+            for _chunk, _chunkresults in zip(_chunks, _results):
+                for _n, _res in zip(_chunk, _chunkresults):
+                    _n.set_data(*_keys, value=_res)
+    return [_byid.get(id(_n)) for _n in node]
+
+
+def _flatten_subtree(node):
+    """Pre-order list of `(data, number of children)` for a sub-tree."""
+    _flat = []
+    _stack = [node]
+    while _stack:
+        _n = _stack.pop()
+        _childs = _node_childs(_n)
+        _flat.append((_n.data, len(_childs)))
+        _stack.extend(reversed(_childs))
+    return _flat
+
+
+def _fold_flat(flat, leaf_fn, combine_fn):
+    """Fold a flattened sub-tree bottom-up, without recursion."""
+    _values = []
+    for _data, _nchilds in reversed(flat):
+        _childvals = [_values.pop() for ii in range(_nchilds)]
+        _values.append(combine_fn(leaf_fn(_data), _childvals))
+    return _values[0]
+
+
+def _fold_chunk(flats, leaf_fn, combine_fn):
+    return [_fold_flat(_flat, leaf_fn, combine_fn) for _flat in flats]
+
+
+def parallel_fold(node, leaf_fn, combine_fn, workers=None):
+    """Fold the (sub-)tree bottom-up using parallel worker processes. 
+    See `Node.parallel_fold`.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    _top, _bins = partition_subtrees(node, workers)
+    _bins = [_bin for _bin in _bins if _bin]
+    _payloads = [[_flatten_subtree(_sub) for _sub in _bin] for _bin in _bins]
+    if workers <= 1:
+        _results = [_fold_chunk(_flats, leaf_fn, combine_fn) for _flats in _payloads]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as _executor:
+            _futures = [_executor.submit(_fold_chunk, _flats, leaf_fn, combine_fn)
+                        for _flats in _payloads]
+            _results = [_f.result() for _f in _futures]
+    _values = {}
+    for _bin, _binresults in zip(_bins, _results):
+        for _sub, _value in zip(_bin, _binresults):
+            _values[id(_sub)] = _value
+    # combine the partial results up the top of the tree
+    for _n in reversed(_top):
+        _childvals = [_values[id(_c)] for _c in _node_childs(_n)]
+        _values[id(_n)] = combine_fn(leaf_fn(_n.data), _childvals)
+    return _values[id(node)]
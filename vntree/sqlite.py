@@ -7,6 +7,7 @@ https://github.com/qwilka/vntree/blob/master/LICENSE
 References:
 https://github.com/RaRe-Technologies/sqlitedict 
 """
+import asyncio
 import copy
 #from datetime import datetime, timezone
 #import hashlib
@@ -78,16 +79,7 @@ class SqliteNode(Node):
             `value` is a keyword-only argument.
         :returns: `True` if successful. 
         """
-        _datadict = self.data
-        for ii, _key in enumerate(keys):
-            if ii==len(keys)-1:
-                _datadict[_key] = value
-            else:
-                # if _key not in _datadict:
-                #     _datadict[_key] = {}
-                # _datadict = _datadict[_key]
-                _datadict = _datadict.setdefault(_key, {})
-        return True
+        return super().set_data(*keys, value=value)
 
 
 
@@ -106,6 +98,17 @@ class SqliteNode(Node):
             self.data.update(_data)
 
 
+    async def aload(self):
+        """Coroutine loading the node data from the sqlite file, see `load_data`.
+
+        The blocking `SqliteDict` access runs in the event loop's default 
+        executor, so that the event loop is not stalled.
+        """
+        _loop = asyncio.get_running_loop()
+        await _loop.run_in_executor(None, self.load_data)
+        return self
+
+
     def from_skdict(self, treedict):
         if "data" in treedict:
             #self.data = collections.defaultdict(dict, treedict["data"])
@@ -1,2 +1,3 @@
 from .log_messages import turn_on_logging
 from .helpers import get_numeric
+from .rwlock import RWLock
@@ -0,0 +1,84 @@
+"""
+Reader-writer lock used by the «vntree» concurrency mode.
+
+References
+https://en.wikipedia.org/wiki/Readers%E2%80%93writer_lock
+https://docs.python.org/3/library/threading.html#condition-objects
+"""
+import contextlib
+import threading
+
+
+class RWLock:
+    """A re-entrant, writer-preferring reader-writer lock.
+
+    Any number of threads can hold the read lock, or one thread can hold
+    the write lock. A thread holding the write lock can also acquire the
+    read lock, but a read lock cannot be upgraded to a write lock.
+    """
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = {}  # thread ident -> read lock count
+        self._writer = None
+        self._writes = 0
+        self._waiting_writers = 0
+
+    def acquire_read(self):
+        _me = threading.get_ident()
+        with self._cond:
+            if self._writer == _me or _me in self._readers:
+                self._readers[_me] = self._readers.get(_me, 0) + 1
+                return
+            while self._writer is not None or self._waiting_writers:
+                self._cond.wait()
+            self._readers[_me] = 1
+
+    def release_read(self):
+        _me = threading.get_ident()
+        with self._cond:
+            _count = self._readers[_me] - 1
+            if _count:
+                self._readers[_me] = _count
+            else:
+                del self._readers[_me]
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        _me = threading.get_ident()
+        with self._cond:
+            if self._writer == _me:
+                self._writes += 1
+                return
+            if _me in self._readers:
+                raise RuntimeError("RWLock.acquire_write: cannot upgrade a read lock to a write lock.")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = _me
+            self._writes = 1
+
+    def release_write(self):
+        with self._cond:
+            self._writes -= 1
+            if not self._writes:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextlib.contextmanager
+    def read_locked(self):
+        self.acquire_read()
+        try:
+            yield self
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write_locked(self):
+        self.acquire_write()
+        try:
+            yield self
+        finally:
+            self.release_write()
@@ -0,0 +1,299 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Chunked pickle «vntree» file format (`.vn3c`), see `Node.savefile` and
+`Node.openfile(..., lazy=True)`.
+
+File layout:
+    header: b"VN3C" | directory offset | directory size (2 x uint64)
+    frames: pickles of lists of chunks
+    directory: pickle of the list of `(frame offset, frame size, position
+        in the frame, name of the chunk root node)` of each chunk
+
+The tree is partitioned into chunks (sub-trees) of at most `chunksize`
+nodes, and each chunk is stored as the `treedict` of the «vn3» format
+(see `Node.to_treedict`), except that the child sub-trees that are other
+chunks are replaced by a stub `{"_vn3c": chunk number}`. Chunk 0 holds
+the root node. The chunks are chosen bottom-up: when the nodes of a
+sub-tree that are not already in other chunks are more than `chunksize`,
+its largest child sub-trees are made chunks. The chunks with the same
+parent node are stored in frames of up to `chunksize` nodes, so that
+small chunks do not have a frame each.
+
+A chunk that has been modified is rewritten by appending a new frame and
+a new directory to the file, and then updating the directory offset in
+the header (see `ChunkedTree.rewrite`); the old frame is left unused in
+the file until the complete tree is saved again.
+
+References
+https://doi.org/10.1145/359863.359869 (Kundu & Misra, a linear tree
+partitioning algorithm)
+"""
+import gc
+import logging
+import os
+import pickle
+import struct
+
+from . import lazy
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VN3C"
+CHUNKSIZE = 1000  # maximum number of nodes per chunk
+
+_HEADER = struct.Struct("<4sQQ")
+_STUB = "_vn3c"
+
+
+def _partition(rootnode, chunksize):
+    """Return the pre-order list of the nodes, the set of the `id()` of the
+    nodes that are the roots of chunks (except `rootnode`), and the number
+    of nodes of each sub-tree that are not in the chunks below it."""
+    _nodes = []
+    _stack = [rootnode]
+    while _stack:
+        _node = _stack.pop()
+        _nodes.append(_node)
+        _stack.extend(_c for _c in reversed(_node.childs) if _c is not None)
+    _residual = {}  # id(node): number of nodes not in the chunks below
+    _cuts = set()
+    for _node in reversed(_nodes):
+        _childs = [_c for _c in _node.childs if _c is not None]
+        _total = 1 + sum(_residual[id(_c)] for _c in _childs)
+        if _total > chunksize:
+            for _c in sorted(_childs, key=lambda c: _residual[id(c)], reverse=True):
+                _cuts.add(id(_c))
+                _total -= _residual[id(_c)]
+                if _total <= chunksize:
+                    break
+        _residual[id(_node)] = _total
+    return _nodes, _cuts, _residual
+
+
+def chunk_treedict(node, transient, is_stub):
+    """Return the `treedict` of the chunk rooted at `node`, with a stub for
+    each child node for which `is_stub(child)` returns a chunk number.
+
+    The `treedict` refers to the node `data`, it is meant to be pickled
+    at once.
+    """
+    def _nodedict(_node):
+        _dct = {"data": _node.data}
+        _dct.update((k, v) for k, v in vars(_node).items() if k != "data" and k not in transient)
+        _dct["childs"] = []
+        return _dct
+    _treedict = _nodedict(node)
+    _stack = [(node, _treedict)]
+    while _stack:
+        _node, _dct = _stack.pop()
+        for _child in _node.childs:
+            if _child is None:
+                continue
+            _chunk = is_stub(_child)
+            if _chunk is not None:
+                _dct["childs"].append({_STUB: _chunk})
+            else:
+                _cdct = _nodedict(_child)
+                _dct["childs"].append(_cdct)
+                _stack.append((_child, _cdct))
+    return _treedict
+
+
+def _write_header(fh, diroffset, dirsize):
+    fh.seek(0)
+    fh.write(_HEADER.pack(MAGIC, diroffset, dirsize))
+
+
+def _read_header(fh):
+    _magic, _diroffset, _dirsize = _HEADER.unpack(fh.read(_HEADER.size))
+    if _magic != MAGIC:
+        raise ValueError("vn3cfile: not a vn3c file, magic number {!r}.".format(_magic))
+    fh.seek(_diroffset)
+    return pickle.loads(fh.read(_dirsize))
+
+
+def dump(rootnode, fh, transient, chunksize=CHUNKSIZE, protocol=4):
+    """Write the (sub-)tree rooted at `rootnode` to a binary file object
+    (opened for writing and reading, the header is written last).
+
+    :param transient: names of the node attributes that are not saved.
+    :type transient: tuple
+    :param chunksize: maximum number of nodes per chunk.
+    :type chunksize: int
+    :param protocol: pickle protocol.
+    :type protocol: int
+    """
+    if chunksize < 1:
+        raise ValueError("vn3cfile: chunksize={} not valid, must be at least 1.".format(chunksize))
+    _nodes, _cuts, _residual = _partition(rootnode, chunksize)
+    _chunkroots = [rootnode] + [_n for _n in _nodes if id(_n) in _cuts]
+    _chunkids = {id(_n): ii for ii, _n in enumerate(_chunkroots)}
+    _stubs = lambda _c: _chunkids.get(id(_c))
+    # the chunks of the same parent node are grouped in frames
+    _frames = [[rootnode]]
+    for _node in _nodes:
+        _frame, _size = None, 0
+        for _c in _node.childs:
+            if _c is None or id(_c) not in _cuts:
+                continue
+            if _frame is None or _size + _residual[id(_c)] > chunksize:
+                _frame, _size = [], 0
+                _frames.append(_frame)
+            _frame.append(_c)
+            _size += _residual[id(_c)]
+    _directory = [None] * len(_chunkroots)
+    fh.write(b"\x00" * _HEADER.size)
+    _pos = _HEADER.size
+    for _frame in _frames:
+        _pickled = pickle.dumps([chunk_treedict(_n, transient, _stubs) for _n in _frame], protocol=protocol)
+        fh.write(_pickled)
+        for ii, _n in enumerate(_frame):
+            _directory[_chunkids[id(_n)]] = (_pos, len(_pickled), ii, _n.name)
+        _pos += len(_pickled)
+    _pickled = pickle.dumps(_directory, protocol=protocol)
+    fh.write(_pickled)
+    _write_header(fh, _pos, len(_pickled))
+
+
+class ChunkedTree:
+    """A `.vn3c` file, the source of the lazy nodes of the chunk roots
+    (see `vntree.lazy`); a chunk is unpickled on the first access to the
+    `data` or `childs` of its root node.
+
+    :param filepath: the file path.
+    :type filepath: str
+    :param fastinit: if True, the nodes are created without calling
+        `cls.__init__` (only for classes that do not extend `Node.__init__`).
+    :type fastinit: bool
+    """
+    def __init__(self, filepath, fastinit=False):
+        self.filepath = filepath
+        self.fastinit = fastinit
+        with open(filepath, "rb") as fh:
+            self.directory = _read_header(fh)
+        self.frames = {}  # frame offset: [chunks not yet loaded, count]
+        self.cls = None
+
+    def chunk(self, key):
+        """Return the `treedict` of chunk `key`, read from its frame (each
+        chunk is only returned once)."""
+        _offset, _size, _pos = self.directory[key][:3]
+        _frame = self.frames.get(_offset)
+        if _frame is None:
+            with open(self.filepath, "rb") as fh:
+                fh.seek(_offset)
+                _frame = self.frames[_offset] = [pickle.loads(fh.read(_size)), 0]
+        _treedict = _frame[0][_pos]
+        _frame[0][_pos] = None
+        _frame[1] += 1
+        if _frame[1] == len(_frame[0]):
+            del self.frames[_offset]
+        return _treedict
+
+    def build(self, treedict, node, resolve=False):
+        """Set the `data`, attributes and `childs` of `node` from a chunk
+        `treedict`, without recursion. The stubs are replaced by new lazy
+        nodes, or by the loaded chunks if `resolve=True`."""
+        cls = self.cls._vn_base if self.cls else type(node)
+        _stack = [(treedict, node)]
+        while _stack:
+            _dct, _node = _stack.pop()
+            _node.data = _dct["data"]
+            for key, val in _dct.items():
+                if key != "data" and key != "childs":
+                    setattr(_node, key, val)
+            _node.childs = []
+            for _cdct in _dct["childs"]:
+                _key = _cdct.get(_STUB)
+                if _key is not None and not resolve:
+                    _node.childs.append(lazy.new_node(self.cls, self, _key, _node))
+                    continue
+                if _key is not None:
+                    _cdct = self.chunk(_key)
+                if self.fastinit:
+                    _child = cls.__new__(cls)
+                    _child.parent = _node
+                    _node.childs.append(_child)
+                else:
+                    _child = cls()
+                    _node.add_child(_child)
+                _stack.append((_cdct, _child))
+
+    def rewrite(self, node, transient, protocol=4):
+        """Rewrite the chunk that contains `node` (see the module docstring).
+
+        Note: a node moved to another chunk is saved with both chunks, and
+        both must be rewritten.
+
+        :param transient: names of the node attributes that are not saved.
+        :type transient: tuple
+        :returns: the chunk number.
+        :rtype: int
+        """
+        _root = node
+        while not (isinstance(_root, lazy.LazyNodeMixin) and
+                   _root.__dict__.get("_vn_src", (None,))[0] is self):
+            _root = _root.parent
+            if _root is None:
+                raise ValueError("vn3cfile: node «{}» is not in the tree of «{}».".format(node.name, self.filepath))
+        _key = _root._vn_src[1]
+        if "data" not in _root.__dict__:
+            return _key  # not loaded, so unchanged
+        def _stubs(_c):
+            _src = _c.__dict__.get("_vn_src")
+            return _src[1] if _src is not None and _src[0] is self else None
+        _pickled = pickle.dumps([chunk_treedict(_root, transient, _stubs)], protocol=protocol)
+        with open(self.filepath, "r+b") as fh:
+            _directory = _read_header(fh)
+            _offset = fh.seek(0, os.SEEK_END)
+            fh.write(_pickled)
+            _directory[_key] = (_offset, len(_pickled), 0, _root.name)
+            _dirpickled = pickle.dumps(_directory, protocol=protocol)
+            fh.write(_dirpickled)
+            fh.flush()
+            os.fsync(fh.fileno())
+            _write_header(fh, _offset + len(_pickled), len(_dirpickled))
+        self.directory = _directory
+        return _key
+
+    # lazy node source interface
+
+    def root(self, cls):
+        """Return the lazy root node, of the lazy class of `cls`."""
+        self.cls = lazy.lazy_class(cls)
+        return lazy.new_node(self.cls, self, 0)
+
+    def load(self, node, key, attr):
+        self.build(self.chunk(key), node)
+
+    def name(self, key):
+        return self.directory[key][3]
+
+
+def load(filepath, cls, fastinit=False, gcpause=False):
+    """Load a complete tree from a `.vn3c` file.
+
+    :param cls: the node class.
+    :param fastinit: if True, the nodes are created without calling
+        `cls.__init__` (only for classes that do not extend `Node.__init__`).
+    :type fastinit: bool
+    :param gcpause: if True, the cyclic garbage collector is disabled
+        (for the whole process) while loading (see `vntree.vnbfile.load`).
+    :type gcpause: bool
+    :returns: the root node.
+    """
+    _src = ChunkedTree(filepath, fastinit)
+    rootnode = cls.__new__(cls) if fastinit else cls()
+    rootnode.parent = None
+    _gcenabled = gcpause and gc.isenabled()
+    if _gcenabled:
+        gc.disable()
+    try:
+        _src.build(_src.chunk(0), rootnode, resolve=True)
+    finally:
+        if _gcenabled:
+            gc.enable()
+    return rootnode
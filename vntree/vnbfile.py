@@ -0,0 +1,392 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Compact binary «vntree» file format (`.vnb`), see `Node.savefile`.
+
+File layout:
+    b"VNB1" | flags (1 byte, bit 0: zlib compressed blocks) | blocks... | end block
+
+Each block holds up to `BLOCKSIZE` nodes in pre-order, and is
+`varint stored size | varint raw size | body` (the end block has size 0).
+The block body (zlib compressed if flagged) is:
+    varint number of new strings | varint size | string lengths (varints)
+        | varint size | the new strings (UTF-8)
+    varint number of nodes
+    4 columns of the node structure, each one `varint size | bytes`:
+        numbers of children (varints)
+        names (varints)
+        _id kinds (1 byte per node)
+        UUIDs (16 bytes per node with a UUID `_id`)
+    node values (pickle)
+
+The string table interns the node names: the names first used in a block
+are appended to the table at the start of the block, so the table is
+built up as the file is streamed. A name is stored as 0 if it is the
+next new string of the table, 1 if it is in the node values, or else its
+index in the table + 2. An `_id` that is a canonical UUID string is
+stored in 16 bytes. Columns of varints that are all less than 128 (the
+usual case) are decoded in one step.
+
+The node values are a pickle of the list of the node `data` dicts
+(without the `_vntree` name and `_id`) of the block, and of the names,
+`_id`s and other node attributes that are not stored in the structure
+columns. The dict keys are written once per block and referenced by the
+pickle memo, and the values keep their types.
+
+References
+https://developers.google.com/protocol-buffers/docs/encoding#varints
+https://docs.python.org/3/library/pickle.html#data-stream-format
+"""
+import gc
+import itertools
+import logging
+import pickle
+import re
+import zlib
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VNB1"
+BLOCKSIZE = 4096  # nodes per block
+
+_FLAG_ZLIB = 1
+_ID_OTHER, _ID_UUID = 0, 1
+_NAME_NEW, _NAME_OTHER = 0, 1
+
+MISSING = object()  # a node without a name
+
+_UUID = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\Z")
+
+
+def _put_varint(buf, value):
+    while value > 0x7f:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def _get_varint(buf, pos):
+    """Decode a varint, returns `(value, new position)`."""
+    _value = 0
+    _shift = 0
+    while True:
+        _b = buf[pos]
+        pos += 1
+        _value |= (_b & 0x7f) << _shift
+        if _b < 0x80:
+            return _value, pos
+        _shift += 7
+
+
+def _get_varints(buf, count):
+    """Decode a column of `count` varints."""
+    if not buf or max(buf) < 0x80:
+        return list(buf)
+    _values = []
+    pos = 0
+    for ii in range(count):
+        _value, pos = _get_varint(buf, pos)
+        _values.append(_value)
+    return _values
+
+
+def _read_varint(fh):
+    _value = 0
+    _shift = 0
+    while True:
+        _b = fh.read(1)
+        if not _b:
+            raise ValueError("vnbfile: unexpected end of file.")
+        _value |= (_b[0] & 0x7f) << _shift
+        if _b[0] < 0x80:
+            return _value
+        _shift += 7
+
+
+class VNBWriter:
+    """Streaming writer of the `.vnb` format; the node records are written
+    in pre-order with `write_node`, and buffered in blocks.
+
+    :param fh: binary file object.
+    :param compress: if True, compress the blocks with zlib.
+    :type compress: bool
+    :param level: zlib compression level.
+    :type level: int
+    :param blocksize: number of nodes per block.
+    :type blocksize: int
+    :param protocol: pickle protocol of the node values.
+    :type protocol: int
+    """
+    def __init__(self, fh, compress=False, level=6, blocksize=BLOCKSIZE, protocol=4):
+        self.fh = fh
+        self.compress = compress
+        self.level = level
+        self.blocksize = blocksize
+        self.protocol = protocol
+        self.strings = {}
+        self._reset()
+        fh.write(MAGIC + bytes([_FLAG_ZLIB if compress else 0]))
+
+    def _reset(self):
+        self.newstrings = []
+        self.nchilds = bytearray()
+        self.names = bytearray()
+        self.idkinds = bytearray()
+        self.uuids = bytearray()
+        self.datas = []
+        self.extras = {}
+
+    def write_node(self, nchilds, _id, name, data, attrs=None):
+        """Write a node record.
+
+        :param nchilds: number of children of the node.
+        :type nchilds: int
+        :param _id: the node `_id`.
+        :param name: the node name, or `MISSING`.
+        :param data: the node `data`, without the `_vntree` name and `_id`.
+        :type data: dict
+        :param attrs: other node attributes.
+        :type attrs: dict or None
+        """
+        _extra = {}
+        _put_varint(self.nchilds, nchilds)
+        if type(name) is str:
+            _idx = self.strings.get(name)
+            if _idx is None:
+                self.strings[name] = len(self.strings)
+                self.newstrings.append(name)
+                self.names.append(_NAME_NEW)
+            else:
+                _put_varint(self.names, _idx + 2)
+        else:
+            self.names.append(_NAME_OTHER)
+            if name is not MISSING:
+                _extra["name"] = name
+        if type(_id) is str and _UUID.match(_id):
+            self.idkinds.append(_ID_UUID)
+            self.uuids += bytes.fromhex(_id.replace("-", ""))
+        else:
+            self.idkinds.append(_ID_OTHER)
+            _extra["_id"] = _id
+        if attrs:
+            _extra["attrs"] = attrs
+        if _extra:
+            self.extras[len(self.datas)] = _extra
+        self.datas.append(data)
+        if len(self.datas) >= self.blocksize:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered nodes as a block."""
+        if not self.datas:
+            return
+        _body = bytearray()
+        _lengths = bytearray()
+        for _s in self.newstrings:
+            _put_varint(_lengths, len(_s))
+        _raw = "".join(self.newstrings).encode("utf-8", "surrogatepass")
+        _put_varint(_body, len(self.newstrings))
+        for _column in (_lengths, _raw):
+            _put_varint(_body, len(_column))
+            _body += _column
+        _put_varint(_body, len(self.datas))
+        for _column in (self.nchilds, self.names, self.idkinds, self.uuids):
+            _put_varint(_body, len(_column))
+            _body += _column
+        _body += pickle.dumps((self.datas, self.extras), protocol=self.protocol)
+        _stored = zlib.compress(_body, self.level) if self.compress else _body
+        _head = bytearray()
+        _put_varint(_head, len(_stored))
+        _put_varint(_head, len(_body))
+        self.fh.write(bytes(_head))
+        self.fh.write(_stored)
+        self._reset()
+
+    def close(self):
+        """Write the last block and the end block."""
+        self.flush()
+        self.fh.write(b"\x00")
+
+
+def split_meta(meta):
+    """Return the `_vntree` dict `meta` to be stored with the node data,
+    without the name and `_id` (stored separately) if they are its first
+    keys, as in the nodes created by `Node`; otherwise `meta` itself, 
+    so that the order of its keys is preserved."""
+    _keys = [k for k in ("name", "_id") if k in meta]
+    if list(itertools.islice(meta, len(_keys))) != _keys:
+        return meta
+    return {k: v for k, v in meta.items() if k not in ("name", "_id")}
+
+
+def join_meta(data, first):
+    """Restore the name and `_id` in the `_vntree` dict of the loaded 
+    node `data`, as its first keys (see `split_meta`).
+
+    :param first: the name and `_id` items, in this order.
+    :type first: dict
+    """
+    _meta = data.get("_vntree")
+    if not isinstance(_meta, dict):
+        data["_vntree"] = first
+    elif "name" in _meta or "_id" in _meta:
+        _meta.update(first)
+    else:
+        first.update(_meta)
+        data["_vntree"] = first
+
+
+def node_fields(node, transient):
+    """Return `(_id, name, data, attrs)` of a node for `VNBWriter.write_node`."""
+    _data = node.data
+    _meta = _data.get("_vntree")
+    _name = MISSING
+    if isinstance(_meta, dict):
+        _name = _meta.get("name", MISSING)
+        # keep the `_vntree` key, so that the order of the keys is preserved
+        _data = dict(_data)
+        _data["_vntree"] = split_meta(_meta)
+    _attrs = {k: v for k, v in vars(node).items() if k != "data" and k not in transient}
+    return node._id, _name, _data, _attrs
+
+
+def dump(rootnode, fh, transient, compress=False, level=6, blocksize=BLOCKSIZE, protocol=4):
+    """Write the (sub-)tree rooted at `rootnode` to a binary file object,
+    without recursion.
+
+    :param transient: names of the node attributes that are not saved.
+    :type transient: tuple
+    """
+    _writer = VNBWriter(fh, compress, level, blocksize, protocol)
+    _stack = [rootnode]
+    while _stack:
+        _node = _stack.pop()
+        _writer.write_node(len(_node.childs), *node_fields(_node, transient))
+        _stack.extend(reversed(_node.childs))
+    _writer.close()
+
+
+def iter_records(fh):
+    """Streaming reader of the `.vnb` format, generates the node records
+    `(nchilds, _id, name, data, attrs)` in pre-order, one block at a time
+    (`name` is `MISSING` for a node without a name).
+
+    :param fh: binary file object.
+    """
+    _head = fh.read(len(MAGIC) + 1)
+    if _head[:len(MAGIC)] != MAGIC:
+        raise ValueError("vnbfile: not a vnb file, magic number {!r}.".format(_head[:len(MAGIC)]))
+    _compressed = bool(_head[len(MAGIC)] & _FLAG_ZLIB)
+    _strings = []
+    while True:
+        _size = _read_varint(fh)
+        if _size == 0:
+            return
+        _rawsize = _read_varint(fh)
+        buf = fh.read(_size)
+        if len(buf) != _size:
+            raise ValueError("vnbfile: unexpected end of file.")
+        if _compressed:
+            buf = zlib.decompress(buf, bufsize=_rawsize)
+        _newidx = len(_strings)
+        _n, pos = _get_varint(buf, 0)
+        _len, pos = _get_varint(buf, pos)
+        _lengths = _get_varints(buf[pos:pos+_len], _n)
+        pos += _len
+        _len, pos = _get_varint(buf, pos)
+        _text = buf[pos:pos+_len].decode("utf-8", "surrogatepass")
+        pos += _len
+        _ends = list(itertools.accumulate(_lengths))
+        _strings.extend(_text[_end-_l:_end] for _l, _end in zip(_lengths, _ends))
+        _nnodes, pos = _get_varint(buf, pos)
+        _columns = []
+        for ii in range(4):
+            _len, pos = _get_varint(buf, pos)
+            _columns.append(buf[pos:pos+_len])
+            pos += _len
+        _nchilds = _get_varints(_columns[0], _nnodes)
+        _names = _get_varints(_columns[1], _nnodes)
+        _idkinds = _columns[2]
+        _hex = _columns[3].hex()
+        _datas, _extras = pickle.loads(buf[pos:])
+        _h = 0
+        for ii in range(_nnodes):
+            _name = _names[ii]
+            if _name == _NAME_NEW:
+                _name = _strings[_newidx]
+                _newidx += 1
+            elif _name == _NAME_OTHER:
+                _name = MISSING
+            else:
+                _name = _strings[_name - 2]
+            if _idkinds[ii] == _ID_UUID:
+                _id = f"{_hex[_h:_h+8]}-{_hex[_h+8:_h+12]}-{_hex[_h+12:_h+16]}-{_hex[_h+16:_h+20]}-{_hex[_h+20:_h+32]}"
+                _h += 32
+            else:
+                _id = None
+            _extra = _extras.get(ii)
+            if _extra is None:
+                yield _nchilds[ii], _id, _name, _datas[ii], None
+            else:
+                yield (_nchilds[ii], _extra.get("_id", _id), _extra.get("name", _name),
+                       _datas[ii], _extra.get("attrs"))
+
+
+def load(fh, cls, fastinit=False, gcpause=False):
+    """Load a tree from a binary file object, without recursion.
+
+    :param cls: the node class.
+    :param fastinit: if True, the nodes are created without calling
+        `cls.__init__` (only for classes that do not extend `Node.__init__`).
+    :type fastinit: bool
+    :param gcpause: if True, the cyclic garbage collector is disabled 
+        (for the whole process) while loading. The nodes and data dicts 
+        are only garbage if loading fails, and the collector passes can 
+        take a third of the load time of a large tree.
+    :type gcpause: bool
+    :returns: the root node, or `None` if there are no nodes.
+    """
+    _gcenabled = gcpause and gc.isenabled()
+    if _gcenabled:
+        gc.disable()
+    try:
+        return _build(iter_records(fh), cls, fastinit)
+    finally:
+        if _gcenabled:
+            gc.enable()
+
+
+def _build(records, cls, fastinit):
+    rootnode = None
+    _stack = []  # [parent node, number of children still to read]
+    for _nchilds, _id, _name, _data, _attrs in records:
+        join_meta(_data, {"_id": _id} if _name is MISSING else {"name": _name, "_id": _id})
+        if fastinit:
+            _node = cls.__new__(cls)
+            _node.data = _data
+            _node.childs = []
+            _node.parent = None
+        else:
+            _node = cls()
+            _node.data = _data
+        if _attrs:
+            for key, val in _attrs.items():
+                setattr(_node, key, val)
+        if _stack:
+            _top = _stack[-1]
+            _parent = _top[0]
+            if fastinit:
+                _parent.childs.append(_node)
+                _node.parent = _parent
+            else:
+                _parent.add_child(_node)
+            _top[1] -= 1
+            if not _top[1]:
+                _stack.pop()
+        else:
+            rootnode = _node
+        if _nchilds:
+            _stack.append([_node, _nchilds])
+    return rootnode
@@ -0,0 +1,365 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Random-access «vntree» file format (`.vnm`) for memory-mapped trees,
+see `Node.openfile(..., mmap=True)`.
+
+File layout (native byte order, recorded in the header):
+    header: b"VNM1" | byte order | number of nodes | hash table size
+            | offsets of the tables
+    heap: node entries, and the `bytes` values stored out-of-band
+    parent table: parent index of each node (uint32, 0xffffffff for the root)
+    child offset table: start of the children of each node in the child
+        index table (uint64, number of nodes + 1)
+    child index table: indices of the children of each node (uint32)
+    entry table: offset of each node entry in the heap (uint64)
+    _id hash table: node index + 1 of each slot, 0 for an empty slot (uint32)
+
+The nodes are numbered in pre-order. A node entry is:
+    name size | _id size | pickle size | number of buffers (4 x uint32)
+    | name | _id | (offset, size) of each buffer (2 x uint64) | pickle
+
+The name and `_id` are a tag byte (`_KEY_MISSING`, `_KEY_STR` for UTF-8,
+or `_KEY_PICKLE`) and the value. The pickle holds the node `data` (without
+the `_vntree` name and `_id`) and the other node attributes; `bytes`
+values of at least `OOB_MIN` bytes are stored out-of-band in the heap
+(referenced by their number with a pickle persistent ID), so that they
+can be read without a copy.
+
+The `_id` hash table uses open addressing with linear probing on the
+CRC-32 of the encoded `_id`, so a node is found by `_id` without reading
+the other nodes.
+
+References
+https://docs.python.org/3/library/mmap.html
+https://docs.python.org/3/library/pickle.html#persistence-of-external-objects
+"""
+from array import array
+import io
+import logging
+import mmap
+import pickle
+import struct
+import sys
+import weakref
+import zlib
+
+from . import lazy
+from .vnbfile import split_meta, join_meta
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VNM1"
+OOB_MIN = 1024  # minimum size of the `bytes` values stored out-of-band
+
+_HEADER = struct.Struct("=4s4sQQQQQQQ")
+_ENTRY = struct.Struct("=IIII")
+_BUFFER = struct.Struct("=QQ")
+_BYTEORDER = b"<   " if sys.byteorder == "little" else b">   "
+_NONE = 0xffffffff
+
+_KEY_MISSING, _KEY_STR, _KEY_PICKLE = 0, 1, 2
+
+MISSING = object()  # a node without a name (or `_id`)
+
+
+def _encode_key(value):
+    if type(value) is str:
+        return bytes([_KEY_STR]) + value.encode("utf-8", "surrogatepass")
+    return bytes([_KEY_PICKLE]) + pickle.dumps(value, protocol=4)
+
+
+def _decode_key(raw):
+    if raw[0] == _KEY_STR:
+        return bytes(raw[1:]).decode("utf-8", "surrogatepass")
+    elif raw[0] == _KEY_PICKLE:
+        return pickle.loads(raw[1:])
+    return MISSING
+
+
+class _Pickler(pickle.Pickler):
+    """Pickler storing the large `bytes` values out-of-band in `buffers`."""
+    def __init__(self, fh, buffers):
+        super().__init__(fh, protocol=4)
+        self.buffers = buffers
+
+    def persistent_id(self, obj):
+        if type(obj) is bytes and len(obj) >= OOB_MIN:
+            self.buffers.append(obj)
+            return len(self.buffers) - 1
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    def __init__(self, fh, buffers):
+        super().__init__(fh)
+        self.buffers = buffers
+
+    def persistent_load(self, pid):
+        return self.buffers[pid]
+
+
+def _hash_slot(key, mask):
+    return zlib.crc32(key) & mask
+
+
+def dump(rootnode, fh, transient):
+    """Write the (sub-)tree rooted at `rootnode` to a binary file object
+    (opened for writing and reading, the header is written last).
+
+    :param transient: names of the node attributes that are not saved.
+    :type transient: tuple
+    """
+    _index = {}
+    _nodes = []
+    _stack = [rootnode]
+    while _stack:
+        _node = _stack.pop()
+        _index[id(_node)] = len(_nodes)
+        _nodes.append(_node)
+        _stack.extend(_c for _c in reversed(_node.childs) if _c is not None)
+    _nnodes = len(_nodes)
+    _parents = array("I", [_NONE]) * _nnodes
+    _childoffs = array("Q", [0]) * (_nnodes + 1)
+    _childidx = array("I")
+    _entries = array("Q", [0]) * _nnodes
+    _capacity = 1
+    while _capacity < 2 * _nnodes:
+        _capacity *= 2
+    _slots = array("I", [0]) * _capacity
+    _mask = _capacity - 1
+
+    fh.write(b"\x00" * _HEADER.size)
+    _pos = _HEADER.size
+    for ii, _node in enumerate(_nodes):
+        for _c in _node.childs:
+            if _c is not None:
+                _childidx.append(_index[id(_c)])
+                _parents[_index[id(_c)]] = ii
+        _childoffs[ii + 1] = len(_childidx)
+        _data = _node.data
+        _meta = _data.get("_vntree")
+        _name = _id = bytes([_KEY_MISSING])
+        if isinstance(_meta, dict):
+            if "name" in _meta:
+                _name = _encode_key(_meta["name"])
+            if "_id" in _meta:
+                _id = _encode_key(_meta["_id"])
+            # keep the `_vntree` key, so that the order of the keys is preserved
+            _data = dict(_data)
+            _data["_vntree"] = split_meta(_meta)
+        _attrs = {k: v for k, v in vars(_node).items() if k != "data" and k not in transient}
+        _buffers = []
+        _stream = io.BytesIO()
+        _Pickler(_stream, _buffers).dump((_data, _attrs))
+        _offsets = []
+        for _raw in _buffers:
+            fh.write(_raw)
+            _offsets.append((_pos, len(_raw)))
+            _pos += len(_raw)
+        _entries[ii] = _pos
+        _pickled = _stream.getvalue()
+        fh.write(_ENTRY.pack(len(_name), len(_id), len(_pickled), len(_offsets)))
+        fh.write(_name)
+        fh.write(_id)
+        for _off in _offsets:
+            fh.write(_BUFFER.pack(*_off))
+        fh.write(_pickled)
+        _pos += _ENTRY.size + len(_name) + len(_id) + _BUFFER.size * len(_offsets) + len(_pickled)
+        if _id[0] != _KEY_MISSING:
+            _slot = _hash_slot(_id, _mask)
+            while _slots[_slot]:
+                _slot = (_slot + 1) & _mask
+            _slots[_slot] = ii + 1
+    _tables = []
+    for _table in (_parents, _childoffs, _childidx, _entries, _slots):
+        _pad = -_pos % 8
+        fh.write(b"\x00" * _pad)
+        _pos += _pad
+        _tables.append(_pos)
+        fh.write(_table.tobytes())
+        _pos += len(_table) * _table.itemsize
+    fh.seek(0)
+    fh.write(_HEADER.pack(MAGIC, _BYTEORDER, _nnodes, _capacity, *_tables))
+
+
+class MappedTree:
+    """A memory-mapped `.vnm` file, the source of the lazy nodes
+    (see `vntree.lazy`).
+
+    :param filepath: the file path.
+    :type filepath: str
+    :param zerocopy: if True, the out-of-band `bytes` values are returned as
+        read-only memoryviews of the mapped file (which must be converted
+        with `bytes()` to be copied or pickled), otherwise as `bytes`.
+    :type zerocopy: bool
+    """
+    def __init__(self, filepath, zerocopy=False):
+        with open(filepath, "rb") as fh:
+            self.mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self.mmap)
+        (_magic, _order, self.nnodes, _capacity, *_tables) = _HEADER.unpack_from(self.buf, 0)
+        if _magic != MAGIC:
+            raise ValueError("vnmfile: not a vnm file, magic number {!r}.".format(_magic))
+        if _order != _BYTEORDER:
+            raise ValueError("vnmfile: file byte order {!r} is not the native byte order.".format(_order))
+        self.zerocopy = zerocopy
+        _n = self.nnodes
+        _parents, _childoffs, _childidx, _entries, _slots = _tables
+        self.parents = self.buf[_parents:_parents + 4 * _n].cast("I")
+        self.childoffs = self.buf[_childoffs:_childoffs + 8 * (_n + 1)].cast("Q")
+        _nchilds = self.childoffs[_n] if _n else 0
+        self.childidx = self.buf[_childidx:_childidx + 4 * _nchilds].cast("I")
+        self.entries = self.buf[_entries:_entries + 8 * _n].cast("Q")
+        self.slots = self.buf[_slots:_slots + 4 * _capacity].cast("I")
+        self.mask = _capacity - 1
+        self.nodes = weakref.WeakValueDictionary()  # index: lazy node
+        self.cls = None
+
+    def close(self):
+        """Close the mapped file; the lazy nodes cannot be loaded after
+        this, and zero-copy values must have been released."""
+        for _view in (self.parents, self.childoffs, self.childidx, self.entries, self.slots, self.buf):
+            _view.release()
+        self.mmap.close()
+
+    def _entry(self, idx):
+        _off = self.entries[idx]
+        _namelen, _idlen, _plen, _nbuf = _ENTRY.unpack_from(self.buf, _off)
+        _off += _ENTRY.size
+        return _off, _namelen, _idlen, _plen, _nbuf
+
+    def name(self, idx):
+        """The name of node `idx`, without decoding its data (`MISSING`
+        if the node has no name)."""
+        _off, _namelen = self._entry(idx)[:2]
+        return _decode_key(self.buf[_off:_off + _namelen])
+
+    def node_id(self, idx):
+        _off, _namelen, _idlen = self._entry(idx)[:3]
+        return _decode_key(self.buf[_off + _namelen:_off + _namelen + _idlen])
+
+    def node_values(self, idx):
+        """Return `(data, attrs)` of node `idx`."""
+        _off, _namelen, _idlen, _plen, _nbuf = self._entry(idx)
+        _name = _decode_key(self.buf[_off:_off + _namelen])
+        _id = _decode_key(self.buf[_off + _namelen:_off + _namelen + _idlen])
+        _off += _namelen + _idlen
+        _buffers = []
+        for ii in range(_nbuf):
+            _boff, _blen = _BUFFER.unpack_from(self.buf, _off)
+            _off += _BUFFER.size
+            _mv = self.buf[_boff:_boff + _blen]
+            _buffers.append(_mv if self.zerocopy else _mv.tobytes())
+        if _buffers:
+            _data, _attrs = _Unpickler(io.BytesIO(self.buf[_off:_off + _plen]), _buffers).load()
+        else:
+            _data, _attrs = pickle.loads(self.buf[_off:_off + _plen])
+        _first = {}
+        if _name is not MISSING:
+            _first["name"] = _name
+        if _id is not MISSING:
+            _first["_id"] = _id
+        if _first:
+            join_meta(_data, _first)
+        return _data, _attrs
+
+    def child_indices(self, idx):
+        return self.childidx[self.childoffs[idx]:self.childoffs[idx + 1]]
+
+    def find_index(self, _id):
+        """The index of the node with `_id` in the file, or `None`."""
+        if not self.nnodes:
+            return None
+        _key = _encode_key(_id)
+        _slot = _hash_slot(_key, self.mask)
+        while True:
+            _idx = self.slots[_slot]
+            if not _idx:
+                return None
+            _off, _namelen, _idlen = self._entry(_idx - 1)[:3]
+            if self.buf[_off + _namelen:_off + _namelen + _idlen] == _key:
+                return _idx - 1
+            _slot = (_slot + 1) & self.mask
+
+    # lazy node source interface
+
+    def root(self, cls):
+        """Return the lazy root node, of the lazy class of `cls`."""
+        self.cls = lazy.lazy_class(cls)
+        _node = lazy.new_node(self.cls, self, 0)
+        self.nodes[0] = _node
+        return _node
+
+    def load(self, node, idx, attr):
+        if attr == "data":
+            _data, _attrs = self.node_values(idx)
+            node.data = _data
+            for key, val in _attrs.items():
+                setattr(node, key, val)
+        else:
+            _childs = []
+            for _cidx in self.child_indices(idx):
+                _child = lazy.new_node(self.cls, self, _cidx, node)
+                self.nodes[_cidx] = _child
+                _childs.append(_child)
+            node.childs = _childs
+
+    def find_id(self, _id):
+        """The lazy node with `_id`, loading the `childs` of its ancestors,
+        or `None` if it is not in the file (or has been removed from the tree)."""
+        _idx = self.find_index(_id)
+        if _idx is None:
+            return None
+        _path = []
+        while _idx not in self.nodes and _idx != _NONE:
+            _path.append(_idx)
+            _idx = self.parents[_idx]
+        if _idx == _NONE:
+            return None
+        _node = self.nodes[_idx]
+        for _idx in reversed(_path):
+            _node.childs  # loads the children
+            _node = self.nodes.get(_idx)
+            if _node is None:
+                return None
+        return _node
+
+
+def load(filepath, cls, fastinit=False):
+    """Load a complete tree from a `.vnm` file.
+
+    :param cls: the node class.
+    :param fastinit: if True, the nodes are created without calling
+        `cls.__init__` (only for classes that do not extend `Node.__init__`).
+    :type fastinit: bool
+    :returns: the root node, or `None` if there are no nodes.
+    """
+    _src = MappedTree(filepath)
+    try:
+        _nodes = []
+        for ii in range(_src.nnodes):
+            _data, _attrs = _src.node_values(ii)
+            if fastinit:
+                _node = cls.__new__(cls)
+                _node.childs = []
+                _node.parent = None
+            else:
+                _node = cls()
+            _node.data = _data
+            for key, val in _attrs.items():
+                setattr(_node, key, val)
+            _nodes.append(_node)
+            if ii:
+                _parent = _nodes[_src.parents[ii]]
+                # pre-order, so the children are added in order
+                if fastinit:
+                    _parent.childs.append(_node)
+                    _node.parent = _parent
+                else:
+                    _parent.add_child(_node)
+    finally:
+        _src.close()
+    return _nodes[0] if _nodes else None
@@ -0,0 +1,644 @@
+"""
+Copyright © 2018-2022 Stephen McEntee
+Licensed under the MIT license.
+See «vntree» LICENSE file for details https://github.com/qwilka/vntree/blob/master/LICENSE
+
+Streaming writer and loader for the «vntree» YAML tree formats (see
+`Node.tree2yaml` and `Node.yaml2tree`).
+
+The "list" layout is a list of the nodes in pre-order:
+
+    - !Node &n0
+      name: root node
+      data:
+        testval1: 111
+    - !Node &n1
+      name: child 1
+      parent: *n0
+    - !Node
+      name: grand child
+      parent: *n1
+
+Each node is a mapping with the tag of its class, and the `parent` of a
+node is an alias of the anchor of its parent node (only the nodes with
+children are anchored).
+
+The "nested" layout is the treedict of the tree (see `Node.to_treedict`),
+with the node `name` when the `_vntree` metadata is not written:
+
+    name: root node
+    data:
+      testval1: 111
+    childs:
+    - name: child 1
+      data: {}
+      childs:
+      - name: grand child
+        data: {}
+        childs: []
+
+The indentation of the "nested" layout grows with the depth of the nodes,
+so the "list" layout is more compact for deep trees.
+
+The YAML events are emitted one node at a time through a single dumper,
+`yaml.CSafeDumper` if PyYAML is built with libyaml (`yaml.SafeDumper`
+otherwise), and the `data` of each node is represented with the
+`yaml.SafeRepresenter`. The YAML is loaded from the stream of events of
+`yaml.CSafeLoader` (or `yaml.SafeLoader`): the nodes are built as they are
+read, with an explicit stack, and the values are built as with
+`yaml.safe_load`. So the memory used does not depend on the size of the
+file (apart from the tree), and deep trees do not hit the recursion limit.
+
+References
+https://pyyaml.org/wiki/PyYAMLDocumentation
+https://yaml.org/spec/1.1/#id863390 (anchors and aliases)
+"""
+import gc
+import logging
+import uuid
+
+import yaml
+from yaml import (ScalarNode, SequenceNode, MappingNode, ScalarEvent, AliasEvent,
+                  SequenceStartEvent, SequenceEndEvent, MappingStartEvent,
+                  MappingEndEvent, DocumentStartEvent, DocumentEndEvent)
+from yaml.composer import ComposerError
+from yaml.constructor import ConstructorError
+
+logger = logging.getLogger(__name__)
+
+HEADER = "# «vntree» YAML format, see https://github.com/qwilka/vntree\n"
+
+_STR_TAG = "tag:yaml.org,2002:str"
+_SEQ_TAG = "tag:yaml.org,2002:seq"
+_MAP_TAG = "tag:yaml.org,2002:map"
+_INT_TAG = "tag:yaml.org,2002:int"
+_BOOL_TAG = "tag:yaml.org,2002:bool"
+_NULL_TAG = "tag:yaml.org,2002:null"
+_MERGE_TAG = "tag:yaml.org,2002:merge"
+_MERGE = object()  # the merge key `<<`
+_MISSING = object()
+_FAST_FIELDS = frozenset(("name", "data"))
+_TAGS_CACHE = 1 << 16  # maximum number of cached plain scalar tags
+_SEQEND = SequenceEndEvent()
+_MAPEND = MappingEndEvent()
+_NAME, _PARENT, _DATA, _CHILDS = (ScalarEvent(None, None, (True, False), _k)
+                                  for _k in ("name", "parent", "data", "childs"))
+
+LAYOUTS = ("list", "nested")
+
+
+class SafeLoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+    """The safe loader, caching the tags of the plain scalars."""
+    def __init__(self, stream):
+        super().__init__(stream)
+        self.plain_tags = {}
+
+    def plain_tag(self, value):
+        """The tag of a plain scalar (see `yaml.Resolver.resolve`)."""
+        _tag = self.plain_tags.get(value)
+        if _tag is None:
+            _tag = self.resolve(ScalarNode, value, (True, False))
+            if len(self.plain_tags) >= _TAGS_CACHE:
+                self.plain_tags.clear()
+            self.plain_tags[value] = _tag
+        return _tag
+
+
+class SafeDumper(getattr(yaml, "CSafeDumper", yaml.SafeDumper)):
+    """The safe dumper, noting the values that are represented twice."""
+    repeated = False
+
+    def represent_data(self, data):
+        if id(data) in self.represented_objects:
+            self.repeated = True
+        return super().represent_data(data)
+
+    def reset(self):
+        self.represented_objects = {}
+        self.object_keeper = []
+        self.alias_key = None
+        self.repeated = False
+
+
+def _repeated_nodes(ynode):
+    """Return a dict with the ids of the collection nodes that occur more
+    than once in the representation node `ynode`."""
+    _repeated = {}
+    _seen = set()
+    _stack = [ynode]
+    while _stack:
+        _y = _stack.pop()
+        if _y.__class__ is ScalarNode:
+            continue
+        if id(_y) in _seen:
+            _repeated[id(_y)] = None
+            continue
+        _seen.add(id(_y))
+        if _y.__class__ is SequenceNode:
+            _stack.extend(_y.value)
+        else:
+            for _k, _v in _y.value:
+                _stack.append(_k)
+                _stack.append(_v)
+    return _repeated
+
+
+def _data_events(dumper, ynode, emit):
+    """Emit the events of a representation node (see `yaml.Serializer`),
+    without recursion; the collections that are repeated are anchored."""
+    _repeated = _repeated_nodes(ynode) if dumper.repeated else None
+    _resolve = dumper.resolve
+    _nanchors = 0
+    _stack = [(ynode, None)]
+    while _stack:
+        _y, _items = _stack[-1]
+        if _items is not None:
+            _next = next(_items, None)
+            if _next is None:
+                _stack.pop()
+                emit(_SEQEND if _y.__class__ is SequenceNode else _MAPEND)
+            else:
+                _stack.append((_next, None))
+            continue
+        _anchor = None
+        if _repeated and id(_y) in _repeated:
+            _anchor = _repeated[id(_y)]
+            if _anchor is not None:
+                _stack.pop()
+                emit(AliasEvent(_anchor))
+                continue
+            _nanchors += 1
+            _anchor = _repeated[id(_y)] = "id{:03d}".format(_nanchors)
+        if _y.__class__ is ScalarNode:
+            _stack.pop()
+            _tag = _y.tag
+            _implicit = (_tag == _resolve(ScalarNode, _y.value, (True, False)), _tag == _STR_TAG)
+            emit(ScalarEvent(_anchor, _tag, _implicit, _y.value, style=_y.style))
+        elif _y.__class__ is SequenceNode:
+            emit(SequenceStartEvent(_anchor, _y.tag, _y.tag == _SEQ_TAG, flow_style=_y.flow_style))
+            _stack[-1] = (_y, iter(_y.value))
+        else:
+            emit(MappingStartEvent(_anchor, _y.tag, _y.tag == _MAP_TAG, flow_style=_y.flow_style))
+            _stack[-1] = (_y, (_v for _kv in _y.value for _v in _kv))
+
+
+def _value_events(dumper, value):
+    """Return the list of events of a value made of dicts, lists, strings,
+    numbers, booleans and `None` (as represented by the safe representer,
+    with the keys sorted), or `None` for other values, or if a dict or list
+    occurs twice (these values are represented by `_data_events`)."""
+    _resolve = dumper.resolve
+    _events = []
+    _append = _events.append
+    _seen = set()
+    _stack = [iter((value,))]
+    _ends = [None]
+    while _stack:
+        _v = next(_stack[-1], _ends)
+        if _v is _ends:
+            _stack.pop()
+            _end = _ends.pop()
+            if _end is not None:
+                _append(_end)
+            continue
+        _type = _v.__class__
+        if _type is str:
+            _append(ScalarEvent(None, _STR_TAG, (_resolve(ScalarNode, _v, (True, False)) == _STR_TAG, True), _v))
+        elif _type is int:
+            _append(ScalarEvent(None, _INT_TAG, (True, False), str(_v)))
+        elif _type is bool:
+            _append(ScalarEvent(None, _BOOL_TAG, (True, False), "true" if _v else "false"))
+        elif _v is None:
+            _append(ScalarEvent(None, _NULL_TAG, (True, False), "null"))
+        elif _type is float:
+            _y = dumper.represent_float(_v)
+            _append(ScalarEvent(None, _y.tag, (_resolve(ScalarNode, _y.value, (True, False)) == _y.tag, False), _y.value))
+        elif _type is dict or _type is list:
+            if id(_v) in _seen:
+                return None
+            _seen.add(id(_v))
+            if _type is list:
+                _append(SequenceStartEvent(None, _SEQ_TAG, True, flow_style=False))
+                _stack.append(iter(_v))
+                _ends.append(_SEQEND)
+                continue
+            _items = list(_v.items())
+            try:
+                _items.sort()
+            except TypeError:
+                pass
+            _append(MappingStartEvent(None, _MAP_TAG, True, flow_style=False))
+            _stack.append(_v for _kv in _items for _v in _kv)
+            _ends.append(_MAPEND)
+        else:
+            return None
+    return _events
+
+
+def _emit_value(dumper, value, emit):
+    _events = _value_events(dumper, value)
+    if _events is None:
+        _data_events(dumper, dumper.represent_data(value), emit)
+        dumper.reset()
+    else:
+        for _event in _events:
+            emit(_event)
+
+
+def _emit_name(dumper, name, emit):
+    if name.__class__ is str:
+        emit(_NAME)
+        emit(ScalarEvent(None, _STR_TAG, (dumper.resolve(ScalarNode, name, (True, False)) == _STR_TAG, True), name))
+
+
+def _node_data(node, treemeta):
+    _data = node.data
+    if not treemeta and "_vntree" in _data:
+        _data = {_k: _v for _k, _v in _data.items() if _k != "_vntree"}
+    return _data
+
+
+def _list_events(dumper, node, treemeta, emit):
+    emit(SequenceStartEvent(None, None, True, flow_style=False))
+    _count = 0
+    _stack = [(node, None)]
+    while _stack:
+        _n, _panchor = _stack.pop()
+        _anchor = None
+        if _n.childs:
+            _anchor = "n{}".format(_count)
+            _stack.extend((_c, _anchor) for _c in reversed(_n.childs) if _c is not None)
+        _count += 1
+        emit(MappingStartEvent(_anchor, "!" + _n.__class__.__name__, False, flow_style=False))
+        _emit_name(dumper, _n.name, emit)
+        if _panchor is not None:
+            emit(_PARENT)
+            emit(AliasEvent(_panchor))
+        _data = _node_data(_n, treemeta)
+        if _data:
+            emit(_DATA)
+            _emit_value(dumper, _data, emit)
+        emit(_MAPEND)
+    emit(_SEQEND)
+
+
+def _nested_events(dumper, node, treemeta, transient, emit):
+    _stack = [(node, None)]
+    while _stack:
+        _n, _childs = _stack[-1]
+        if _childs is None:
+            emit(MappingStartEvent(None, _MAP_TAG, True, flow_style=False))
+            if not treemeta:
+                _emit_name(dumper, _n.name, emit)
+            emit(_DATA)
+            _emit_value(dumper, _node_data(_n, treemeta), emit)
+            for _key, _value in vars(_n).items():
+                if _key == "data" or _key in transient:
+                    continue
+                _emit_value(dumper, _key, emit)
+                _emit_value(dumper, _value, emit)
+            emit(_CHILDS)
+            emit(SequenceStartEvent(None, _SEQ_TAG, True, flow_style=False))
+            _stack[-1] = (_n, iter(_n.childs))
+            continue
+        _child = next(_childs, None)
+        if _child is None:
+            _stack.pop()
+            emit(_SEQEND)
+            emit(_MAPEND)
+        else:
+            _stack.append((_child, None))
+
+
+def dump(node, fh, treemeta=False, layout="list", transient=()):
+    """Write the (sub-)tree rooted at `node` to a text file object in the
+    «vntree» YAML format.
+
+    :param node: root node of the (sub-)tree.
+    :type node: Node
+    :param fh: text file object.
+    :param treemeta: if True, retain the node metadata `_vntree` in `data`.
+    :type treemeta: bool
+    :param layout: "list" for the list of nodes with aliases to the
+        parents, or "nested" for the treedict of the tree (see the
+        module docstring).
+    :type layout: str
+    :param transient: names of the node attributes that are not written
+        in the "nested" layout.
+    :type transient: tuple
+    """
+    if layout not in LAYOUTS:
+        raise ValueError("yamlstream.dump: argument «layout»=«{}» not valid, must be 'list' or 'nested'.".format(layout))
+    fh.write(HEADER)
+    dumper = SafeDumper(fh, default_flow_style=False, allow_unicode=True)
+    emit = dumper.emit
+    try:
+        dumper.open()
+        emit(DocumentStartEvent(explicit=False))
+        if layout == "list":
+            _list_events(dumper, node, treemeta, emit)
+        else:
+            _nested_events(dumper, node, treemeta, transient, emit)
+        emit(DocumentEndEvent(explicit=False))
+        dumper.close()
+    finally:
+        dumper.dispose()
+
+
+def _scalar(loader, event):
+    """The value of a scalar event (see `yaml.Composer.compose_scalar_node`)."""
+    _tag = event.tag
+    if _tag is None or _tag == "!":
+        _tag = loader.plain_tag(event.value) if event.implicit[0] else _STR_TAG
+    if _tag == _STR_TAG:
+        return event.value
+    if _tag == _INT_TAG and event.value.isascii() and event.value.isdigit() and (event.value[0] != "0" or event.value == "0"):
+        return int(event.value)  # a decimal int (a leading 0 is octal in YAML 1.1)
+    if _tag == _MERGE_TAG:
+        return _MERGE
+    _node = ScalarNode(_tag, event.value, event.start_mark, event.end_mark, event.style)
+    _constructor = loader.yaml_constructors.get(_tag)
+    if _constructor is None:
+        return loader.construct_document(_node)
+    return _constructor(loader, _node)
+
+
+def _compose(loader, event, values):
+    """Compose the representation node starting with `event`, for a
+    collection with a tag that is constructed by the loader. The aliases
+    of the values read before (`values`, see `read_value`) are nodes
+    that the loader constructs as these values.
+
+    :returns: the node, and the dict of its anchored nodes.
+    """
+    _anchors = {}
+    _stack = []  # [collection node, pending key node]
+    while True:
+        _cls = event.__class__
+        if _cls is AliasEvent:
+            if event.anchor in _anchors:
+                _y = _anchors[event.anchor]
+            elif event.anchor in values:
+                _y = ScalarNode(_STR_TAG, "", event.start_mark, event.end_mark)
+                loader.constructed_objects[_y] = values[event.anchor]
+            else:
+                raise ComposerError(None, None, "found undefined alias %r" % event.anchor, event.start_mark)
+        elif _cls is ScalarEvent:
+            _tag = event.tag
+            if _tag is None or _tag == "!":
+                _tag = loader.resolve(ScalarNode, event.value, event.implicit)
+            _y = ScalarNode(_tag, event.value, event.start_mark, event.end_mark, event.style)
+            if event.anchor is not None:
+                _anchors[event.anchor] = _y
+        elif _cls is SequenceStartEvent or _cls is MappingStartEvent:
+            _kind = SequenceNode if _cls is SequenceStartEvent else MappingNode
+            _tag = event.tag
+            if _tag is None or _tag == "!":
+                _tag = loader.resolve(_kind, None, event.implicit)
+            _y = _kind(_tag, [], event.start_mark, None, flow_style=event.flow_style)
+            if event.anchor is not None:
+                _anchors[event.anchor] = _y
+            _stack.append([_y, None])
+            event = loader.get_event()
+            continue
+        else:
+            _y = _stack.pop()[0]
+            _y.end_mark = event.end_mark
+        if not _stack:
+            return _y, _anchors
+        _frame = _stack[-1]
+        if _frame[0].__class__ is SequenceNode:
+            _frame[0].value.append(_y)
+        elif _frame[1] is None:
+            _frame[1] = _y
+        else:
+            _frame[0].value.append((_frame[1], _y))
+            _frame[1] = None
+        event = loader.get_event()
+
+
+def _merge(mapping, merges):
+    """Apply the merge keys `<<` of a mapping (see `yaml.SafeConstructor.flatten_mapping`)."""
+    _merged = {}
+    for _value in merges:
+        for _sub in ([_value] if isinstance(_value, dict) else reversed(_value)):
+            _merged.update(_sub)
+    _merged.update(mapping)
+    mapping.clear()
+    mapping.update(_merged)
+
+
+def read_value(loader, event, anchors):
+    """Read the value starting with `event` from the events of a loader,
+    without recursion. Mappings and sequences are built directly as dicts
+    and lists, the scalars and the collections with other tags are
+    constructed by the loader, as `yaml.safe_load` would.
+
+    :param loader: a `SafeLoader`.
+    :param event: the first event of the value.
+    :param anchors: dict of the anchored values, updated.
+    :type anchors: dict
+    :returns: the value.
+    """
+    _get = loader.get_event
+    _stack = []  # [dict or list, pending key, merged values]
+    while True:
+        _cls = event.__class__
+        if _cls is ScalarEvent:
+            _value = _scalar(loader, event)
+            if event.anchor is not None:
+                anchors[event.anchor] = _value
+        elif _cls is AliasEvent:
+            if event.anchor not in anchors:
+                raise ComposerError(None, None, "found undefined alias %r" % event.anchor, event.start_mark)
+            _value = anchors[event.anchor]
+        elif _cls is MappingStartEvent or _cls is SequenceStartEvent:
+            _tag = event.tag
+            if _tag is None or _tag == "!" or _tag == (_MAP_TAG if _cls is MappingStartEvent else _SEQ_TAG):
+                _value = {} if _cls is MappingStartEvent else []
+                if event.anchor is not None:
+                    anchors[event.anchor] = _value
+                _stack.append([_value, _MISSING, None])
+                event = _get()
+                continue
+            _y, _yanchors = _compose(loader, event, anchors)
+            _constructed = loader.constructed_objects  # replaced by construct_document
+            _value = loader.construct_document(_y)
+            for _anchor, _ynode in _yanchors.items():
+                if _ynode in _constructed:
+                    anchors[_anchor] = _constructed[_ynode]
+        else:
+            _value, _, _merges = _stack.pop()
+            if _merges:
+                _merge(_value, _merges)
+        if not _stack:
+            return _value
+        _frame = _stack[-1]
+        _container = _frame[0]
+        if _container.__class__ is list:
+            _container.append(_value)
+        elif _frame[1] is _MISSING:
+            _frame[1] = _value
+        else:
+            if _frame[1] is _MERGE:
+                if _frame[2] is None:
+                    _frame[2] = []
+                _frame[2].append(_value)
+            else:
+                try:
+                    _container[_frame[1]] = _value
+                except TypeError as err:
+                    raise ConstructorError("while constructing a mapping", None,
+                                           "found unhashable key (%s)" % err, event.start_mark)
+            _frame[1] = _MISSING
+        event = _get()
+
+
+def _new_node(cls, fastinit, parent):
+    if fastinit:
+        _node = cls.__new__(cls)
+        _node.data = {}
+        _node.childs = []
+        _node.parent = None
+    else:
+        _node = cls()
+    if parent is not None:
+        if fastinit:
+            parent.childs.append(_node)
+            _node.parent = parent
+        else:
+            parent.add_child(_node)
+    return _node
+
+
+def _set_data(node, data, fastinit):
+    """Set the data of a new node, keeping its `_id` if the data has none."""
+    _meta = data.get("_vntree")
+    if not isinstance(_meta, dict):
+        _meta = data["_vntree"] = {}
+    if "_id" not in _meta:
+        _meta["_id"] = str(uuid.uuid4()) if fastinit else node._id
+    node.data = data
+
+
+def _load_list(loader, cls, fastinit):
+    _anchors = {}  # anchored values in the data
+    _nodes = {}  # anchored nodes
+    rootnode = None
+    _get = loader.get_event
+    while True:
+        event = _get()
+        if event.__class__ is SequenceEndEvent:
+            return rootnode
+        if event.__class__ is not MappingStartEvent:
+            raise ConstructorError(None, None, "expected a node mapping, but found %s" % event.__class__.__name__, event.start_mark)
+        _fields = {}
+        _parent = None
+        _anchor = event.anchor
+        while True:
+            event = _get()
+            if event.__class__ is MappingEndEvent:
+                break
+            _key = read_value(loader, event, _anchors)
+            event = _get()
+            if _key == "parent" and event.__class__ is AliasEvent:
+                _parent = _nodes.get(event.anchor)
+                if _parent is None:
+                    raise ComposerError(None, None, "found undefined node alias %r" % event.anchor, event.start_mark)
+            else:
+                _fields[_key] = read_value(loader, event, _anchors)
+        _fields.pop("parent", None)
+        if _parent is None and rootnode is not None:
+            logger.warning("yamlstream.load_tree: node «%s» has no parent, it is ignored." % (_fields.get("name"),))
+            continue
+        _data = _fields.get("data")
+        if fastinit and _fields.keys() <= _FAST_FIELDS and (_data is None or isinstance(_data, dict)):
+            _node = _new_node(cls, fastinit, _parent)
+            _data = {} if _data is None else _data
+            _set_data(_node, _data, fastinit)
+            _meta = _data["_vntree"]
+            _name = _fields.get("name", "")  # as `Node.__init__`
+            if _name:
+                _meta["name"] = str(_name)
+            elif _name is None and not _meta.get("name"):
+                _meta["name"] = ""
+        else:
+            _node = cls(parent=_parent, **_fields)
+        if rootnode is None:
+            rootnode = _node
+        if _anchor is not None:
+            _nodes[_anchor] = _node
+
+
+def _load_nested(loader, cls, fastinit, transient):
+    _anchors = {}
+    _get = loader.get_event
+    rootnode = _new_node(cls, fastinit, None)
+    _stack = [[rootnode, None, {}, False]]  # [node, data, attributes, in childs]
+    while _stack:
+        _frame = _stack[-1]
+        event = _get()
+        if _frame[3]:
+            if event.__class__ is SequenceEndEvent:
+                _frame[3] = False
+            elif event.__class__ is MappingStartEvent:
+                _stack.append([_new_node(cls, fastinit, _frame[0]), None, {}, False])
+            else:
+                raise ConstructorError(None, None, "expected a node mapping in «childs», but found %s" % event.__class__.__name__, event.start_mark)
+            continue
+        if event.__class__ is MappingEndEvent:
+            _node, _data, _attrs, _ = _stack.pop()
+            _set_data(_node, _data if isinstance(_data, dict) else {}, fastinit)
+            for _key, _value in _attrs.items():
+                setattr(_node, _key, _value)
+            continue
+        _key = read_value(loader, event, _anchors)
+        event = _get()
+        if _key == "childs" and event.__class__ is SequenceStartEvent:
+            _frame[3] = True
+            continue
+        _value = read_value(loader, event, _anchors)
+        if _key == "data":
+            _frame[1] = _value
+        elif _key not in transient:
+            _frame[2][_key] = _value
+    return rootnode
+
+
+def load_tree(stream, cls, fastinit=False, transient=(), gcpause=False):
+    """Load a tree from the «vntree» YAML format, in the "list" or the
+    "nested" layout (detected from the document), without recursion.
+
+    :param stream: a string or a text stream with the YAML.
+    :param cls: the node class.
+    :param fastinit: if True, the nodes are created without calling
+        `cls.__init__` (only for classes that do not extend `Node.__init__`).
+    :type fastinit: bool
+    :param transient: names of the node attributes that are not set from
+        the "nested" layout.
+    :type transient: tuple
+    :param gcpause: if True, the cyclic garbage collector is disabled
+        (for the whole process) while loading (see `vntree.vnbfile.load`).
+    :type gcpause: bool
+    :returns: the root node, or `None` if the document is empty.
+    :rtype: Node or None
+    """
+    loader = SafeLoader(stream)
+    _gcenabled = gcpause and gc.isenabled()
+    if _gcenabled:
+        gc.disable()
+    try:
+        loader.get_event()  # StreamStartEvent
+        event = loader.get_event()
+        if event.__class__ is not DocumentStartEvent:
+            return None
+        event = loader.get_event()
+        if event.__class__ is SequenceStartEvent:
+            return _load_list(loader, cls, fastinit)
+        if event.__class__ is MappingStartEvent:
+            return _load_nested(loader, cls, fastinit, transient)
+        raise ConstructorError(None, None, "expected a list of nodes or a node mapping, but found %s" % event.__class__.__name__, event.start_mark)
+    finally:
+        loader.dispose()
+        if _gcenabled:
+            gc.enable()